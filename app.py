@@ -2,17 +2,39 @@
 NutriTrack API Server
 FastAPI backend for the nutrition tracking dashboard.
 """
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse
+from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
 from typing import Optional
+from pydantic import BaseModel, ConfigDict, ValidationError, create_model
 from datetime import datetime, date, timedelta
+import asyncio
+import functools
+import hmac
+import inspect
 import uvicorn
 import os
-import random
-from database import get_db, init_db, calculate_bmr, calculate_tdee, calculate_daily_goals, calculate_gamification
+import json
+from models import (
+    ProfileCreate, GoalModeUpdate, FoodEntry, WeightEntry, ActivityEntry, HealthEntry,
+    OftenUsedItem, OftenUsedUpdate, AddFromEntry, DailyCoaching, CoachingReport, FoodBatch,
+    WeightBatch, ActivityBatch, HealthBatch, BatchOperation, OperationBatch,
+)
+from database import get_db, get_conn, close_pool, init_db, transaction, read_snapshot, get_active_profile, invalidate_profile, get_day_totals, get_totals_range, calculate_bmr, calculate_tdee, calculate_daily_goals, calculate_daily_goals_range, calculate_gamification
+from gamification import refresh_streaks, streak_summary, xp_summary
+from response_cache import ResponseCache, etag_matches
+from metrics import Metrics, MetricsMiddleware, TimedJSONResponse, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from events import hub, format_sse, KEEPALIVE_SECONDS
+from writer import writer, WriteQueueFull
+from food_search import search_foods
+import profiling
+import reports
+import digest
+from pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from local_time import local_now, local_today, local_day
+from seed import generate as generate_demo_data, DEMO_DAYS
 
 # ── Configuration ────────────────────────────────────────────────────
 HOST = os.environ.get("NUTRITRACK_HOST", "0.0.0.0")
@@ -22,7 +44,7 @@ cors_origins_raw = os.environ.get("NUTRITRACK_CORS_ORIGINS", "*")
 CORS_ORIGINS = ["*"] if cors_origins_raw == "*" else [o.strip() for o in cors_origins_raw.split(",")]
 
 # ── Initialize ───────────────────────────────────────────────────────
-app = FastAPI(title="NutriTrack API", version="1.0.0")
+app = FastAPI(title="NutriTrack API", version="1.0.0", default_response_class=TimedJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,95 +58,192 @@ app.add_middleware(
 STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+# ── Response Cache ───────────────────────────────────────────────────
+# GET routes served from the response cache, with the tables each one reads
+CACHED_ROUTES = {
+    "/api/profile": ("user_profile",),
+    "/api/food": ("food_entries",),
+    "/api/food/search": ("food_entries",),
+    "/api/food/history/frequent": ("food_entries",),
+    "/api/food/range": ("food_entries",),
+    "/api/food/often-used": ("often_used_foods",),
+    "/api/weight": ("weight_logs",),
+    "/api/activity": ("sport_activities",),
+    "/api/activity/range": ("sport_activities",),
+    "/api/health": ("health_measurements",),
+    "/api/daily-summary": ("user_profile", "food_entries", "sport_activities", "weight_logs"),
+    "/api/coaching": ("user_profile", "food_entries", "sport_activities"),
+    "/api/coaching/daily": ("daily_coaching",),
+    "/api/coaching/reports": ("coaching_reports",),
+    "/api/coaching/reports/latest": ("coaching_reports",),
+    "/api/weekly-report": ("user_profile", "food_entries", "sport_activities", "weight_logs", "health_measurements"),
+    "/api/history/daily-totals": ("user_profile", "food_entries", "sport_activities"),
+    "/api/reports/week": ("user_profile", "food_entries", "sport_activities", "weight_logs", "health_measurements"),
+    "/api/reports/month": ("user_profile", "food_entries", "sport_activities", "weight_logs", "health_measurements"),
+    "/api/reports/quarter": ("user_profile", "food_entries", "sport_activities", "weight_logs", "health_measurements"),
+    "/api/reports/year": ("user_profile", "food_entries", "sport_activities", "weight_logs", "health_measurements"),
+    "/api/reports/custom": ("user_profile", "food_entries", "sport_activities", "weight_logs", "health_measurements"),
+    "/api/gamification": ("user_profile", "food_entries", "sport_activities"),
+    "/api/dashboard/overview": ("user_profile", "food_entries", "sport_activities", "weight_logs",
+                                "daily_coaching", "often_used_foods"),
+    "/api/dashboard/charts": ("user_profile", "food_entries", "sport_activities", "weight_logs"),
+    "/api/dashboard/health": ("health_measurements",),
+    "/api/dashboard/coaching": ("coaching_reports",),
+}
+
+response_cache = ResponseCache()
+
+@app.middleware("http")
+async def cache_responses(request: Request, call_next):
+    """Serve cached GET responses with strong ETags; writes invalidate by generation."""
+    tables = CACHED_ROUTES.get(request.url.path)
+    if request.method != "GET" or tables is None or not response_cache.enabled:
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            response_cache.mark_stale()
+        return response
+
+    if response_cache.needs_sync():
+        await run_in_threadpool(response_cache.sync)
+    key = response_cache.key(request.url.path, str(request.query_params), tables)
+    if_none_match = request.headers.get("if-none-match")
+
+    cached = response_cache.get(key)
+    if cached is not None:
+        etag, body, headers = cached
+        if etag_matches(if_none_match, etag):
+            response_cache.count_not_modified()
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        return Response(content=body, headers={**headers, "ETag": etag})
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers["Cache-Control"] = "no-cache"  # always revalidate, but with If-None-Match
+    etag = response_cache.put(key, body, headers)
+    if etag_matches(if_none_match, etag):
+        response_cache.count_not_modified()
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return Response(content=body, status_code=200, headers={**headers, "ETag": etag})
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """Response cache hit/miss counters for sizing NUTRITRACK_RESPONSE_CACHE_SIZE."""
+    return response_cache.snapshot()
+
+# ── Metrics & Health ─────────────────────────────────────────────────
+# Added last, so it wraps everything else (cached responses included)
+request_metrics = Metrics()
+app.add_middleware(MetricsMiddleware, metrics=request_metrics, router=app.router)
+ready = False
+
+@app.get("/metrics")
+def get_metrics():
+    """Per-route request counts, latency, DB time and response size histograms (Prometheus text format)."""
+    return Response(content=request_metrics.render() + writer.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/healthz")
+def healthz():
+    """Readiness probe: 200 once startup (migrations) finished. Touches no database."""
+    if not ready:
+        return Response(content='{"status": "starting"}', status_code=503, media_type="application/json")
+    return {"status": "ok"}
+
+# ── Profiling ────────────────────────────────────────────────────────
+def require_debug_token(authorization: Optional[str] = Header(None)):
+    """Debug endpoints exist only when NUTRITRACK_DEBUG_TOKEN is set, and need it as a Bearer token."""
+    if not profiling.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {profiling.DEBUG_TOKEN}".encode()):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_token)])
+def profile_worker(seconds: float = Query(10, gt=0, le=profiling.MAX_PROFILE_SECONDS),
+                   interval: float = Query(profiling.DEFAULT_INTERVAL, ge=0.001, le=1),
+                   format: str = Query("collapsed", pattern="^(collapsed|pstats)$"),
+                   idle: bool = False):
+    """Sample every thread of this worker for N seconds; collapsed stacks (flamegraph) or a pstats file."""
+    try:
+        stacks, rounds, elapsed = profiling.sample_stacks(seconds, interval, idle)
+    except profiling.ProfilerStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "pstats":
+        return Response(content=profiling.pstats_dump(stacks, elapsed / max(rounds, 1)),
+                        media_type="application/octet-stream",
+                        headers={"Content-Disposition": 'attachment; filename="nutritrack.pstats"'})
+    return Response(content=profiling.collapsed(stacks), media_type="text/plain; charset=utf-8",
+                    headers={"X-Profile-Samples": str(rounds)})
+
+@app.post("/debug/tracemalloc/start", dependencies=[Depends(require_debug_token)])
+def start_tracemalloc(frames: int = Query(10, ge=1, le=100)):
+    """Start tracing allocations and take the baseline snapshot."""
+    return profiling.start_tracing(frames)
+
+@app.get("/debug/tracemalloc", dependencies=[Depends(require_debug_token)])
+def diff_tracemalloc(key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+                     limit: int = Query(25, ge=1, le=500), rebase: bool = False):
+    """Allocation sites that grew most since the baseline (rebase=true moves the baseline here)."""
+    try:
+        return profiling.snapshot_diff(key_type, limit, rebase)
+    except profiling.ProfilerStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/debug/tracemalloc/stop", dependencies=[Depends(require_debug_token)])
+def stop_tracemalloc():
+    """Stop tracing allocations and drop the baseline."""
+    return profiling.stop_tracing()
+
+# ── Live Events ──────────────────────────────────────────────────────
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """Server-Sent Events stream of change notifications (entry, gamification, resync)."""
+    last_event_id = request.headers.get("last-event-id")
+    queue = hub.subscribe(int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(*event)
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.on_event("startup")
 def startup():
+    global ready
     init_db()
     # Auto-seed demo data on first run if configured
     if os.environ.get("SEED_DEMO_DATA", "false").lower() == "true":
         conn = get_db()
-        has_data = conn.execute("SELECT COUNT(*) FROM food_entries").fetchone()[0]
-        conn.close()
-        if has_data == 0:
-            seed_demo_data()
-            print("Auto-seeded demo data.")
-
-# ── Pydantic Models ─────────────────────────────────────────────────
-class ProfileCreate(BaseModel):
-    age: int = Field(..., ge=10, le=120)
-    sex: str = Field(..., pattern="^(male|female)$")
-    height_cm: float = Field(..., ge=50, le=300)
-    current_weight_kg: float = Field(..., ge=20, le=500)
-    activity_level: str = Field(default="moderate")
-    weight_goal_kg: Optional[float] = None
-    calorie_deficit: int = Field(default=500, ge=0, le=2000)
-    calorie_surplus: int = Field(default=300, ge=0, le=1000)
-    goal_mode: str = Field(default="deficit")
-
-class GoalModeUpdate(BaseModel):
-    goal_mode: str = Field(..., pattern="^(deficit|maintain|surplus)$")
-    calorie_adjustment: Optional[int] = None
-
-class FoodEntry(BaseModel):
-    name: str
-    calories: float = 0
-    protein_g: float = 0
-    carbs_g: float = 0
-    fat_g: float = 0
-    meal_type: str = "snack"
-    quantity: Optional[str] = None
-    notes: Optional[str] = None
-    logged_at: Optional[str] = None # ISO format, defaults to now
-
-class WeightEntry(BaseModel):
-    weight_kg: float = Field(..., ge=20, le=500)
-    notes: Optional[str] = None
-    measured_at: Optional[str] = None
-
-class ActivityEntry(BaseModel):
-    activity_type: str
-    duration_minutes: int = 0
-    calories_burned: float = 0
-    intensity: str = "moderate"
-    notes: Optional[str] = None
-    performed_at: Optional[str] = None
-
-class HealthEntry(BaseModel):
-    systolic_bp: Optional[int] = None
-    diastolic_bp: Optional[int] = None
-    blood_sugar: Optional[float] = None
-    blood_oxygen: Optional[float] = None
-    heart_rate: Optional[int] = None
-    notes: Optional[str] = None
-    measured_at: Optional[str] = None
-
-class OftenUsedItem(BaseModel):
-    name: str
-    calories: float = 0
-    protein_g: float = 0
-    carbs_g: float = 0
-    fat_g: float = 0
-    meal_type: str = "snack"
-
-class OftenUsedUpdate(BaseModel):
-    items: list[OftenUsedItem]
-
-class AddFromEntry(BaseModel):
-    food_entry_id: int
-
-class DailyCoaching(BaseModel):
-    coaching_date: str  # YYYY-MM-DD
-    coaching_text: str  # Full coaching tip (can be multi-line)
-    meal_count: Optional[int] = 0
-    calories_so_far: Optional[float] = 0
-    calories_remaining: Optional[float] = 0
-    protein_status: Optional[str] = "unknown"  # on_track, low, critical, exceeded
-    top_priority: Optional[str] = None  # One-line priority
-
-class CoachingReport(BaseModel):
-    week_start: str
-    week_end: str
-    report_text: str
-    summary_json: Optional[str] = None
+        try:
+            has_data = conn.execute("SELECT COUNT(*) FROM food_entries").fetchone()[0]
+            if has_data == 0:
+                generate_demo_data(conn, DEMO_DAYS)
+                print("Auto-seeded demo data.")
+        finally:
+            conn.close()
+    ready = True
+
+@app.on_event("shutdown")
+def shutdown():
+    global ready
+    ready = False
+    writer.stop()
+    close_pool()
 
 # ── Helper ───────────────────────────────────────────────────────────
 def row_to_dict(row):
@@ -134,12 +253,122 @@ def row_to_dict(row):
 def rows_to_list(rows):
     return [dict(r) for r in rows]
 
-def get_date_range(date_str: str):
-    """Return start and end datetime strings for a given date."""
-    d = date.fromisoformat(date_str)
-    start = datetime.combine(d, datetime.min.time()).isoformat()
-    end = datetime.combine(d, datetime.max.time()).isoformat()
-    return start, end
+def entry_list(rows) -> dict:
+    return {"entries": rows_to_list(rows), "count": len(rows)}
+
+def intake_from_totals(totals: dict) -> dict:
+    """Pick the intake fields out of a daily_totals row."""
+    return {k: totals[k] for k in ("calories", "protein_g", "carbs_g", "fat_g")}
+
+def day_rows(conn, table: str, start_day: str, end_day: str = None, columns: str = "*") -> list:
+    """Rows of a timestamped table whose local day is within [start_day, end_day], oldest first."""
+    start_day = date.fromisoformat(start_day).isoformat()
+    end_day = date.fromisoformat(end_day).isoformat() if end_day else start_day
+    return conn.execute(
+        f"SELECT {columns} FROM {table} WHERE local_day BETWEEN ? AND ? ORDER BY local_day, epoch",
+        (start_day, end_day)
+    ).fetchall()
+
+def paged_rows(conn, table: str, start: Optional[str], end: Optional[str], cursor: Optional[str],
+               limit: int, fields: Optional[str], newest_first: bool = False) -> dict:
+    """Keyset page of a timestamped table; bad dates, cursors or fields are a 400."""
+    try:
+        start_day = date.fromisoformat(start).isoformat() if start else None
+        end_day = date.fromisoformat(end).isoformat() if end else None
+        return fetch_page(conn, table, start_day, end_day, cursor, limit, fields, newest_first)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ── Batch Write Helpers ──────────────────────────────────────────────
+IDEMPOTENCY_TTL_DAYS = 7
+
+def insert_rows(conn, table: str, columns: tuple, rows: list) -> list:
+    """executemany() insert; returns the created rows in insertion order.
+
+    Must run inside transaction() so no other writer can interleave ids.
+    """
+    last_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    placeholders = ", ".join("?" * len(columns))
+    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+    return rows_to_list(conn.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (last_id,)).fetchall())
+
+def load_idempotent_response(conn, key: Optional[str], endpoint: str):
+    """Stored response for a retried batch, or None if the key is new."""
+    if not key:
+        return None
+    row = conn.execute(
+        "SELECT endpoint, response_json FROM idempotency_keys WHERE key = ?", (key,)
+    ).fetchone()
+    if not row:
+        return None
+    if row["endpoint"] != endpoint:
+        raise HTTPException(status_code=409, detail=f"Idempotency key already used for {row['endpoint']} batch")
+    return dict(json.loads(row["response_json"]), replayed=True)
+
+def save_idempotent_response(conn, key: Optional[str], endpoint: str, response: dict):
+    if not key:
+        return
+    conn.execute(
+        "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)", (f"-{IDEMPOTENCY_TTL_DAYS} days",)
+    )
+    conn.execute(
+        "INSERT INTO idempotency_keys (key, endpoint, response_json) VALUES (?, ?, ?)",
+        (key, endpoint, json.dumps(response))
+    )
+
+# ── Change Events ────────────────────────────────────────────────────
+def publish_change(conn, kind: str, action: str, ids=(), timestamps=()):
+    """Tell /api/events subscribers about a committed write (no-op without subscribers).
+
+    Events are notifications only (kind, ids, affected days): the dashboard
+    refetches what it shows, so nothing is queried here on behalf of clients.
+    Anything that can move goals or streaks adds a gamification hint. Inside
+    /api/batch, changes wait on the connection until the batch commits.
+    """
+    if not hub.subscriber_count:
+        return
+    deferred = getattr(conn, "deferred_changes", None)
+    if deferred is not None:
+        deferred.append((kind, action, ids, timestamps))
+        return
+    days = sorted({day for day in map(local_day, timestamps) if day})
+    hub.publish("entry", kind=kind, action=action, ids=list(ids), days=days)
+    if kind in ("food", "activity", "weight", "profile"):
+        hub.publish("gamification", reason=kind)
+
+# ── Write Queue ──────────────────────────────────────────────────────
+def submit_write(fn, exclusive: bool = False):
+    """Run fn on the writer thread (see writer.py); a full queue is a 503."""
+    try:
+        return writer.run(fn, exclusive)
+    except WriteQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def serialized(handler):
+    """Route a write endpoint through the writer thread, committing with concurrent writes.
+
+    The route gets the handler's signature minus conn; the handler runs on the
+    writer's connection, and its change events go out after the group commits.
+    """
+    signature = inspect.signature(handler)
+
+    def job(conn, kwargs):
+        conn.deferred_changes = []
+        try:
+            return handler(conn=conn, **kwargs), conn.deferred_changes
+        finally:
+            conn.deferred_changes = None
+
+    @functools.wraps(handler)
+    def endpoint(**kwargs):
+        result, changes = submit_write(lambda conn: job(conn, kwargs))
+        for change in changes:
+            publish_change(None, *change)  # committed; events need no connection
+        return result
+
+    endpoint.__signature__ = signature.replace(
+        parameters=[p for p in signature.parameters.values() if p.name != "conn"])
+    return endpoint
 
 # ── Coaching Tips Helper ─────────────────────────────────────────────
 def generate_coaching_tips(profile: dict, intake: dict, goals: dict) -> list:
@@ -186,53 +415,50 @@ def serve_dashboard():
 
 # ── Profile Endpoints ────────────────────────────────────────────────
 @app.get("/api/profile")
-def get_profile():
-    conn = get_db()
-    row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    conn.close()
-    if not row:
+def get_profile(conn=Depends(get_conn)):
+    profile = get_active_profile(conn)
+    if not profile:
         return {"profile": None, "message": "No profile set. Please create your profile first."}
-    return {"profile": row_to_dict(row)}
+    return {"profile": profile}
 
 @app.put("/api/profile")
-def update_profile(profile: ProfileCreate):
-    conn = get_db()
-    # Check if profile exists
-    existing = conn.execute("SELECT id FROM user_profile LIMIT 1").fetchone()
+@serialized
+def update_profile(profile: ProfileCreate, conn=Depends(get_conn)):
+    with transaction(conn):
+        # Check if profile exists
+        existing = conn.execute("SELECT id FROM user_profile LIMIT 1").fetchone()
     
-    if existing:
-        conn.execute("""
-            UPDATE user_profile
-            SET age=?, sex=?, height_cm=?, current_weight_kg=?, activity_level=?, weight_goal_kg=?, calorie_deficit=?, calorie_surplus=?, goal_mode=?, updated_at=CURRENT_TIMESTAMP
-            WHERE id=?
-        """, (profile.age, profile.sex, profile.height_cm, profile.current_weight_kg, profile.activity_level, profile.weight_goal_kg, profile.calorie_deficit, profile.calorie_surplus, profile.goal_mode, existing["id"]))
-    else:
-        conn.execute("""
-            INSERT INTO user_profile (age, sex, height_cm, current_weight_kg, activity_level, weight_goal_kg, calorie_deficit, calorie_surplus, goal_mode)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (profile.age, profile.sex, profile.height_cm, profile.current_weight_kg, profile.activity_level, profile.weight_goal_kg, profile.calorie_deficit, profile.calorie_surplus, profile.goal_mode))
+        if existing:
+            conn.execute("""
+                UPDATE user_profile
+                SET age=?, sex=?, height_cm=?, current_weight_kg=?, activity_level=?, weight_goal_kg=?, calorie_deficit=?, calorie_surplus=?, goal_mode=?, updated_at=CURRENT_TIMESTAMP
+                WHERE id=?
+            """, (profile.age, profile.sex, profile.height_cm, profile.current_weight_kg, profile.activity_level, profile.weight_goal_kg, profile.calorie_deficit, profile.calorie_surplus, profile.goal_mode, existing["id"]))
+        else:
+            conn.execute("""
+                INSERT INTO user_profile (age, sex, height_cm, current_weight_kg, activity_level, weight_goal_kg, calorie_deficit, calorie_surplus, goal_mode)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (profile.age, profile.sex, profile.height_cm, profile.current_weight_kg, profile.activity_level, profile.weight_goal_kg, profile.calorie_deficit, profile.calorie_surplus, profile.goal_mode))
         
-        # Also log initial weight
-        conn.execute("""
-            INSERT INTO weight_logs (weight_kg, notes, measured_at)
-            VALUES (?, 'Profile update', CURRENT_TIMESTAMP)
-        """, (profile.current_weight_kg,))
-    
-    conn.commit()
-    row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    conn.close()
-    return {"profile": row_to_dict(row), "message": "Profile updated successfully."}
+            # Also log initial weight
+            conn.execute("""
+                INSERT INTO weight_logs (weight_kg, notes, measured_at)
+                VALUES (?, 'Profile update', CURRENT_TIMESTAMP)
+            """, (profile.current_weight_kg,))
+    invalidate_profile(conn)
+    publish_change(conn, "profile", "updated")
+    return {"profile": get_active_profile(conn), "message": "Profile updated successfully."}
 
 # ── Goal Mode Endpoint ───────────────────────────────────────────────
 @app.put("/api/goal-mode")
-async def update_goal_mode(data: GoalModeUpdate):
-    conn = get_db()
-    try:
-        profile = conn.execute("SELECT id FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-        if not profile:
-            raise HTTPException(status_code=404, detail="No profile found. Create a profile first.")
-
-        profile_id = profile["id"]
+@serialized
+def update_goal_mode(data: GoalModeUpdate, conn=Depends(get_conn)):
+    profile = conn.execute("SELECT id FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
+    if not profile:
+        raise HTTPException(status_code=404, detail="No profile found. Create a profile first.")
+
+    profile_id = profile["id"]
+    with transaction(conn):
         conn.execute("UPDATE user_profile SET goal_mode = ? WHERE id = ?", (data.goal_mode, profile_id))
 
         if data.calorie_adjustment is not None:
@@ -244,85 +470,90 @@ async def update_goal_mode(data: GoalModeUpdate):
                 conn.execute("UPDATE user_profile SET calorie_surplus = ? WHERE id = ?", (adj, profile_id))
 
         conn.execute("UPDATE user_profile SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (profile_id,))
-        conn.commit()
+    invalidate_profile(conn)
+    publish_change(conn, "profile", "updated")
 
-        return {"message": f"Goal mode set to {data.goal_mode}", "goal_mode": data.goal_mode}
-    finally:
-        conn.close()
+    return {"message": f"Goal mode set to {data.goal_mode}", "goal_mode": data.goal_mode}
 
 # ── Food Endpoints ───────────────────────────────────────────────────
 @app.post("/api/food")
-def log_food(entry: FoodEntry):
-    conn = get_db()
-    logged_at = entry.logged_at or datetime.now().isoformat()
+@serialized
+def log_food(entry: FoodEntry, conn=Depends(get_conn)):
+    logged_at = entry.logged_at or local_now().isoformat()
 
-    conn.execute("""
-        INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, notes, logged_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (entry.name, entry.calories, entry.protein_g, entry.carbs_g, entry.fat_g, entry.meal_type, entry.quantity, entry.notes, logged_at))
-    conn.commit()
+    with transaction(conn):
+        conn.execute("""
+            INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, notes, logged_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (entry.name, entry.calories, entry.protein_g, entry.carbs_g, entry.fat_g, entry.meal_type, entry.quantity, entry.notes, logged_at))
 
     last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
     row = conn.execute("SELECT * FROM food_entries WHERE id=?", (last_id,)).fetchone()
+    publish_change(conn, "food", "created", [last_id], [logged_at])
 
     # Generate coaching tips based on updated daily totals
     tips = []
-    profile_row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    if profile_row:
-        profile = row_to_dict(profile_row)
-        entry_date = logged_at[:10]
-        start, end = get_date_range(entry_date)
-        totals = conn.execute(
-            "SELECT COALESCE(SUM(calories),0) as cal, COALESCE(SUM(protein_g),0) as prot, "
-            "COALESCE(SUM(carbs_g),0) as carb, COALESCE(SUM(fat_g),0) as fat "
-            "FROM food_entries WHERE logged_at BETWEEN ? AND ?", (start, end)
-        ).fetchone()
-        act = conn.execute(
-            "SELECT COALESCE(SUM(calories_burned),0) as burned "
-            "FROM sport_activities WHERE performed_at BETWEEN ? AND ?", (start, end)
-        ).fetchone()
-        goals = calculate_daily_goals(profile, act["burned"])
-        intake = {"calories": totals["cal"], "protein_g": totals["prot"], "carbs_g": totals["carb"], "fat_g": totals["fat"]}
-        tips = generate_coaching_tips(profile, intake, goals)
+    profile = get_active_profile(conn)
+    if profile:
+        totals = get_day_totals(conn, row["local_day"])
+        goals = calculate_daily_goals(profile, totals["calories_burned"])
+        tips = generate_coaching_tips(profile, intake_from_totals(totals), goals)
 
-    conn.close()
     return {"entry": row_to_dict(row), "message": f"Logged: {entry.name} ({entry.calories} kcal)", "coaching_tips": tips}
 
+@app.post("/api/food/batch")
+@serialized
+def log_food_batch(batch: FoodBatch, idempotency_key: Optional[str] = Header(None), conn=Depends(get_conn)):
+    """Log many food entries in one transaction; coaching tips are computed once per affected day."""
+    now = local_now().isoformat()
+    with transaction(conn):
+        replay = load_idempotent_response(conn, idempotency_key, "food")
+        if replay is not None:
+            return replay
+
+        entries = insert_rows(
+            conn, "food_entries",
+            ("name", "calories", "protein_g", "carbs_g", "fat_g", "meal_type", "quantity", "notes", "logged_at"),
+            [(e.name, e.calories, e.protein_g, e.carbs_g, e.fat_g, e.meal_type, e.quantity, e.notes, e.logged_at or now)
+             for e in batch.entries]
+        )
+
+        tips = {}
+        profile = get_active_profile(conn)
+        if profile:
+            for day in sorted({e["local_day"] for e in entries}):
+                totals = get_day_totals(conn, day)
+                goals = calculate_daily_goals(profile, totals["calories_burned"])
+                tips[day] = generate_coaching_tips(profile, intake_from_totals(totals), goals)
+
+        total_cal = sum(e["calories"] for e in entries)
+        response = {
+            "entries": entries,
+            "count": len(entries),
+            "message": f"Logged {len(entries)} food entries ({round(total_cal)} kcal)",
+            "coaching_tips": tips,
+        }
+        save_idempotent_response(conn, idempotency_key, "food", response)
+    publish_change(conn, "food", "created", [e["id"] for e in entries], [e["logged_at"] for e in entries])
+    return response
+
 @app.get("/api/food")
-def get_food(date: Optional[str] = None):
-    conn = get_db()
-    if date:
-        start, end = get_date_range(date)
-        rows = conn.execute(
-            "SELECT * FROM food_entries WHERE logged_at BETWEEN ? AND ? ORDER BY logged_at", (start, end)
-        ).fetchall()
-    else:
-        # Default to today
-        today = datetime.now().date().isoformat()
-        start, end = get_date_range(today)
-        rows = conn.execute(
-            "SELECT * FROM food_entries WHERE logged_at BETWEEN ? AND ? ORDER BY logged_at", (start, end)
-        ).fetchall()
-    conn.close()
+def get_food(date: Optional[str] = None, conn=Depends(get_conn)):
+    # Default to today
+    rows = day_rows(conn, "food_entries", date or local_today().isoformat())
     return {"entries": rows_to_list(rows), "count": len(rows)}
 
 @app.get("/api/food/search")
-def search_food(q: str = Query(..., min_length=1)):
-    """Search past food entries by name."""
-    conn = get_db()
-    rows = conn.execute(
-        "SELECT DISTINCT name, calories, protein_g, carbs_g, fat_g, meal_type, quantity "
-        "FROM food_entries WHERE name LIKE ? ORDER BY name LIMIT 20",
-        (f"%{q}%",)
-    ).fetchall()
-    conn.close()
-    return {"results": rows_to_list(rows), "count": len(rows)}
+def search_food(q: str = Query(..., min_length=1), conn=Depends(get_conn)):
+    """Search past foods by name, quantity or notes (word-prefix matching, best first)."""
+    results = search_foods(conn, q)
+    return {"results": results, "count": len(results)}
 
 # ── Often Used Foods (Agent-Curated) ─────────────────────────────────
 @app.get("/api/food/history/frequent")
-def get_frequent_foods(days: int = 14):
+def get_frequent_foods(days: int = 14, conn=Depends(get_conn)):
     """Get frequency-sorted food history for agent analysis. Agent uses this to build the often-used list."""
-    conn = get_db()
+    # Unary + on name: otherwise SQLite walks the whole name index to skip the GROUP BY sort
     rows = conn.execute("""
         SELECT name,
                meal_type,
@@ -338,12 +569,11 @@ def get_frequent_foods(days: int = 14):
                ROUND(AVG(fat_g), 1) as avg_fat,
                quantity
         FROM food_entries
-        WHERE logged_at >= date('now', '-' || ? || ' days')
-        GROUP BY LOWER(TRIM(name))
+        WHERE local_day >= ?
+        GROUP BY LOWER(TRIM(+name))
         ORDER BY times_logged DESC
         LIMIT 30
-    """, (days,)).fetchall()
-    conn.close()
+    """, ((local_today() - timedelta(days=days)).isoformat(),)).fetchall()
 
     return {
         "days_analyzed": days,
@@ -352,25 +582,24 @@ def get_frequent_foods(days: int = 14):
     }
 
 @app.put("/api/food/often-used")
-def update_often_used(data: OftenUsedUpdate):
+@serialized
+def update_often_used(data: OftenUsedUpdate, conn=Depends(get_conn)):
     """Replace the entire often-used foods list with agent-curated items."""
     if len(data.items) > 15:
         raise HTTPException(status_code=400, detail="Maximum 15 items allowed")
 
-    conn = get_db()
-    conn.execute("DELETE FROM often_used_foods")
+    with transaction(conn):
+        conn.execute("DELETE FROM often_used_foods")
 
-    for i, item in enumerate(data.items):
-        conn.execute(
-            "INSERT INTO often_used_foods (name, calories, protein_g, carbs_g, fat_g, meal_type, sort_order) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (item.name, item.calories, item.protein_g, item.carbs_g, item.fat_g,
-             item.meal_type, i)
-        )
-
-    conn.commit()
+        for i, item in enumerate(data.items):
+            conn.execute(
+                "INSERT INTO often_used_foods (name, calories, protein_g, carbs_g, fat_g, meal_type, sort_order) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (item.name, item.calories, item.protein_g, item.carbs_g, item.fat_g,
+                 item.meal_type, i)
+            )
+    publish_change(conn, "often_used", "updated")
     items = conn.execute("SELECT * FROM often_used_foods ORDER BY sort_order").fetchall()
-    conn.close()
 
     return {
         "message": f"Often-used list updated with {len(data.items)} items.",
@@ -379,32 +608,29 @@ def update_often_used(data: OftenUsedUpdate):
     }
 
 @app.get("/api/food/often-used")
-def get_often_used():
+def get_often_used(conn=Depends(get_conn)):
     """Get the agent-curated often-used foods list."""
-    conn = get_db()
     rows = conn.execute("SELECT * FROM often_used_foods ORDER BY sort_order").fetchall()
-    conn.close()
     return {"items": rows_to_list(rows), "count": len(rows)}
 
 @app.post("/api/food/often-used/{item_id}/add")
-def add_often_used_to_today(item_id: int):
+@serialized
+def add_often_used_to_today(item_id: int, conn=Depends(get_conn)):
     """Quick-add one portion of an often-used food item to today's log."""
-    conn = get_db()
     item = conn.execute("SELECT * FROM often_used_foods WHERE id = ?", (item_id,)).fetchone()
 
     if not item:
-        conn.close()
         raise HTTPException(status_code=404, detail="Item not found in often-used list")
 
-    now = datetime.now()
-    conn.execute(
-        "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, logged_at) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (item["name"], item["calories"], item["protein_g"], item["carbs_g"],
-         item["fat_g"], item["meal_type"], now.isoformat())
-    )
-    conn.commit()
-    conn.close()
+    now = local_now()
+    with transaction(conn):
+        cursor = conn.execute(
+            "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, logged_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (item["name"], item["calories"], item["protein_g"], item["carbs_g"],
+             item["fat_g"], item["meal_type"], now.isoformat())
+        )
+    publish_change(conn, "food", "created", [cursor.lastrowid], [now.isoformat()])
 
     today_str = now.strftime("%d.%m.%y")
     return {
@@ -415,12 +641,11 @@ def add_often_used_to_today(item_id: int):
     }
 
 @app.post("/api/food/often-used/add-from-entry")
-def add_to_often_used_from_entry(data: AddFromEntry):
+@serialized
+def add_to_often_used_from_entry(data: AddFromEntry, conn=Depends(get_conn)):
     """Save a food log entry to the often-used foods list."""
-    conn = get_db()
     entry = conn.execute("SELECT * FROM food_entries WHERE id = ?", (data.food_entry_id,)).fetchone()
     if not entry:
-        conn.close()
         raise HTTPException(status_code=404, detail="Food entry not found")
 
     # Check if already exists (case-insensitive, trimmed)
@@ -429,29 +654,27 @@ def add_to_often_used_from_entry(data: AddFromEntry):
         (entry["name"],)
     ).fetchone()
     if existing:
-        conn.close()
         return {"status": "exists", "message": f"{entry['name']} is already in your often-used foods"}
 
     # Enforce 15-item max
     count = conn.execute("SELECT COUNT(*) FROM often_used_foods").fetchone()[0]
     if count >= 15:
-        conn.close()
         return {"status": "full", "message": "Often-used list is full (max 15 items). Remove an item first or let the agent curate it."}
 
     # Get next sort_order
     max_order = conn.execute("SELECT MAX(sort_order) FROM often_used_foods").fetchone()[0]
     next_order = (max_order + 1) if max_order is not None else 0
 
-    conn.execute(
-        "INSERT INTO often_used_foods (name, calories, protein_g, carbs_g, fat_g, meal_type, sort_order) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (entry["name"], entry["calories"], entry["protein_g"], entry["carbs_g"],
-         entry["fat_g"], entry["meal_type"], next_order)
-    )
-    conn.commit()
+    with transaction(conn):
+        conn.execute(
+            "INSERT INTO often_used_foods (name, calories, protein_g, carbs_g, fat_g, meal_type, sort_order) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry["name"], entry["calories"], entry["protein_g"], entry["carbs_g"],
+             entry["fat_g"], entry["meal_type"], next_order)
+        )
+    publish_change(conn, "often_used", "updated")
 
     item = conn.execute("SELECT * FROM often_used_foods WHERE sort_order = ?", (next_order,)).fetchone()
-    conn.close()
 
     return {
         "status": "added",
@@ -460,236 +683,290 @@ def add_to_often_used_from_entry(data: AddFromEntry):
     }
 
 @app.get("/api/food/range")
-def get_food_range(start: str, end: str):
-    conn = get_db()
-    s = datetime.combine(date.fromisoformat(start), datetime.min.time()).isoformat()
-    e = datetime.combine(date.fromisoformat(end), datetime.max.time()).isoformat()
-    rows = conn.execute(
-        "SELECT * FROM food_entries WHERE logged_at BETWEEN ? AND ? ORDER BY logged_at", (s, e)
-    ).fetchall()
-    conn.close()
-    return {"entries": rows_to_list(rows), "count": len(rows)}
+def get_food_range(start: str, end: str, cursor: Optional[str] = None,
+                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), fields: Optional[str] = None,
+                   conn=Depends(get_conn)):
+    """Food entries between two days, oldest first, one page at a time (follow next_cursor)."""
+    return paged_rows(conn, "food_entries", start, end, cursor, limit, fields)
 
 @app.put("/api/food/{entry_id}")
-def update_food(entry_id: int, entry: FoodEntry):
-    conn = get_db()
-    existing = conn.execute("SELECT id FROM food_entries WHERE id=?", (entry_id,)).fetchone()
+@serialized
+def update_food(entry_id: int, entry: FoodEntry, conn=Depends(get_conn)):
+    existing = conn.execute("SELECT id, logged_at FROM food_entries WHERE id=?", (entry_id,)).fetchone()
     if not existing:
-        conn.close()
         raise HTTPException(status_code=404, detail="Food entry not found")
-    conn.execute("""
-        UPDATE food_entries
-        SET name=?, calories=?, protein_g=?, carbs_g=?, fat_g=?, meal_type=?, quantity=?, notes=?
-        WHERE id=?
-    """, (entry.name, entry.calories, entry.protein_g, entry.carbs_g, entry.fat_g,
-          entry.meal_type, entry.quantity, entry.notes, entry_id))
-    conn.commit()
+    with transaction(conn):
+        conn.execute("""
+            UPDATE food_entries
+            SET name=?, calories=?, protein_g=?, carbs_g=?, fat_g=?, meal_type=?, quantity=?, notes=?
+            WHERE id=?
+        """, (entry.name, entry.calories, entry.protein_g, entry.carbs_g, entry.fat_g,
+              entry.meal_type, entry.quantity, entry.notes, entry_id))
     row = conn.execute("SELECT * FROM food_entries WHERE id=?", (entry_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "food", "updated", [entry_id], [existing["logged_at"]])
     return {"entry": row_to_dict(row), "message": f"Food entry {entry_id} updated."}
 
 @app.delete("/api/food/{entry_id}")
-def delete_food(entry_id: int):
-    conn = get_db()
-    conn.execute("DELETE FROM food_entries WHERE id=?", (entry_id,))
-    conn.commit()
-    conn.close()
+@serialized
+def delete_food(entry_id: int, conn=Depends(get_conn)):
+    existing = conn.execute("SELECT logged_at FROM food_entries WHERE id=?", (entry_id,)).fetchone()
+    with transaction(conn):
+        conn.execute("DELETE FROM food_entries WHERE id=?", (entry_id,))
+    if existing:
+        publish_change(conn, "food", "deleted", [entry_id], [existing["logged_at"]])
     return {"message": f"Food entry {entry_id} deleted."}
 
 # ── Weight Endpoints ─────────────────────────────────────────────────
 @app.post("/api/weight")
-def log_weight(entry: WeightEntry):
-    conn = get_db()
-    measured_at = entry.measured_at or datetime.now().isoformat()
+@serialized
+def log_weight(entry: WeightEntry, conn=Depends(get_conn)):
+    measured_at = entry.measured_at or local_now().isoformat()
     
-    conn.execute(
-        "INSERT INTO weight_logs (weight_kg, notes, measured_at) VALUES (?, ?, ?)",
-        (entry.weight_kg, entry.notes, measured_at)
-    )
-    # Also update profile's current weight
-    conn.execute(
-        "UPDATE user_profile SET current_weight_kg=?, updated_at=CURRENT_TIMESTAMP", (entry.weight_kg,)
-    )
-    conn.commit()
+    with transaction(conn):
+        conn.execute(
+            "INSERT INTO weight_logs (weight_kg, notes, measured_at) VALUES (?, ?, ?)",
+            (entry.weight_kg, entry.notes, measured_at)
+        )
+        # Also update profile's current weight
+        conn.execute(
+            "UPDATE user_profile SET current_weight_kg=?, updated_at=CURRENT_TIMESTAMP", (entry.weight_kg,)
+        )
+    invalidate_profile(conn)
     
     last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
     row = conn.execute("SELECT * FROM weight_logs WHERE id=?", (last_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "weight", "created", [last_id], [measured_at])
     return {"entry": row_to_dict(row), "message": f"Weight logged: {entry.weight_kg} kg"}
 
+@app.post("/api/weight/batch")
+@serialized
+def log_weight_batch(batch: WeightBatch, idempotency_key: Optional[str] = Header(None), conn=Depends(get_conn)):
+    """Log many weight measurements in one transaction."""
+    now = local_now().isoformat()
+    with transaction(conn):
+        replay = load_idempotent_response(conn, idempotency_key, "weight")
+        if replay is not None:
+            return replay
+
+        entries = insert_rows(
+            conn, "weight_logs", ("weight_kg", "notes", "measured_at"),
+            [(e.weight_kg, e.notes, e.measured_at or now) for e in batch.entries]
+        )
+
+        # Only move the profile's current weight if the batch holds the newest measurement
+        latest = max(entries, key=lambda e: (e["local_day"], e["epoch"], e["id"]))
+        newest = conn.execute(
+            "SELECT id FROM weight_logs ORDER BY local_day DESC, epoch DESC, id DESC LIMIT 1"
+        ).fetchone()
+        if newest["id"] == latest["id"]:
+            conn.execute(
+                "UPDATE user_profile SET current_weight_kg=?, updated_at=CURRENT_TIMESTAMP", (latest["weight_kg"],)
+            )
+
+        response = {"entries": entries, "count": len(entries), "message": f"Logged {len(entries)} weight entries"}
+        save_idempotent_response(conn, idempotency_key, "weight", response)
+    invalidate_profile(conn)
+    publish_change(conn, "weight", "created", [e["id"] for e in entries], [e["measured_at"] for e in entries])
+    return response
+
 @app.get("/api/weight")
-def get_weight(limit: int = 90):
-    conn = get_db()
-    rows = conn.execute(
-        "SELECT * FROM weight_logs ORDER BY measured_at DESC LIMIT ?", (limit,)
-    ).fetchall()
-    conn.close()
-    return {"entries": rows_to_list(rows), "count": len(rows)}
+def get_weight(limit: int = Query(90, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+               start: Optional[str] = None, end: Optional[str] = None, fields: Optional[str] = None,
+               conn=Depends(get_conn)):
+    """Weight measurements, newest first; follow next_cursor to page further back."""
+    return paged_rows(conn, "weight_logs", start, end, cursor, limit, fields, newest_first=True)
 
 # ── Activity Endpoints ───────────────────────────────────────────────
 @app.post("/api/activity")
-def log_activity(entry: ActivityEntry):
-    conn = get_db()
-    performed_at = entry.performed_at or datetime.now().isoformat()
+@serialized
+def log_activity(entry: ActivityEntry, conn=Depends(get_conn)):
+    performed_at = entry.performed_at or local_now().isoformat()
     
-    conn.execute("""
-        INSERT INTO sport_activities (activity_type, duration_minutes, calories_burned, intensity, notes, performed_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (entry.activity_type, entry.duration_minutes, entry.calories_burned, entry.intensity, entry.notes, performed_at))
-    conn.commit()
+    with transaction(conn):
+        conn.execute("""
+            INSERT INTO sport_activities (activity_type, duration_minutes, calories_burned, intensity, notes, performed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (entry.activity_type, entry.duration_minutes, entry.calories_burned, entry.intensity, entry.notes, performed_at))
     
     last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
     row = conn.execute("SELECT * FROM sport_activities WHERE id=?", (last_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "activity", "created", [last_id], [performed_at])
     return {"entry": row_to_dict(row), "message": f"Activity logged: {entry.activity_type} ({entry.calories_burned} kcal burned)"}
 
+@app.post("/api/activity/batch")
+@serialized
+def log_activity_batch(batch: ActivityBatch, idempotency_key: Optional[str] = Header(None), conn=Depends(get_conn)):
+    """Log many activities in one transaction."""
+    now = local_now().isoformat()
+    with transaction(conn):
+        replay = load_idempotent_response(conn, idempotency_key, "activity")
+        if replay is not None:
+            return replay
+
+        entries = insert_rows(
+            conn, "sport_activities",
+            ("activity_type", "duration_minutes", "calories_burned", "intensity", "notes", "performed_at"),
+            [(e.activity_type, e.duration_minutes, e.calories_burned, e.intensity, e.notes, e.performed_at or now)
+             for e in batch.entries]
+        )
+
+        total_burned = sum(e["calories_burned"] for e in entries)
+        response = {
+            "entries": entries,
+            "count": len(entries),
+            "message": f"Logged {len(entries)} activities ({round(total_burned)} kcal burned)",
+        }
+        save_idempotent_response(conn, idempotency_key, "activity", response)
+    publish_change(conn, "activity", "created", [e["id"] for e in entries], [e["performed_at"] for e in entries])
+    return response
+
 @app.get("/api/activity")
-def get_activity(date: Optional[str] = None):
-    conn = get_db()
-    if date:
-        start, end = get_date_range(date)
-        rows = conn.execute(
-            "SELECT * FROM sport_activities WHERE performed_at BETWEEN ? AND ? ORDER BY performed_at", (start, end)
-        ).fetchall()
-    else:
-        today = datetime.now().date().isoformat()
-        start, end = get_date_range(today)
-        rows = conn.execute(
-            "SELECT * FROM sport_activities WHERE performed_at BETWEEN ? AND ? ORDER BY performed_at", (start, end)
-        ).fetchall()
-    conn.close()
+def get_activity(date: Optional[str] = None, conn=Depends(get_conn)):
+    rows = day_rows(conn, "sport_activities", date or local_today().isoformat())
     return {"entries": rows_to_list(rows), "count": len(rows)}
 
 @app.get("/api/activity/range")
-def get_activity_range(start: str, end: str):
-    conn = get_db()
-    s = datetime.combine(date.fromisoformat(start), datetime.min.time()).isoformat()
-    e = datetime.combine(date.fromisoformat(end), datetime.max.time()).isoformat()
-    rows = conn.execute(
-        "SELECT * FROM sport_activities WHERE performed_at BETWEEN ? AND ? ORDER BY performed_at", (s, e)
-    ).fetchall()
-    conn.close()
-    return {"entries": rows_to_list(rows), "count": len(rows)}
+def get_activity_range(start: str, end: str, cursor: Optional[str] = None,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), fields: Optional[str] = None,
+                       conn=Depends(get_conn)):
+    """Activities between two days, oldest first, one page at a time (follow next_cursor)."""
+    return paged_rows(conn, "sport_activities", start, end, cursor, limit, fields)
 
 @app.put("/api/activity/{entry_id}")
-def update_activity(entry_id: int, entry: ActivityEntry):
-    conn = get_db()
-    existing = conn.execute("SELECT id FROM sport_activities WHERE id=?", (entry_id,)).fetchone()
+@serialized
+def update_activity(entry_id: int, entry: ActivityEntry, conn=Depends(get_conn)):
+    existing = conn.execute("SELECT id, performed_at FROM sport_activities WHERE id=?", (entry_id,)).fetchone()
     if not existing:
-        conn.close()
         raise HTTPException(status_code=404, detail="Activity entry not found")
-    conn.execute("""
-        UPDATE sport_activities
-        SET activity_type=?, duration_minutes=?, calories_burned=?, intensity=?, notes=?
-        WHERE id=?
-    """, (entry.activity_type, entry.duration_minutes, entry.calories_burned,
-          entry.intensity, entry.notes, entry_id))
-    conn.commit()
+    with transaction(conn):
+        conn.execute("""
+            UPDATE sport_activities
+            SET activity_type=?, duration_minutes=?, calories_burned=?, intensity=?, notes=?
+            WHERE id=?
+        """, (entry.activity_type, entry.duration_minutes, entry.calories_burned,
+              entry.intensity, entry.notes, entry_id))
     row = conn.execute("SELECT * FROM sport_activities WHERE id=?", (entry_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "activity", "updated", [entry_id], [existing["performed_at"]])
     return {"entry": row_to_dict(row), "message": f"Activity entry {entry_id} updated."}
 
 @app.delete("/api/activity/{entry_id}")
-def delete_activity(entry_id: int):
-    conn = get_db()
-    conn.execute("DELETE FROM sport_activities WHERE id=?", (entry_id,))
-    conn.commit()
-    conn.close()
+@serialized
+def delete_activity(entry_id: int, conn=Depends(get_conn)):
+    existing = conn.execute("SELECT performed_at FROM sport_activities WHERE id=?", (entry_id,)).fetchone()
+    with transaction(conn):
+        conn.execute("DELETE FROM sport_activities WHERE id=?", (entry_id,))
+    if existing:
+        publish_change(conn, "activity", "deleted", [entry_id], [existing["performed_at"]])
     return {"message": f"Activity entry {entry_id} deleted."}
 
 # ── Health Endpoints ─────────────────────────────────────────────────
 @app.post("/api/health")
-def log_health(entry: HealthEntry):
-    conn = get_db()
-    measured_at = entry.measured_at or datetime.now().isoformat()
+@serialized
+def log_health(entry: HealthEntry, conn=Depends(get_conn)):
+    measured_at = entry.measured_at or local_now().isoformat()
     
-    conn.execute("""
-        INSERT INTO health_measurements (systolic_bp, diastolic_bp, blood_sugar, blood_oxygen, heart_rate, notes, measured_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (entry.systolic_bp, entry.diastolic_bp, entry.blood_sugar, entry.blood_oxygen, entry.heart_rate, entry.notes, measured_at))
-    conn.commit()
+    with transaction(conn):
+        conn.execute("""
+            INSERT INTO health_measurements (systolic_bp, diastolic_bp, blood_sugar, blood_oxygen, heart_rate, notes, measured_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (entry.systolic_bp, entry.diastolic_bp, entry.blood_sugar, entry.blood_oxygen, entry.heart_rate, entry.notes, measured_at))
     
     last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
     row = conn.execute("SELECT * FROM health_measurements WHERE id=?", (last_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "health", "created", [last_id], [measured_at])
     return {"entry": row_to_dict(row), "message": "Health measurement logged."}
 
+@app.post("/api/health/batch")
+@serialized
+def log_health_batch(batch: HealthBatch, idempotency_key: Optional[str] = Header(None), conn=Depends(get_conn)):
+    """Log many health measurements in one transaction."""
+    now = local_now().isoformat()
+    with transaction(conn):
+        replay = load_idempotent_response(conn, idempotency_key, "health")
+        if replay is not None:
+            return replay
+
+        entries = insert_rows(
+            conn, "health_measurements",
+            ("systolic_bp", "diastolic_bp", "blood_sugar", "blood_oxygen", "heart_rate", "notes", "measured_at"),
+            [(e.systolic_bp, e.diastolic_bp, e.blood_sugar, e.blood_oxygen, e.heart_rate, e.notes, e.measured_at or now)
+             for e in batch.entries]
+        )
+
+        response = {"entries": entries, "count": len(entries), "message": f"Logged {len(entries)} health measurements"}
+        save_idempotent_response(conn, idempotency_key, "health", response)
+    publish_change(conn, "health", "created", [e["id"] for e in entries], [e["measured_at"] for e in entries])
+    return response
+
 @app.get("/api/health")
-def get_health(limit: int = 90):
-    conn = get_db()
-    rows = conn.execute(
-        "SELECT * FROM health_measurements ORDER BY measured_at DESC LIMIT ?", (limit,)
-    ).fetchall()
-    conn.close()
-    return {"entries": rows_to_list(rows), "count": len(rows)}
+def get_health(limit: int = Query(90, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+               start: Optional[str] = None, end: Optional[str] = None, fields: Optional[str] = None,
+               conn=Depends(get_conn)):
+    """Health measurements, newest first; follow next_cursor to page further back."""
+    return paged_rows(conn, "health_measurements", start, end, cursor, limit, fields, newest_first=True)
 
 @app.put("/api/health/{entry_id}")
-def update_health(entry_id: int, entry: HealthEntry):
-    conn = get_db()
-    existing = conn.execute("SELECT id FROM health_measurements WHERE id=?", (entry_id,)).fetchone()
+@serialized
+def update_health(entry_id: int, entry: HealthEntry, conn=Depends(get_conn)):
+    existing = conn.execute("SELECT id, measured_at FROM health_measurements WHERE id=?", (entry_id,)).fetchone()
     if not existing:
-        conn.close()
         raise HTTPException(status_code=404, detail="Health entry not found")
-    conn.execute("""
-        UPDATE health_measurements
-        SET systolic_bp=?, diastolic_bp=?, blood_sugar=?, blood_oxygen=?, heart_rate=?, notes=?
-        WHERE id=?
-    """, (entry.systolic_bp, entry.diastolic_bp, entry.blood_sugar,
-          entry.blood_oxygen, entry.heart_rate, entry.notes, entry_id))
-    conn.commit()
+    with transaction(conn):
+        conn.execute("""
+            UPDATE health_measurements
+            SET systolic_bp=?, diastolic_bp=?, blood_sugar=?, blood_oxygen=?, heart_rate=?, notes=?
+            WHERE id=?
+        """, (entry.systolic_bp, entry.diastolic_bp, entry.blood_sugar,
+              entry.blood_oxygen, entry.heart_rate, entry.notes, entry_id))
     row = conn.execute("SELECT * FROM health_measurements WHERE id=?", (entry_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "health", "updated", [entry_id], [existing["measured_at"]])
     return {"entry": row_to_dict(row), "message": f"Health entry {entry_id} updated."}
 
 @app.delete("/api/health/{entry_id}")
-def delete_health(entry_id: int):
-    conn = get_db()
-    conn.execute("DELETE FROM health_measurements WHERE id=?", (entry_id,))
-    conn.commit()
-    conn.close()
+@serialized
+def delete_health(entry_id: int, conn=Depends(get_conn)):
+    existing = conn.execute("SELECT measured_at FROM health_measurements WHERE id=?", (entry_id,)).fetchone()
+    with transaction(conn):
+        conn.execute("DELETE FROM health_measurements WHERE id=?", (entry_id,))
+    if existing:
+        publish_change(conn, "health", "deleted", [entry_id], [existing["measured_at"]])
     return {"message": f"Health entry {entry_id} deleted."}
 
 # ── Daily Summary ────────────────────────────────────────────────────
 @app.get("/api/daily-summary")
-def get_daily_summary(date: Optional[str] = None):
-    target_date = date or datetime.now().date().isoformat()
-    start, end = get_date_range(target_date)
-    
-    conn = get_db()
-    
-    # Get profile
-    profile_row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    if not profile_row:
-        conn.close()
+def get_daily_summary(date: Optional[str] = None, format: str = Query("full", pattern="^(full|digest)$"),
+                      max_tokens: int = Query(digest.DEFAULT_MAX_TOKENS, ge=100, le=20000),
+                      conn=Depends(get_conn)):
+    """Intake, goals and entries for one day; format=digest returns a compact, budgeted view."""
+    target_date = date or local_today().isoformat()
+    summary = build_daily_summary(conn, get_active_profile(conn), target_date)
+    if "error" in summary:
+        return summary
+    return digest.daily_digest(summary, max_tokens) if format == "digest" else summary
+
+def build_daily_summary(conn, profile, target_date: str) -> dict:
+    if not profile:
         return {"error": "No profile set. Create your profile first."}
-    profile = row_to_dict(profile_row)
     
     # Get today's food
-    food_rows = conn.execute(
-        "SELECT * FROM food_entries WHERE logged_at BETWEEN ? AND ? ORDER BY logged_at", (start, end)
-    ).fetchall()
-    food = rows_to_list(food_rows)
+    food = rows_to_list(day_rows(conn, "food_entries", target_date))
     
     # Get today's activities
-    activity_rows = conn.execute(
-        "SELECT * FROM sport_activities WHERE performed_at BETWEEN ? AND ? ORDER BY performed_at", (start, end)
-    ).fetchall()
-    activities = rows_to_list(activity_rows)
+    activities = rows_to_list(day_rows(conn, "sport_activities", target_date))
     
     # Get latest weight
     weight_row = conn.execute(
-        "SELECT * FROM weight_logs ORDER BY measured_at DESC LIMIT 1"
+        "SELECT * FROM weight_logs ORDER BY local_day DESC, epoch DESC LIMIT 1"
     ).fetchone()
     
-    conn.close()
-    
-    # Calculate totals
-    total_calories = sum(f["calories"] for f in food)
-    total_protein = sum(f["protein_g"] for f in food)
-    total_carbs = sum(f["carbs_g"] for f in food)
-    total_fat = sum(f["fat_g"] for f in food)
+    # Totals come from the daily rollup
+    totals = get_day_totals(conn, target_date)
+    total_calories = totals["calories"]
+    total_protein = totals["protein_g"]
+    total_carbs = totals["carbs_g"]
+    total_fat = totals["fat_g"]
     
-    activity_calories = sum(a["calories_burned"] for a in activities)
+    activity_calories = totals["calories_burned"]
     
     # Calculate goals
     goals = calculate_daily_goals(profile, activity_calories)
@@ -717,79 +994,64 @@ def get_daily_summary(date: Optional[str] = None):
 
 # ── Coaching Endpoint ────────────────────────────────────────────────
 @app.get("/api/coaching")
-def get_coaching(date: Optional[str] = None):
+def get_coaching(date: Optional[str] = None, conn=Depends(get_conn)):
     """Get coaching tips for the given date based on current intake vs goals."""
-    target_date = date or datetime.now().date().isoformat()
-    start, end = get_date_range(target_date)
+    target_date = date or local_today().isoformat()
 
-    conn = get_db()
-    profile_row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    if not profile_row:
-        conn.close()
+    profile = get_active_profile(conn)
+    if not profile:
         return {"tips": [], "error": "No profile set."}
-    profile = row_to_dict(profile_row)
-
-    totals = conn.execute(
-        "SELECT COALESCE(SUM(calories),0) as cal, COALESCE(SUM(protein_g),0) as prot, "
-        "COALESCE(SUM(carbs_g),0) as carb, COALESCE(SUM(fat_g),0) as fat "
-        "FROM food_entries WHERE logged_at BETWEEN ? AND ?", (start, end)
-    ).fetchone()
-    act = conn.execute(
-        "SELECT COALESCE(SUM(calories_burned),0) as burned "
-        "FROM sport_activities WHERE performed_at BETWEEN ? AND ?", (start, end)
-    ).fetchone()
-    conn.close()
 
-    goals = calculate_daily_goals(profile, act["burned"])
-    intake = {"calories": totals["cal"], "protein_g": totals["prot"], "carbs_g": totals["carb"], "fat_g": totals["fat"]}
+    totals = get_day_totals(conn, target_date)
+    goals = calculate_daily_goals(profile, totals["calories_burned"])
+    intake = intake_from_totals(totals)
     tips = generate_coaching_tips(profile, intake, goals)
 
     return {"date": target_date, "tips": tips, "intake": intake, "goals": goals}
 
 # ── Daily Coaching (Agent-Written) ──────────────────────────────────
 @app.put("/api/coaching/daily")
-def update_daily_coaching(coaching: DailyCoaching):
-    conn = get_db()
+@serialized
+def update_daily_coaching(coaching: DailyCoaching, conn=Depends(get_conn)):
     cursor = conn.cursor()
 
-    existing = cursor.execute(
-        "SELECT id FROM daily_coaching WHERE coaching_date = ?", (coaching.coaching_date,)
-    ).fetchone()
-
-    if existing:
-        cursor.execute(
-            """UPDATE daily_coaching SET coaching_text = ?, meal_count = ?, calories_so_far = ?,
-               calories_remaining = ?, protein_status = ?, top_priority = ?, updated_at = CURRENT_TIMESTAMP
-               WHERE coaching_date = ?""",
-            (coaching.coaching_text, coaching.meal_count, coaching.calories_so_far,
-             coaching.calories_remaining, coaching.protein_status, coaching.top_priority,
-             coaching.coaching_date)
-        )
-    else:
-        cursor.execute(
-            """INSERT INTO daily_coaching (coaching_date, coaching_text, meal_count, calories_so_far,
-               calories_remaining, protein_status, top_priority) VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (coaching.coaching_date, coaching.coaching_text, coaching.meal_count,
-             coaching.calories_so_far, coaching.calories_remaining, coaching.protein_status,
-             coaching.top_priority)
-        )
+    with transaction(conn):
+        existing = cursor.execute(
+            "SELECT id FROM daily_coaching WHERE coaching_date = ?", (coaching.coaching_date,)
+        ).fetchone()
 
-    conn.commit()
+        if existing:
+            cursor.execute(
+                """UPDATE daily_coaching SET coaching_text = ?, meal_count = ?, calories_so_far = ?,
+                   calories_remaining = ?, protein_status = ?, top_priority = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE coaching_date = ?""",
+                (coaching.coaching_text, coaching.meal_count, coaching.calories_so_far,
+                 coaching.calories_remaining, coaching.protein_status, coaching.top_priority,
+                 coaching.coaching_date)
+            )
+        else:
+            cursor.execute(
+                """INSERT INTO daily_coaching (coaching_date, coaching_text, meal_count, calories_so_far,
+                   calories_remaining, protein_status, top_priority) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (coaching.coaching_date, coaching.coaching_text, coaching.meal_count,
+                 coaching.calories_so_far, coaching.calories_remaining, coaching.protein_status,
+                 coaching.top_priority)
+            )
     row = cursor.execute(
         "SELECT * FROM daily_coaching WHERE coaching_date = ?", (coaching.coaching_date,)
     ).fetchone()
-    conn.close()
+    publish_change(conn, "daily_coaching", "updated", [row["id"]], [coaching.coaching_date])
 
     return {"coaching": row_to_dict(row), "message": f"Daily coaching updated for {coaching.coaching_date}"}
 
 @app.get("/api/coaching/daily")
-def get_daily_coaching(date: Optional[str] = None):
-    target_date = date or datetime.now().date().isoformat()
-    conn = get_db()
+def get_daily_coaching(date: Optional[str] = None, conn=Depends(get_conn)):
+    return build_daily_coaching(conn, date or local_today().isoformat())
+
+def build_daily_coaching(conn, target_date: str) -> dict:
     row = conn.execute(
         "SELECT * FROM daily_coaching WHERE coaching_date = ?", (target_date,)
     ).fetchone()
-    conn.close()
 
     if not row:
         return {"coaching": None, "message": "No coaching tip for this date yet."}
@@ -797,237 +1059,112 @@ def get_daily_coaching(date: Optional[str] = None):
 
 # ── Coaching Reports (Weekly) ───────────────────────────────────────
 @app.post("/api/coaching/report")
-def create_coaching_report(report: CoachingReport):
-    conn = get_db()
+@serialized
+def create_coaching_report(report: CoachingReport, conn=Depends(get_conn)):
     cursor = conn.cursor()
-    existing = cursor.execute(
-        "SELECT id FROM coaching_reports WHERE week_start = ? AND week_end = ?",
-        (report.week_start, report.week_end)
-    ).fetchone()
-    if existing:
-        cursor.execute(
-            "UPDATE coaching_reports SET report_text = ?, summary_json = ?, created_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (report.report_text, report.summary_json, existing["id"])
-        )
-    else:
-        cursor.execute(
-            "INSERT INTO coaching_reports (week_start, week_end, report_text, summary_json) VALUES (?, ?, ?, ?)",
-            (report.week_start, report.week_end, report.report_text, report.summary_json)
-        )
-    conn.commit()
+    with transaction(conn):
+        existing = cursor.execute(
+            "SELECT id FROM coaching_reports WHERE week_start = ? AND week_end = ?",
+            (report.week_start, report.week_end)
+        ).fetchone()
+        if existing:
+            cursor.execute(
+                "UPDATE coaching_reports SET report_text = ?, summary_json = ?, created_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (report.report_text, report.summary_json, existing["id"])
+            )
+        else:
+            cursor.execute(
+                "INSERT INTO coaching_reports (week_start, week_end, report_text, summary_json) VALUES (?, ?, ?, ?)",
+                (report.week_start, report.week_end, report.report_text, report.summary_json)
+            )
     entry_id = existing["id"] if existing else cursor.lastrowid
     row = cursor.execute("SELECT * FROM coaching_reports WHERE id = ?", (entry_id,)).fetchone()
-    conn.close()
+    publish_change(conn, "coaching_report", "updated" if existing else "created", [entry_id])
     return {"report": row_to_dict(row), "message": f"Coaching report saved for {report.week_start} to {report.week_end}"}
 
 @app.get("/api/coaching/reports")
-def get_coaching_reports(limit: int = 12):
-    conn = get_db()
+def get_coaching_reports(limit: int = 12, conn=Depends(get_conn)):
     rows = conn.execute("SELECT * FROM coaching_reports ORDER BY week_end DESC LIMIT ?", (limit,)).fetchall()
-    conn.close()
     return {"reports": rows_to_list(rows), "count": len(rows)}
 
 @app.get("/api/coaching/reports/latest")
-def get_latest_coaching_report():
-    conn = get_db()
+def get_latest_coaching_report(conn=Depends(get_conn)):
     row = conn.execute("SELECT * FROM coaching_reports ORDER BY week_end DESC LIMIT 1").fetchone()
-    conn.close()
     if not row:
         return {"report": None, "message": "No coaching reports yet."}
     return {"report": row_to_dict(row)}
 
 @app.delete("/api/coaching/reports/{report_id}")
-def delete_coaching_report(report_id: int):
-    conn = get_db()
-    conn.execute("DELETE FROM coaching_reports WHERE id = ?", (report_id,))
-    conn.commit()
-    conn.close()
+@serialized
+def delete_coaching_report(report_id: int, conn=Depends(get_conn)):
+    with transaction(conn):
+        conn.execute("DELETE FROM coaching_reports WHERE id = ?", (report_id,))
+    publish_change(conn, "coaching_report", "deleted", [report_id])
     return {"message": f"Coaching report {report_id} deleted."}
 
 # ── Weekly Report ────────────────────────────────────────────────────
 @app.get("/api/weekly-report")
-def get_weekly_report(date: Optional[str] = None):
-    """Generate a weekly report for the agent to analyze."""
-    end_date = date or datetime.now().date().isoformat()
-    end_d = date_obj = __import__('datetime').date.fromisoformat(end_date)
-    start_d = end_d - timedelta(days=6)
-    start_date = start_d.isoformat()
-    
-    s = datetime.combine(start_d, datetime.min.time()).isoformat()
-    e = datetime.combine(end_d, datetime.max.time()).isoformat()
-    
-    conn = get_db()
-    
-    # Profile
-    profile_row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    profile = row_to_dict(profile_row) if profile_row else None
-    
-    # Food for the week
-    food_rows = conn.execute(
-        "SELECT * FROM food_entries WHERE logged_at BETWEEN ? AND ? ORDER BY logged_at", (s, e)
-    ).fetchall()
-    food = rows_to_list(food_rows)
-    
-    # Activities for the week
-    activity_rows = conn.execute(
-        "SELECT * FROM sport_activities WHERE performed_at BETWEEN ? AND ? ORDER BY performed_at", (s, e)
-    ).fetchall()
-    activities = rows_to_list(activity_rows)
-    
-    # Weight for the week
-    weight_rows = conn.execute(
-        "SELECT * FROM weight_logs WHERE measured_at BETWEEN ? AND ? ORDER BY measured_at", (s, e)
-    ).fetchall()
-    weights = rows_to_list(weight_rows)
-    
-    # Health measurements for the week
-    health_rows = conn.execute(
-        "SELECT * FROM health_measurements WHERE measured_at BETWEEN ? AND ? ORDER BY measured_at", (s, e)
-    ).fetchall()
-    health = rows_to_list(health_rows)
-    
-    conn.close()
-    
-    # Aggregate food by day
-    daily_nutrition = {}
-    for f in food:
-        day = f["logged_at"][:10]
-        if day not in daily_nutrition:
-            daily_nutrition[day] = {"calories": 0, "protein_g": 0, "carbs_g": 0, "fat_g": 0}
-        
-        daily_nutrition[day]["calories"] += f["calories"]
-        daily_nutrition[day]["protein_g"] += f["protein_g"]
-        daily_nutrition[day]["carbs_g"] += f["carbs_g"]
-        daily_nutrition[day]["fat_g"] += f["fat_g"]
-    
-    days_logged = len(daily_nutrition) or 1
-    avg_calories = round(sum(d["calories"] for d in daily_nutrition.values()) / days_logged, 1)
-    avg_protein = round(sum(d["protein_g"] for d in daily_nutrition.values()) / days_logged, 1)
-    avg_carbs = round(sum(d["carbs_g"] for d in daily_nutrition.values()) / days_logged, 1)
-    avg_fat = round(sum(d["fat_g"] for d in daily_nutrition.values()) / days_logged, 1)
-    
-    # Goals (use profile if available)
-    goals = None
-    if profile:
-        activity_cal = sum(a["calories_burned"] for a in activities) / 7
-        goals = calculate_daily_goals(profile, activity_cal)
-        
-    # Count days over/under goal
-    days_over = 0
-    days_under = 0
-    if goals:
-        for day_data in daily_nutrition.values():
-            if day_data["calories"] > goals["calorie_goal"]:
-                days_over += 1
-            else:
-                days_under += 1
-    
-    # Weight change
-    weight_start = weights[0]["weight_kg"] if weights else None
-    weight_end = weights[-1]["weight_kg"] if weights else None
-    weight_change = round(weight_end - weight_start, 2) if weight_start and weight_end else None
-    
-    # Health averages
-    bp_systolic = [h["systolic_bp"] for h in health if h["systolic_bp"]]
-    bp_diastolic = [h["diastolic_bp"] for h in health if h["diastolic_bp"]]
-    sugars = [h["blood_sugar"] for h in health if h["blood_sugar"]]
-    oxygen = [h["blood_oxygen"] for h in health if h["blood_oxygen"]]
-    
-    return {
-        "period": f"{start_date} to {end_date}",
-        "days_with_data": days_logged,
-        "nutrition": {
-            "avg_calories": avg_calories,
-            "avg_protein_g": avg_protein,
-            "avg_carbs_g": avg_carbs,
-            "avg_fat_g": avg_fat,
-            "days_over_goal": days_over,
-            "days_under_goal": days_under,
-            "daily_breakdown": daily_nutrition,
-        },
-        "weight": {
-            "start_weight": weight_start,
-            "end_weight": weight_end,
-            "change_kg": weight_change,
-            "all_entries": weights,
-        },
-        "activity": {
-            "total_sessions": len(activities),
-            "total_duration_min": sum(a["duration_minutes"] for a in activities),
-            "total_calories_burned": round(sum(a["calories_burned"] for a in activities), 1),
-            "activities": activities,
-            "types": list(set(a["activity_type"] for a in activities)),
-        },
-        "health": {
-            "avg_systolic": round(sum(bp_systolic) / len(bp_systolic), 1) if bp_systolic else None,
-            "avg_diastolic": round(sum(bp_diastolic) / len(bp_diastolic), 1) if bp_diastolic else None,
-            "avg_blood_sugar": round(sum(sugars) / len(sugars), 1) if sugars else None,
-            "avg_blood_oxygen": round(sum(oxygen) / len(oxygen), 1) if oxygen else None,
-            "all_entries": health,
-        },
-        "goals": goals,
-        "profile": profile,
-    }
+def get_weekly_report(date: Optional[str] = None, format: str = Query("full", pattern="^(full|digest)$"),
+                      max_tokens: int = Query(digest.DEFAULT_MAX_TOKENS, ge=100, le=20000),
+                      conn=Depends(get_conn)):
+    """Generate a weekly report for the agent to analyze (the 7 days ending on date)."""
+    return get_period_report("week", date=date, format=format, max_tokens=max_tokens, conn=conn)
+
+@app.get("/api/reports/{period}")
+def get_period_report(period: str, date: Optional[str] = None, start: Optional[str] = None,
+                      end: Optional[str] = None, format: str = Query("full", pattern="^(full|digest)$"),
+                      max_tokens: int = Query(digest.DEFAULT_MAX_TOKENS, ge=100, le=20000),
+                      entries: Optional[bool] = None, conn=Depends(get_conn)):
+    """Report for a week, month, quarter or year around date, or a custom start..end range.
+
+    Periods that ended before today are served from a stored snapshot.
+    Raw weight, activity and health rows come with periods of up to a month,
+    or with entries=true (entries=false leaves them out).
+    format=digest returns a compact view compared against the previous period.
+    """
+    today = local_today()
+    try:
+        anchor = datetime.strptime(date, "%Y-%m-%d").date() if date else today
+        first, last = reports.period_range(period, anchor, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    profile = get_active_profile(conn)
+    if format != "digest":
+        return reports.get_report(conn, profile, period, first, last, today, entries)
+    # Aggregates (snapshots once closed); raw rows only for short periods unless asked for
+    report = reports.get_report(conn, profile, period, first, last, today, entries)
+    prev_first, prev_last = reports.previous_range(period, first, last)
+    previous = reports.get_report(conn, profile, period, prev_first, prev_last, today, entries=False)
+    return digest.period_digest(report, previous, max_tokens)
 
 # ── History Endpoints (for charts) ───────────────────────────────────
 @app.get("/api/history/daily-totals")
-def get_daily_totals(days: int = 30):
+def get_daily_totals(days: int = 30, conn=Depends(get_conn)):
     """Get daily calorie/macro totals for the last N days (for charts)."""
-    end_d = datetime.now().date()
-    start_d = end_d - timedelta(days=days - 1)
-
-    start_iso = datetime.combine(start_d, datetime.min.time()).isoformat()
-    end_iso = datetime.combine(end_d, datetime.max.time()).isoformat()
+    return build_daily_totals(conn, get_active_profile(conn), days)
 
-    conn = get_db()
-
-    # Get profile for goals
-    profile_row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    profile = row_to_dict(profile_row) if profile_row else None
-
-    # Single query for food totals grouped by date
-    food_rows = conn.execute("""
-        SELECT DATE(logged_at) as day,
-               COALESCE(SUM(calories), 0) as cal,
-               COALESCE(SUM(protein_g), 0) as prot,
-               COALESCE(SUM(carbs_g), 0) as carb,
-               COALESCE(SUM(fat_g), 0) as fat
-        FROM food_entries
-        WHERE logged_at BETWEEN ? AND ?
-        GROUP BY DATE(logged_at)
-    """, (start_iso, end_iso)).fetchall()
-
-    # Single query for activity totals grouped by date
-    activity_rows = conn.execute("""
-        SELECT DATE(performed_at) as day,
-               COALESCE(SUM(calories_burned), 0) as burned
-        FROM sport_activities
-        WHERE performed_at BETWEEN ? AND ?
-        GROUP BY DATE(performed_at)
-    """, (start_iso, end_iso)).fetchall()
+def build_daily_totals(conn, profile, days: int) -> dict:
+    end_d = local_today()
+    start_d = end_d - timedelta(days=days - 1)
 
-    conn.close()
+    # One indexed range read on the daily rollup
+    totals_by_day = get_totals_range(conn, start_d.isoformat(), end_d.isoformat())
 
-    # Index results by date for O(1) lookup
-    food_by_day = {r["day"]: r for r in food_rows}
-    activity_by_day = {r["day"]: r for r in activity_rows}
+    day_list = [(start_d + timedelta(days=i)).isoformat() for i in range(days)]
+    burned_list = [round(totals_by_day[ds]["calories_burned"], 1) if ds in totals_by_day else 0 for ds in day_list]
+    goal_range = calculate_daily_goals_range(profile, burned_list) if profile else None
 
     # Build result array, filling gaps with zeros
     results = []
-    for i in range(days):
-        d = start_d + timedelta(days=i)
-        ds = d.isoformat()
-
-        food = food_by_day.get(ds)
-        cal = round(food["cal"], 1) if food else 0
-        prot = round(food["prot"], 1) if food else 0
-        carb = round(food["carb"], 1) if food else 0
-        fat = round(food["fat"], 1) if food else 0
+    for i, ds in enumerate(day_list):
+        day = totals_by_day.get(ds)
+        cal = round(day["calories"], 1) if day else 0
+        prot = round(day["protein_g"], 1) if day else 0
+        carb = round(day["carbs_g"], 1) if day else 0
+        fat = round(day["fat_g"], 1) if day else 0
+        burned = burned_list[i]
 
-        act = activity_by_day.get(ds)
-        burned = round(act["burned"], 1) if act else 0
-
-        goals = calculate_daily_goals(profile, burned) if profile else None
+        goals = {k: goal_range[k][i] for k in ("calorie_goal", "protein_goal_g", "carbs_goal_g", "fat_goal_g")} if profile else None
 
         results.append({
             "date": ds,
@@ -1046,300 +1183,359 @@ def get_daily_totals(days: int = 30):
 
 # ── Gamification ────────────────────────────────────────────────────
 @app.get("/api/gamification")
-def get_gamification_status():
+def get_gamification_status(conn=Depends(get_conn)):
     """Calculate current streak, elite status, and daily points."""
-    conn = get_db()
-    
-    # Get profile
-    profile_row = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
-    if not profile_row:
-        conn.close()
+    return build_gamification(conn, get_active_profile(conn), local_today())
+
+def build_gamification(conn, profile, today: date) -> dict:
+    if not profile:
         return {"error": "No profile set"}
-    profile = row_to_dict(profile_row)
-    
-    # Calculate streak (backwards from yesterday to find consecutive success)
-    streak_count = 0
-    elite_streak = False
-    
-    # Look back 30 days max for streak
-    today = datetime.now().date()
-    
-    # Check TODAY first for "Elite" status display
-    # (Today doesn't add to streak until it's over, but we show current status)
     today_iso = today.isoformat()
-    start, end = get_date_range(today_iso)
-    
-    today_food = conn.execute(
-        "SELECT COALESCE(SUM(calories),0) as cal, COALESCE(SUM(protein_g),0) as prot, "
-        "COALESCE(SUM(carbs_g),0) as carb, COALESCE(SUM(fat_g),0) as fat "
-        "FROM food_entries WHERE logged_at BETWEEN ? AND ?", (start, end)
-    ).fetchone()
-    
-    today_activity = conn.execute(
-        "SELECT COALESCE(SUM(calories_burned),0) as burned "
-        "FROM sport_activities WHERE performed_at BETWEEN ? AND ?", (start, end)
-    ).fetchone()
 
-    today_activity_rows = conn.execute(
-        "SELECT activity_type FROM sport_activities WHERE performed_at BETWEEN ? AND ? ORDER BY performed_at",
-        (start, end)
-    ).fetchall()
-    activities_today = [r["activity_type"] for r in today_activity_rows]
-
-    today_goals = calculate_daily_goals(profile, today_activity["burned"])
-    
-    today_stats = {
-        "calories": today_food["cal"],
-        "protein_g": today_food["prot"],
-        "carbs_g": today_food["carb"],
-        "fat_g": today_food["fat"]
-    }
-    
-    today_gamification = calculate_gamification(today_stats, today_goals)
-    
-    # Calculate historical streak
-    # Iterate backwards from YESTERDAY
-    for i in range(1, 31):
-        d = today - timedelta(days=i)
-        ds = d.isoformat()
-        s, e = get_date_range(ds)
-
-        day_food = conn.execute(
-            "SELECT COALESCE(SUM(calories),0) as cal "
-            "FROM food_entries WHERE logged_at BETWEEN ? AND ?", (s, e)
-        ).fetchone()
+    # Today is shown live; closed days come from the persisted streak state
+    today_totals = get_day_totals(conn, today_iso)
 
-        # If no food logged, streak breaks (unless we allow skip days? For now, break)
-        if day_food["cal"] == 0:
-            break
-
-        day_activity = conn.execute(
-            "SELECT COALESCE(SUM(calories_burned),0) as burned "
-            "FROM sport_activities WHERE performed_at BETWEEN ? AND ?", (s, e)
-        ).fetchone()
-
-        day_goals = calculate_daily_goals(profile, day_activity["burned"])
-
-        if day_food["cal"] <= day_goals["calorie_goal"]:
-            streak_count += 1
-        else:
-            break
-
-    # Calculate best streak over last 180 days using efficient GROUP BY
-    lookback_start = datetime.combine(today - timedelta(days=180), datetime.min.time()).isoformat()
-    lookback_end = datetime.combine(today, datetime.max.time()).isoformat()
+    today_activity_rows = day_rows(conn, "sport_activities", today_iso, columns="activity_type")
+    activities_today = [r["activity_type"] for r in today_activity_rows]
 
-    daily_cals = conn.execute("""
-        SELECT DATE(logged_at) as day, COALESCE(SUM(calories),0) as cal
-        FROM food_entries
-        WHERE logged_at BETWEEN ? AND ?
-        GROUP BY DATE(logged_at)
-        ORDER BY day
-    """, (lookback_start, lookback_end)).fetchall()
-
-    daily_burned = conn.execute("""
-        SELECT DATE(performed_at) as day, COALESCE(SUM(calories_burned),0) as burned
-        FROM sport_activities
-        WHERE performed_at BETWEEN ? AND ?
-        GROUP BY DATE(performed_at)
-    """, (lookback_start, lookback_end)).fetchall()
-
-    conn.close()
-
-    burned_map = {r["day"]: r["burned"] for r in daily_burned}
-
-    best_streak = 0
-    current_run = 0
-    for row in daily_cals:
-        day_burned = burned_map.get(row["day"], 0)
-        day_goals = calculate_daily_goals(profile, day_burned)
-        if row["cal"] <= day_goals["calorie_goal"]:
-            current_run += 1
-            if current_run > best_streak:
-                best_streak = current_run
-        else:
-            current_run = 0
+    today_goals = calculate_daily_goals(profile, today_totals["calories_burned"])
+    today_gamification = calculate_gamification(intake_from_totals(today_totals), today_goals)
+    streaks = streak_summary(conn, profile, today_totals, today_goals, today)
+    xp = xp_summary(conn)
 
     return {
-        "streak_days": streak_count,
-        "best_streak": best_streak,
+        "streak_days": streaks["streak_days"],
+        "best_streak": streaks["best_streak"],
         "today_points": today_gamification["points"],
         "is_elite": today_gamification["is_elite"],
         "calorie_success": today_gamification["calorie_success"],
         "tags": today_gamification["tags"],
         "activities_today": activities_today,
+        "total_xp": xp["total_xp"],
+        "level": xp["level"],
+        "next_level_xp": xp["next_level_xp"],
+        "badges": xp["badges"],
     }
 
-# ── CSV Export ──────────────────────────────────────────────────────
-@app.get("/api/export/csv")
-def export_csv(type: str = Query(..., pattern="^(food|weight|activity|health)$"),
-               start: Optional[str] = None, end: Optional[str] = None):
-    """Export data as CSV. Type: food, weight, activity, health."""
+# ── Dashboard Bootstrap ──────────────────────────────────────────────
+# Sections each dashboard tab loads by default; any of them can be picked with fields=.
+# Each section has the shape of the standalone endpoint it replaces.
+DASHBOARD_TABS = {
+    "overview": ("summary", "gamification", "coaching", "often_used"),
+    "charts": ("daily_totals", "weight", "activities"),
+    "health": ("health",),
+    "coaching": ("reports",),
+}
+DASHBOARD_HEALTH_LIMIT = 90
+DASHBOARD_REPORTS_LIMIT = 12
+
+DASHBOARD_SECTIONS = {
+    "profile": lambda conn, ctx: {"profile": ctx["profile"]},
+    "summary": lambda conn, ctx: build_daily_summary(conn, ctx["profile"], ctx["date"]),
+    "gamification": lambda conn, ctx: build_gamification(conn, ctx["profile"], ctx["today"]),
+    "coaching": lambda conn, ctx: build_daily_coaching(conn, ctx["date"]),
+    "often_used": lambda conn, ctx: get_often_used(conn),
+    "daily_totals": lambda conn, ctx: build_daily_totals(conn, ctx["profile"], ctx["days"]),
+    "weight": lambda conn, ctx: entry_list(conn.execute(
+        "SELECT * FROM weight_logs ORDER BY local_day DESC, epoch DESC LIMIT ?", (ctx["days"],)
+    ).fetchall()),
+    "activities": lambda conn, ctx: entry_list(day_rows(
+        conn, "sport_activities", (ctx["today"] - timedelta(days=ctx["days"] - 1)).isoformat(), ctx["today"].isoformat()
+    )),
+    "health": lambda conn, ctx: entry_list(conn.execute(
+        "SELECT * FROM health_measurements ORDER BY local_day DESC, epoch DESC LIMIT ?", (DASHBOARD_HEALTH_LIMIT,)
+    ).fetchall()),
+    "reports": lambda conn, ctx: get_coaching_reports(DASHBOARD_REPORTS_LIMIT, conn),
+}
+
+@app.get("/api/dashboard/{tab}")
+def get_dashboard(tab: str, date: Optional[str] = None, days: int = Query(7, ge=1, le=365),
+                  fields: Optional[str] = None, conn=Depends(get_conn)):
+    """Everything one dashboard tab shows, read on one connection from one snapshot.
+
+    fields=summary,gamification picks sections (default: the tab's own).
+    date applies to the overview sections, days to the chart sections.
+    """
+    if tab not in DASHBOARD_TABS:
+        raise HTTPException(status_code=404, detail=f"Unknown dashboard tab {tab!r}")
+    sections = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(DASHBOARD_TABS[tab])
+    unknown = sorted(set(sections) - set(DASHBOARD_SECTIONS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(unknown)}")
+    today = local_today()
+    try:
+        target_date = datetime.strptime(date, "%Y-%m-%d").date().isoformat() if date else today.isoformat()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if "gamification" in sections:
+        # Closed-day streak evaluation is the one write behind these reads; do it before the snapshot
+        profile = get_active_profile(conn)
+        if profile:
+            refresh_streaks(conn, profile, today)
+    with read_snapshot(conn):
+        ctx = {"profile": get_active_profile(conn), "date": target_date, "today": today, "days": days}
+        result = {"tab": tab, "date": target_date}
+        for section in dict.fromkeys(sections):
+            result[section] = DASHBOARD_SECTIONS[section](conn, ctx)
+    return result
+
+# ── Operation Batches ────────────────────────────────────────────────
+# Endpoints callable from /api/batch, by handler name
+BATCH_HANDLERS = {handler.__name__: inspect.unwrap(handler) for handler in (
+    get_profile, update_profile, update_goal_mode,
+    log_food, get_food, search_food, get_food_range, update_food, delete_food,
+    get_often_used, update_often_used, add_often_used_to_today, add_to_often_used_from_entry,
+    log_weight, get_weight, log_activity, get_activity, get_activity_range, update_activity, delete_activity,
+    log_health, get_health, update_health, delete_health,
+    get_daily_summary, get_coaching, get_daily_coaching, update_daily_coaching,
+    create_coaching_report, get_coaching_reports, get_weekly_report, get_period_report,
+    get_daily_totals, get_gamification_status,
+)}
+
+def batch_signature(handler) -> tuple:
+    """(body parameter, body model, params model) of a handler, read from its signature."""
+    body_name = body_model = None
+    fields = {}
+    for name, param in inspect.signature(handler).parameters.items():
+        if name == "conn":
+            continue
+        if isinstance(param.annotation, type) and issubclass(param.annotation, BaseModel):
+            body_name, body_model = name, param.annotation
+        else:
+            fields[name] = (param.annotation, ... if param.default is inspect.Parameter.empty else param.default)
+    params_model = create_model(f"{handler.__name__}_params", __config__=ConfigDict(extra="forbid"), **fields)
+    return body_name, body_model, params_model
+
+BATCH_SIGNATURES = {name: batch_signature(handler) for name, handler in BATCH_HANDLERS.items()}
+
+def run_operation(conn, operation: BatchOperation):
+    """Validate one operation like FastAPI would and call its handler on conn."""
+    body_name, body_model, params_model = BATCH_SIGNATURES[operation.op]
+    kwargs = params_model.model_validate(operation.params).model_dump()
+    if body_model is not None:
+        kwargs[body_name] = body_model.model_validate(operation.body or {})
+    return BATCH_HANDLERS[operation.op](conn=conn, **kwargs)
+
+@app.post("/api/batch")
+@serialized
+def run_batch(batch: OperationBatch, conn=Depends(get_conn)):
+    """Run endpoint calls in order on one connection, in one transaction with one commit.
+
+    Each operation runs in its own savepoint. With atomic (the default) the
+    first failure rolls back the whole batch and is returned as the error;
+    otherwise only the failed operation is undone and the rest commit.
+    """
+    unknown = sorted({o.op for o in batch.operations} - set(BATCH_HANDLERS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown operations: {', '.join(unknown)}")
+
+    results = []
+    outer_changes = getattr(conn, "deferred_changes", None)
+    conn.deferred_changes = []
+    try:
+        with transaction(conn):
+            for index, operation in enumerate(batch.operations):
+                try:
+                    with transaction(conn):
+                        results.append({"op": operation.op, "status": 200, "result": run_operation(conn, operation)})
+                except (HTTPException, ValidationError) as e:
+                    if isinstance(e, HTTPException):
+                        status, error = e.status_code, e.detail
+                    else:
+                        status, error = 422, e.errors(include_url=False, include_context=False)
+                    if batch.atomic:
+                        raise HTTPException(status_code=status, detail={
+                            "failed_index": index, "op": operation.op, "error": error,
+                        })
+                    results.append({"op": operation.op, "status": status, "error": error})
+        changes = conn.deferred_changes
+    finally:
+        conn.deferred_changes = outer_changes
+
+    for change in changes:
+        publish_change(conn, *change)
+    return {"results": results, "count": len(results), "failed": sum(r["status"] != 200 for r in results)}
+
+# ── Data Export ─────────────────────────────────────────────────────
+EXPORT_TABLES = {
+    "food": "food_entries",
+    "weight": "weight_logs",
+    "activity": "sport_activities",
+    "health": "health_measurements",
+}
+EXPORT_CHUNK_ROWS = 500
+
+def export_query(type: str, start: Optional[str], end: Optional[str]):
+    """SQL and parameters selecting one export table in timestamp order."""
+    query = f"SELECT * FROM {EXPORT_TABLES[type]}"
+    params = []
+    if start and end:
+        query += " WHERE local_day BETWEEN ? AND ?"
+        params = [date.fromisoformat(start).isoformat(), date.fromisoformat(end).isoformat()]
+    query += " ORDER BY local_day, epoch"
+    return query, params
+
+def iter_export_chunks(type: str, start: Optional[str], end: Optional[str], format: str):
+    """Yield encoded chunks of one table, fetchmany() at a time.
+
+    Uses its own pooled connection so the stream outlives the request
+    dependency; a single SELECT keeps the export on one read snapshot.
+    """
     import csv
     import io
 
+    query, params = export_query(type, start, end)
     conn = get_db()
-    table_map = {
-        "food": ("food_entries", "logged_at"),
-        "weight": ("weight_logs", "measured_at"),
-        "activity": ("sport_activities", "performed_at"),
-        "health": ("health_measurements", "measured_at"),
-    }
-    table, ts_col = table_map[type]
+    try:
+        cursor = conn.execute(query, params)
+        columns = [c[0] for c in cursor.description]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            if format == "csv":
+                writer.writerows(tuple(r) for r in rows)
+            else:
+                buffer.writelines(json.dumps(dict(zip(columns, r))) + "\n" for r in rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    finally:
+        conn.close()
 
-    query = f"SELECT * FROM {table}"
-    params = []
-    if start and end:
-        s = datetime.combine(date.fromisoformat(start), datetime.min.time()).isoformat()
-        e = datetime.combine(date.fromisoformat(end), datetime.max.time()).isoformat()
-        query += f" WHERE {ts_col} BETWEEN ? AND ?"
-        params = [s, e]
-    query += f" ORDER BY {ts_col}"
+class _ZipStreamSink:
+    """Write-only file object that zipfile streams into; drained between writes."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_zip_export(start: Optional[str], end: Optional[str], format: str):
+    """Stream every export table as one zip archive (one member per table)."""
+    import zipfile
+
+    sink = _ZipStreamSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for type in EXPORT_TABLES:
+            with archive.open(f"nutritrack_{type}.{format}", mode="w", force_zip64=True) as member:
+                for chunk in iter_export_chunks(type, start, end, format):
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+def gzip_stream(chunks):
+    """gzip-compress an iterator of byte chunks on the fly."""
+    import zlib
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
+@app.get("/api/export/csv")
+def export_csv(type: str = Query(..., pattern="^(food|weight|activity|health|all)$"),
+               start: Optional[str] = None, end: Optional[str] = None,
+               format: str = Query("csv", pattern="^(csv|ndjson)$"),
+               gzip: bool = False, conn=Depends(get_conn)):
+    """Stream data as CSV or NDJSON. Type: food, weight, activity, health, or all (zip)."""
+    if type == "all":
+        return StreamingResponse(
+            iter_zip_export(start, end, format),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename=nutritrack_export_{format}.zip"},
+        )
 
-    if not rows:
+    query, params = export_query(type, start, end)
+    has_rows = conn.execute(f"SELECT EXISTS ({query})", params).fetchone()[0]
+    if not has_rows and format == "csv":
         return StreamingResponse(
             iter(["No data found for the specified range.\n"]),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename=nutritrack_{type}.csv"},
         )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(rows[0].keys())
-    for row in rows:
-        writer.writerow(tuple(row))
-
-    output.seek(0)
+    chunks = iter_export_chunks(type, start, end, format)
+    headers = {"Content-Disposition": f"attachment; filename=nutritrack_{type}.{format}"}
+    if gzip:
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=nutritrack_{type}.csv"},
+        chunks,
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers=headers,
     )
 
+# ── Bulk Import ─────────────────────────────────────────────────────
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024  # larger uploads spill to a temp file
+
+@app.post("/api/import")
+async def import_data(request: Request,
+                      type: Optional[str] = Query(None, pattern="^(food|weight|activity|health)$"),
+                      format: str = Query("csv", pattern="^(csv|ndjson|zip)$")):
+    """Import a file produced by /api/export/csv (raw request body).
+
+    csv/ndjson need `type`; zip archives from type=all carry it in member names.
+    A gzip Content-Encoding on the request body is decoded on the fly.
+    """
+    import tempfile
+    import zlib
+    import importer
+
+    if format != "zip" and type is None:
+        raise HTTPException(status_code=400, detail="type is required for csv and ndjson imports")
+
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    decompressor = zlib.decompressobj(31) if gzipped else None
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as spool:
+        try:
+            async for chunk in request.stream():
+                spool.write(decompressor.decompress(chunk) if decompressor else chunk)
+            if decompressor:
+                spool.write(decompressor.flush())
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Request body is not valid gzip data")
+        spool.seek(0)
+        try:
+            import_reports = await run_in_threadpool(
+                submit_write, functools.partial(importer.import_file, spool, type, format), True)
+        except (UnicodeDecodeError, importer.zipfile.BadZipFile) as e:
+            raise HTTPException(status_code=400, detail=f"Could not read import file: {e}")
+
+    inserted = sum(r["inserted"] for r in import_reports)
+    if inserted:
+        hub.publish("resync", reason="import")
+    return {"reports": import_reports, "inserted": inserted, "message": f"Imported {inserted} rows."}
+
 # ── Demo Data Seeder ────────────────────────────────────────────────
 @app.post("/api/seed-demo-data")
-def seed_demo_data():
-    """Populate the database with 30 days of realistic demo data."""
-    conn = get_db()
-
-    # Clear existing data
-    for table in ["food_entries", "weight_logs", "sport_activities", "health_measurements", "often_used_foods", "daily_coaching", "coaching_reports", "user_profile"]:
-        conn.execute(f"DELETE FROM {table}")
-    conn.commit()
-
-    # Profile
-    conn.execute("""
-        INSERT INTO user_profile (age, sex, height_cm, current_weight_kg, activity_level, weight_goal_kg, calorie_deficit)
-        VALUES (30, 'male', 180, 85.0, 'moderate', 78.0, 500)
-    """)
-
-    today_d = datetime.now().date()
-    random.seed(42)
-
-    meal_foods = {
-        "breakfast": [
-            ("Oatmeal with banana", 350, 12, 58, 8, "1 bowl"),
-            ("Greek yogurt with honey", 280, 20, 30, 8, "200g"),
-            ("Scrambled eggs on toast", 420, 25, 30, 22, "2 eggs + 1 slice"),
-            ("Protein smoothie", 310, 30, 35, 6, "1 glass"),
-            ("Avocado toast", 380, 10, 32, 24, "2 slices"),
-        ],
-        "lunch": [
-            ("Grilled chicken salad", 450, 40, 15, 25, "1 plate"),
-            ("Turkey wrap", 520, 35, 45, 20, "1 wrap"),
-            ("Lentil soup with bread", 480, 22, 65, 12, "1 bowl + bread"),
-            ("Tuna sandwich", 430, 30, 40, 16, "1 sandwich"),
-            ("Chicken rice bowl", 550, 38, 55, 18, "1 bowl"),
-        ],
-        "dinner": [
-            ("Salmon with vegetables", 520, 42, 20, 28, "200g salmon"),
-            ("Pasta with meat sauce", 620, 30, 70, 22, "1 plate"),
-            ("Stir-fried tofu with rice", 480, 25, 55, 18, "1 plate"),
-            ("Grilled steak with salad", 550, 45, 10, 35, "250g steak"),
-            ("Chicken curry with rice", 580, 35, 60, 20, "1 serving"),
-        ],
-        "snack": [
-            ("Protein bar", 220, 20, 25, 8, "1 bar"),
-            ("Apple with peanut butter", 250, 7, 30, 14, "1 apple + 1 tbsp"),
-            ("Mixed nuts", 180, 5, 8, 16, "30g"),
-            ("Rice cakes with cottage cheese", 160, 12, 20, 4, "2 cakes"),
-        ],
-    }
-
-    activity_types = [
-        ("Running", 30, 350, "moderate"),
-        ("Running", 45, 520, "high"),
-        ("Cycling", 40, 400, "moderate"),
-        ("Weight training", 50, 300, "high"),
-        ("Swimming", 35, 380, "moderate"),
-        ("Yoga", 45, 180, "low"),
-        ("HIIT", 25, 350, "high"),
-        ("Walking", 60, 250, "low"),
-    ]
-
-    start_weight = 85.0
-    weight = start_weight
-
-    for day_offset in range(30):
-        d = today_d - timedelta(days=29 - day_offset)
-        ds = d.isoformat()
-
-        # Weight (gradual decline + noise)
-        weight = start_weight - (day_offset * 0.065) + random.uniform(-0.3, 0.3)
-        weight = round(weight, 1)
-        conn.execute(
-            "INSERT INTO weight_logs (weight_kg, notes, measured_at) VALUES (?, ?, ?)",
-            (weight, "Morning weigh-in", f"{ds}T07:{random.randint(0,30):02d}:00")
-        )
-
-        # Food entries
-        for meal in ["breakfast", "lunch", "dinner"]:
-            food = random.choice(meal_foods[meal])
-            name, cal, prot, carb, fat, qty = food
-            hour = {"breakfast": 8, "lunch": 12, "dinner": 19}[meal]
-            conn.execute(
-                "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, logged_at) VALUES (?,?,?,?,?,?,?,?)",
-                (name, cal + random.randint(-30, 30), prot, carb, fat, meal, qty,
-                 f"{ds}T{hour:02d}:{random.randint(0,45):02d}:00")
-            )
-
-        # Snack on ~70% of days
-        if random.random() < 0.7:
-            food = random.choice(meal_foods["snack"])
-            name, cal, prot, carb, fat, qty = food
-            conn.execute(
-                "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, logged_at) VALUES (?,?,?,?,?,?,?,?)",
-                (name, cal + random.randint(-10, 10), prot, carb, fat, "snack", qty,
-                 f"{ds}T{random.randint(15,17):02d}:{random.randint(0,59):02d}:00")
-            )
-
-        # Activity on ~60% of days
-        if random.random() < 0.6:
-            act = random.choice(activity_types)
-            act_type, duration, burned, intensity = act
-            conn.execute(
-                "INSERT INTO sport_activities (activity_type, duration_minutes, calories_burned, intensity, performed_at) VALUES (?,?,?,?,?)",
-                (act_type, duration, burned + random.randint(-20, 20), intensity,
-                 f"{ds}T{random.randint(6,18):02d}:{random.randint(0,59):02d}:00")
-            )
-
-        # Health every ~3 days
-        if day_offset % 3 == 0:
-            conn.execute(
-                "INSERT INTO health_measurements (systolic_bp, diastolic_bp, blood_sugar, blood_oxygen, heart_rate, measured_at) VALUES (?,?,?,?,?,?)",
-                (random.randint(110, 130), random.randint(70, 85),
-                 round(random.uniform(85, 105), 1), round(random.uniform(96, 99), 1),
-                 random.randint(62, 82),
-                 f"{ds}T{random.randint(7,20):02d}:{random.randint(0,59):02d}:00")
-            )
-
-    # Update profile with latest weight
-    conn.execute("UPDATE user_profile SET current_weight_kg=?", (weight,))
-    conn.commit()
-    conn.close()
+@serialized
+def seed_demo_data(conn=Depends(get_conn)):
+    """Replace all data with 30 days of realistic demo data."""
+    generate_demo_data(conn, DEMO_DAYS)
+    hub.publish("resync", reason="seed")
 
     return {"message": "Demo data seeded: 30 days of food, weight, activity, and health data."}
 
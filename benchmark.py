@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+NutriTrack Benchmark Suite
+Seeds a synthetic database and measures the REST API end to end, offline.
+
+Usage: python3 benchmark.py [--days 365 | --years 10] [--iterations 50]
+                            [--clients 8] [--duration 10] [--url http://host:8000]
+                            [--output results.json] [--baseline baseline.json [--save-baseline]]
+
+The latency phase calls each endpoint in turn through an in-process ASGI
+client. The load phase runs several concurrent clients over a weighted mix
+of the same endpoints, in process or against a running server (--url).
+Results are written as JSON. Given a baseline, p95 latency and throughput
+are compared with it and a regression beyond --tolerance exits with 1.
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Ensure we can import the app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import database
+import migrations
+from local_time import local_today
+from seed import generate, DEFAULT_SEED
+
+# Endpoint name -> path (relative to the server root)
+ENDPOINTS = {
+    "daily-summary": "/api/daily-summary",
+    "gamification": "/api/gamification",
+    "weekly-report": "/api/weekly-report",
+    "daily-totals": "/api/history/daily-totals?days=90",
+    "search": "/api/food/search?q=chick",
+    "export": "/api/export/csv?type=food",
+}
+# Relative frequency of each endpoint in the load phase (roughly a dashboard plus an agent)
+LOAD_MIX = {"daily-summary": 4, "gamification": 3, "daily-totals": 2, "search": 3, "weekly-report": 1, "export": 0.2}
+
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_MS = 1.0  # p95 changes smaller than this never count as a regression
+
+# ── Synthetic Data ───────────────────────────────────────────────────
+COUNTED_TABLES = {"food": "food_entries", "weight": "weight_logs", "activity": "sport_activities",
+                  "health": "health_measurements", "heart_rate": "heart_rate_samples"}
+
+def default_db_path(days: int, seed: int, heart_rate_interval: int = 0) -> str:
+    """Reusable location for a dataset; the schema version keeps old files from being picked up."""
+    hr = f"-hr{heart_rate_interval}" if heart_rate_interval else ""
+    name = f"nutritrack-bench-{days}d{hr}-seed{seed}-v{migrations.LATEST_VERSION}-{local_today().isoformat()}.db"
+    return os.path.join(tempfile.gettempdir(), name)
+
+def prepare_database(days: int, seed: int = DEFAULT_SEED, path: str = None, fresh: bool = False,
+                     heart_rate_interval: int = 0) -> dict:
+    """Point the app at a synthetic database, generating it unless an identical one exists."""
+    path = path or default_db_path(days, seed, heart_rate_interval)
+    database.close_pool()
+    if fresh:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    database.DB_PATH = path
+    database.init_db()
+    conn = database.get_db()
+    try:
+        seconds = 0.0
+        if not conn.execute("SELECT COUNT(*) FROM user_profile").fetchone()[0]:
+            started = time.perf_counter()
+            generate(conn, days, seed, heart_rate_interval=heart_rate_interval)
+            seconds = round(time.perf_counter() - started, 2)
+        rows = {kind: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for kind, table in COUNTED_TABLES.items()}
+    finally:
+        conn.close()
+    return {"path": path, "days": days, "seed": seed, "heart_rate_interval": heart_rate_interval,
+            "rows": rows, "seed_seconds": seconds}
+
+# ── Statistics ───────────────────────────────────────────────────────
+def percentile(sorted_values: list, p: float) -> float:
+    """Linear-interpolated percentile (p in 0..100) of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(timings: list, errors: int, seconds: float) -> dict:
+    ms = sorted(t * 1000 for t in timings)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+        "rps": round(len(ms) / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+# ── Drivers ──────────────────────────────────────────────────────────
+def make_client(url: str = None):
+    import httpx
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+    from app import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+async def timed_get(client, path: str) -> tuple:
+    started = time.perf_counter()
+    response = await client.get(path)
+    await response.aread()
+    return time.perf_counter() - started, response.status_code == 200
+
+async def latency_phase(client, iterations: int, endpoints: dict = ENDPOINTS) -> dict:
+    """Sequential requests per endpoint: per-request latency without contention."""
+    results = {}
+    for name, path in endpoints.items():
+        await timed_get(client, path)  # warm up connections and SQLite page cache
+        timings, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            elapsed, ok = await timed_get(client, path)
+            timings.append(elapsed)
+            errors += not ok
+        results[name] = summarize(timings, errors, time.perf_counter() - started)
+    return results
+
+async def load_phase(client, clients: int, duration: float, seed: int = DEFAULT_SEED,
+                     mix: dict = LOAD_MIX, endpoints: dict = ENDPOINTS) -> dict:
+    """Concurrent clients issuing a weighted endpoint mix until the deadline."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    timings = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    deadline = time.perf_counter() + duration
+
+    async def run_client(index: int):
+        rng = random.Random(seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            elapsed, ok = await timed_get(client, endpoints[name])
+            timings[name].append(elapsed)
+            errors[name] += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(i) for i in range(clients)))
+    seconds = time.perf_counter() - started
+    every = [t for ts in timings.values() for t in ts]
+    return {
+        "clients": clients,
+        "seconds": round(seconds, 2),
+        **summarize(every, sum(errors.values()), seconds),
+        "endpoints": {n: summarize(timings[n], errors[n], seconds) for n in names if timings[n]},
+    }
+
+def run_benchmark(days: int = 365, seed: int = DEFAULT_SEED, iterations: int = 50, clients: int = 8,
+                  duration: float = 10.0, url: str = None, db_path: str = None, fresh: bool = False,
+                  response_cache: bool = False, heart_rate_interval: int = 0) -> dict:
+    """Prepare the dataset, run both phases and return the results document."""
+    dataset = prepare_database(days, seed, db_path, fresh, heart_rate_interval) if not url else {"url": url}
+    if not url:
+        import app
+        if not response_cache:
+            app.response_cache.max_entries = 0  # measure the handlers, not the GET response cache
+
+    async def run():
+        async with make_client() as local:
+            latency = await latency_phase(local, iterations) if not url else None
+        async with make_client(url) as client:
+            load = await load_phase(client, clients, duration, seed) if clients and duration > 0 else None
+        return latency, load
+
+    latency, load = asyncio.run(run())
+    return {
+        "version": 1,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "dataset": dataset,
+        "response_cache": response_cache,
+        "latency": latency,
+        "load": load,
+    }
+
+# ── Baseline Comparison ──────────────────────────────────────────────
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Regressions of results against baseline, as human-readable lines."""
+    regressions = []
+
+    def check(label: str, current: dict, base: dict):
+        if not current or not base:
+            return
+        if (current["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+                and current["p95_ms"] - base["p95_ms"] > NOISE_FLOOR_MS):
+            regressions.append(f"{label}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {base['rps']:.1f} -> {current['rps']:.1f} req/s")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{label}: errors {base['errors']} -> {current['errors']}")
+
+    for name, current in (results.get("latency") or {}).items():
+        check(f"latency/{name}", current, (baseline.get("latency") or {}).get(name))
+    load, base_load = results.get("load") or {}, baseline.get("load") or {}
+    check("load/all", load, base_load)
+    for name, current in load.get("endpoints", {}).items():
+        check(f"load/{name}", current, base_load.get("endpoints", {}).get(name))
+    return regressions
+
+def print_report(results: dict):
+    dataset = results["dataset"]
+    if "rows" in dataset:
+        rows = ", ".join(f"{v} {k}" for k, v in dataset["rows"].items())
+        print(f"Dataset: {dataset['days']} days ({rows})")
+    header = f"  {'endpoint':<16}{'req':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'err':>6}"
+    if results["latency"]:
+        print("Latency (sequential, in process)")
+        print(header)
+        for name, s in results["latency"].items():
+            print(f"  {name:<16}{s['requests']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+                  f"{s['rps']:>10.1f}{s['errors']:>6}")
+    load = results["load"]
+    if load:
+        print(f"Load ({load['clients']} clients, {load['seconds']}s): {load['rps']} req/s, p95 {load['p95_ms']:.2f} ms")
+        print(header)
+        for name, s in load["endpoints"].items():
+            print(f"  {name:<16}{s['requests']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+                  f"{s['rps']:>10.1f}{s['errors']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriTrack API benchmark suite")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--days", type=int, default=365, help="days of synthetic history (default 365)")
+    size.add_argument("--years", type=float, help="years of synthetic history (overrides --days)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed of the dataset and load mix")
+    parser.add_argument("--db", help="database file to create or reuse (default: a cached file in the temp dir)")
+    parser.add_argument("--fresh", action="store_true", help="rebuild the dataset even if a cached one exists")
+    parser.add_argument("--heart-rate-interval", type=int, default=0, metavar="SECONDS",
+                        help="include wearable heart-rate samples this often (e.g. 60)")
+    parser.add_argument("--iterations", type=int, default=50, help="sequential requests per endpoint")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients in the load phase (0 skips it)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--url", help="run the load phase against a running server instead of in process")
+    parser.add_argument("--response-cache", action="store_true", help="leave the GET response cache enabled")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare with (or, with --save-baseline, write) this results file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before a regression is reported (default 0.25)")
+    args = parser.parse_args()
+
+    days = round(args.years * 365) if args.years else args.days
+    results = run_benchmark(days, args.seed, args.iterations, args.clients, args.duration, args.url,
+                            args.db, args.fresh, args.response_cache, args.heart_rate_interval)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
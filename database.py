@@ -4,139 +4,429 @@ Handles SQLite database initialization and helper functions.
 """
 import sqlite3
 import os
+import itertools
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime, date, timedelta
 
+import local_time
+import migrations
+from metrics import current_timer
+
 DB_PATH = os.environ.get(
     "NUTRITRACK_DB_PATH",
     os.path.join(os.path.dirname(os.path.abspath(__file__)), "nutritrack.db")
 )
 
+# ── Connection Pool ──────────────────────────────────────────────────
+# Connections are opened lazily, configured once, and reused across
+# requests. Size and pragma profile are tunable through the environment.
+POOL_SIZE = int(os.environ.get("NUTRITRACK_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("NUTRITRACK_DB_POOL_TIMEOUT", "10"))
+
+PRAGMA_PROFILE = {
+    "cache_size": os.environ.get("NUTRITRACK_DB_CACHE_SIZE", "-16000"),  # negative = KiB
+    "mmap_size": os.environ.get("NUTRITRACK_DB_MMAP_SIZE", "134217728"),
+    "synchronous": os.environ.get("NUTRITRACK_DB_SYNCHRONOUS", "NORMAL"),
+    "temp_store": os.environ.get("NUTRITRACK_DB_TEMP_STORE", "MEMORY"),
+}
+
+_PRAGMA_CHOICES = {
+    "synchronous": ("OFF", "NORMAL", "FULL", "EXTRA"),
+    "temp_store": ("DEFAULT", "FILE", "MEMORY"),
+}
+
+def _pragma_statements(profile: dict) -> list:
+    """Validate the pragma profile and render it as PRAGMA statements."""
+    statements = ["PRAGMA journal_mode=WAL", "PRAGMA foreign_keys=ON"]
+    for name, value in profile.items():
+        value = str(value).strip().upper()
+        if name in _PRAGMA_CHOICES:
+            if value not in _PRAGMA_CHOICES[name]:
+                raise ValueError(f"Invalid {name} pragma: {value!r}")
+        else:
+            value = str(int(value))
+        statements.append(f"PRAGMA {name}={value}")
+    return statements
+
+def _timed(method):
+    """Wrap a sqlite3 method so its duration counts towards the current request's DB time."""
+    def timed(self, *args):
+        timer = current_timer.get()
+        if timer is None:
+            return method(self, *args)
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            timer.db += time.perf_counter() - started
+    return timed
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that charges its time to the current request and traces its statement.
+
+    The trace record (statement, seconds, rows) is created by execute() and
+    grows with every fetch, so it ends up covering the whole statement.
+    """
+    _query = None
+
+    def _run(self, method, sql, parameters):
+        timer = current_timer.get()
+        if timer is None:
+            return method(self, sql, parameters)
+        started = time.perf_counter()
+        try:
+            return method(self, sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            timer.db += elapsed
+            self._query = timer.record(sql, elapsed, max(self.rowcount, 0))
+
+    @staticmethod
+    def _charge(elapsed: float):
+        timer = current_timer.get()
+        if timer is not None:  # None if the cursor outlived its request
+            timer.db += elapsed
+
+    def _fetch(self, method, *args):
+        query = self._query
+        if query is None:
+            return method(self, *args)
+        started = time.perf_counter()
+        rows = method(self, *args)
+        elapsed = time.perf_counter() - started
+        self._charge(elapsed)
+        query[1] += elapsed
+        query[2] += (rows is not None) if method is _fetchone else len(rows)
+        return rows
+
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self._run(sqlite3.Cursor.executemany, sql, parameters)
+
+    def fetchone(self):
+        return self._fetch(_fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(sqlite3.Cursor.fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        query = self._query
+        if query is None:
+            return sqlite3.Cursor.__next__(self)
+        started = time.perf_counter()
+        try:
+            row = sqlite3.Cursor.__next__(self)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._charge(elapsed)
+            query[1] += elapsed
+        query[2] += 1
+        return row
+
+_fetchone = sqlite3.Cursor.fetchone
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool.
+
+    Statements run on TimedCursor, so request metrics see the time spent in SQLite.
+    """
+
+    _pool = None
+    _checked_out = False
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    commit = _timed(sqlite3.Connection.commit)
+    rollback = _timed(sqlite3.Connection.rollback)
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def dispose(self):
+        """Really close the underlying SQLite handle."""
+        super().close()
+
+class ConnectionPool:
+    """Bounded pool of configured SQLite connections (LIFO reuse)."""
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 pragmas: dict = None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = _pragma_statements(PRAGMA_PROFILE if pragmas is None else pragmas)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+        self.profile_cache = ProfileCache()
+
+    def _connect(self) -> PooledConnection:
+        # Connections move between FastAPI worker threads, but the pool
+        # guarantees only one thread uses a connection at a time.
+        conn = sqlite3.connect(self.path, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for statement in self.pragmas:
+            conn.execute(statement)
+        conn._pool = self
+        return conn
+
+    def dedicated(self) -> PooledConnection:
+        """A configured connection outside the pool's slots (the writer thread's); dispose() it when done."""
+        return self._connect()
+
+    def acquire(self) -> PooledConnection:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn: PooledConnection):
+        if not conn._checked_out:
+            return  # closing twice is harmless
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = not self._closed
+        except sqlite3.Error:
+            reusable = False
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.dispose()
+        self._slots.release()
+
+    def close(self):
+        """Close idle connections; checked-out ones close when released."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().dispose()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, rebuilding it if DB_PATH changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+def close_pool():
+    """Dispose of all pooled connections (shutdown, tests)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 def get_db():
-    """Get a database connection with row factory."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    return conn
+    """Get a pooled database connection with row factory.
 
-def init_db():
-    """Initialize all database tables."""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.executescript("""
-        CREATE TABLE IF NOT EXISTS user_profile (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            age INTEGER NOT NULL,
-            sex TEXT NOT NULL CHECK(sex IN ('male', 'female')),
-            height_cm REAL NOT NULL,
-            current_weight_kg REAL NOT NULL,
-            activity_level TEXT NOT NULL DEFAULT 'moderate' CHECK(activity_level IN ('sedentary', 'light', 'moderate', 'active', 'very_active')),
-            weight_goal_kg REAL,
-            calorie_deficit INTEGER NOT NULL DEFAULT 500,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS food_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            calories REAL NOT NULL DEFAULT 0,
-            protein_g REAL NOT NULL DEFAULT 0,
-            carbs_g REAL NOT NULL DEFAULT 0,
-            fat_g REAL NOT NULL DEFAULT 0,
-            meal_type TEXT DEFAULT 'snack' CHECK(meal_type IN ('breakfast', 'lunch', 'dinner', 'snack')),
-            quantity TEXT,
-            notes TEXT,
-            logged_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS weight_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            weight_kg REAL NOT NULL,
-            notes TEXT,
-            measured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS sport_activities (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            activity_type TEXT NOT NULL,
-            duration_minutes INTEGER NOT NULL DEFAULT 0,
-            calories_burned REAL NOT NULL DEFAULT 0,
-            intensity TEXT DEFAULT 'moderate' CHECK(intensity IN ('low', 'moderate', 'high')),
-            notes TEXT,
-            performed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS health_measurements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            systolic_bp INTEGER,
-            diastolic_bp INTEGER,
-            blood_sugar REAL,
-            blood_oxygen REAL,
-            heart_rate INTEGER,
-            notes TEXT,
-            measured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        DROP TABLE IF EXISTS often_used_foods;
-        CREATE TABLE IF NOT EXISTS often_used_foods (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            calories REAL NOT NULL DEFAULT 0,
-            protein_g REAL NOT NULL DEFAULT 0,
-            carbs_g REAL NOT NULL DEFAULT 0,
-            fat_g REAL NOT NULL DEFAULT 0,
-            meal_type TEXT DEFAULT 'snack',
-            sort_order INTEGER NOT NULL DEFAULT 0,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS daily_coaching (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            coaching_date TEXT NOT NULL UNIQUE,
-            coaching_text TEXT NOT NULL,
-            meal_count INTEGER DEFAULT 0,
-            calories_so_far REAL DEFAULT 0,
-            calories_remaining REAL DEFAULT 0,
-            protein_status TEXT DEFAULT 'unknown',
-            top_priority TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS coaching_reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            week_start TEXT NOT NULL,
-            week_end TEXT NOT NULL,
-            report_text TEXT NOT NULL,
-            summary_json TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_often_used_updated ON often_used_foods(updated_at);
-        CREATE INDEX IF NOT EXISTS idx_food_logged_at ON food_entries(logged_at);
-        CREATE INDEX IF NOT EXISTS idx_weight_measured_at ON weight_logs(measured_at);
-        CREATE INDEX IF NOT EXISTS idx_activity_performed_at ON sport_activities(performed_at);
-        CREATE INDEX IF NOT EXISTS idx_health_measured_at ON health_measurements(measured_at);
-        CREATE INDEX IF NOT EXISTS idx_daily_coaching_date ON daily_coaching(coaching_date);
-        CREATE INDEX IF NOT EXISTS idx_coaching_created ON coaching_reports(created_at);
-        CREATE INDEX IF NOT EXISTS idx_coaching_week ON coaching_reports(week_start, week_end);
-    """)
-    # ── Safe migrations for new columns ──
+    Call close() when done; the connection goes back to the pool and any
+    uncommitted transaction is rolled back.
+    """
+    return get_pool().acquire()
+
+_savepoint_ids = itertools.count(1)
+
+@contextmanager
+def transaction(conn):
+    """Run a block atomically: BEGIN IMMEDIATE/COMMIT, or a SAVEPOINT when nested."""
+    if conn.in_transaction:
+        name = f"sp_{next(_savepoint_ids)}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        conn.execute(f"RELEASE {name}")
+    else:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+@contextmanager
+def read_snapshot(conn):
+    """Run a block of reads against one consistent view of the database.
+
+    A deferred BEGIN takes no lock; in WAL mode the snapshot is fixed by the
+    first read and writers carry on meanwhile. Writes inside the block are
+    not expected (they would be committed with it).
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
     try:
-        cursor.execute("ALTER TABLE user_profile ADD COLUMN goal_mode TEXT NOT NULL DEFAULT 'deficit' CHECK(goal_mode IN ('deficit', 'maintain', 'surplus'))")
-    except:
-        pass
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
 
+def get_conn():
+    """Request-scoped connection for FastAPI routes (use with Depends)."""
+    conn = get_db()
     try:
-        cursor.execute("ALTER TABLE user_profile ADD COLUMN calorie_surplus INTEGER NOT NULL DEFAULT 300")
-    except:
-        pass
+        yield conn
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+def init_db():
+    """Bring the schema up to date and re-derive local days if NUTRITRACK_TZ changed."""
+    conn = get_db()
+    try:
+        migrations.migrate(conn)
+        local_time.sync_timezone(conn)
+    finally:
+        conn.close()
     print(f"Database initialized at {DB_PATH}")
 
+# ── Active Profile Cache ─────────────────────────────────────────────
+PROFILE_QUERY = "SELECT * FROM user_profile ORDER BY id DESC LIMIT 1"
+
+class ProfileCache:
+    """The active user_profile row, shared by all connections of one pool.
+
+    A connection revalidates only when something may have changed since it
+    last looked: PRAGMA data_version moves on commits by other connections or
+    processes, total_changes on this connection's own writes, and version on
+    invalidate(). Even then it reads the trigger-maintained profile generation
+    row and reloads the profile only if that moved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self._generation = None
+        self._profile = None
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def get(self, conn):
+        marker = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        with self._lock:
+            version, generation, profile = self.version, self._generation, self._profile
+        if getattr(conn, "_profile_seen", None) != (marker, version):
+            current = conn.execute(
+                "SELECT generation FROM write_generations WHERE name = 'user_profile'"
+            ).fetchone()[0]
+            if current != generation:
+                row = conn.execute(PROFILE_QUERY).fetchone()
+                generation, profile = current, (dict(row) if row else None)
+                with self._lock:
+                    self._generation, self._profile = generation, profile
+            conn._profile_seen = (marker, version)
+        return dict(profile) if profile else None
+
+def get_active_profile(conn):
+    """Latest profile as a dict (None if unset), served from the pool's cache."""
+    pool = getattr(conn, "_pool", None)
+    if pool is None or conn.in_transaction:
+        # Uncommitted profile writes must not leak into the shared cache
+        row = conn.execute(PROFILE_QUERY).fetchone()
+        return dict(row) if row else None
+    return pool.profile_cache.get(conn)
+
+def invalidate_profile(conn):
+    """Drop cached profile-derived state after a profile write on conn."""
+    pool = getattr(conn, "_pool", None)
+    if pool is not None:
+        pool.profile_cache.invalidate()
+    clear_goal_cache()
+
+# ── Daily Totals Rollup ──────────────────────────────────────────────
+# One row per day with food and activity sums, kept current by triggers
+# (see migrations.py) inside the same transaction as the write.
+EMPTY_DAY_TOTALS = {
+    "calories": 0, "protein_g": 0, "carbs_g": 0, "fat_g": 0, "food_count": 0,
+    "calories_burned": 0, "activity_minutes": 0, "activity_count": 0,
+}
+
+def rebuild_daily_totals(conn, food_day: str = "local_day", activity_day: str = "local_day") -> int:
+    """Recompute the daily_totals rollup from the raw entries. Returns day count.
+
+    food_day and activity_day are the SQL day expressions (overridden only by
+    migrations that predate the local_day columns).
+    """
+    conn.execute("DELETE FROM daily_totals")
+    conn.execute(f"""
+        INSERT INTO daily_totals (day, calories, protein_g, carbs_g, fat_g, food_count)
+        SELECT {food_day}, SUM(calories), SUM(protein_g), SUM(carbs_g), SUM(fat_g), COUNT(*)
+        FROM food_entries
+        WHERE {food_day} IS NOT NULL
+        GROUP BY {food_day}
+    """)
+    conn.execute(f"""
+        INSERT INTO daily_totals (day, calories_burned, activity_minutes, activity_count)
+        SELECT {activity_day}, SUM(calories_burned), SUM(duration_minutes), COUNT(*)
+        FROM sport_activities
+        WHERE {activity_day} IS NOT NULL
+        GROUP BY {activity_day}
+        ON CONFLICT(day) DO UPDATE SET
+            calories_burned = excluded.calories_burned,
+            activity_minutes = excluded.activity_minutes,
+            activity_count = excluded.activity_count
+    """)
+    return conn.execute("SELECT COUNT(*) FROM daily_totals").fetchone()[0]
+
+def get_day_totals(conn, day: str) -> dict:
+    """Rollup row for one YYYY-MM-DD day (zeros when nothing was logged)."""
+    row = conn.execute("SELECT * FROM daily_totals WHERE day = ?", (day,)).fetchone()
+    return dict(row) if row else dict(EMPTY_DAY_TOTALS, day=day)
+
+def get_totals_range(conn, start_day: str, end_day: str) -> dict:
+    """Rollup rows between two YYYY-MM-DD days (inclusive), keyed by day."""
+    rows = conn.execute(
+        "SELECT * FROM daily_totals WHERE day BETWEEN ? AND ? ORDER BY day", (start_day, end_day)
+    ).fetchall()
+    return {r["day"]: dict(r) for r in rows}
+
 # ── Calorie & Macro Calculation ──────────────────────────────────────
 
 ACTIVITY_MULTIPLIERS = {
@@ -161,47 +451,99 @@ def calculate_tdee(bmr: float, activity_level: str) -> float:
     multiplier = ACTIVITY_MULTIPLIERS.get(activity_level, 1.55)
     return round(bmr * multiplier, 1)
 
-def calculate_daily_goals(profile: dict, activity_calories: float = 0) -> dict:
-    """Calculate full daily goals from profile + extra activity."""
-    bmr = calculate_bmr(
-        profile["current_weight_kg"], profile["height_cm"], profile["age"], profile["sex"]
-    )
-    tdee = calculate_tdee(bmr, profile["activity_level"])
-    calorie_deficit = profile.get("calorie_deficit", 500) if isinstance(profile, dict) else (profile["calorie_deficit"] if "calorie_deficit" in profile.keys() else 500)
-    goal_mode = profile.get("goal_mode", "deficit") if isinstance(profile, dict) else (profile["goal_mode"] if "goal_mode" in profile.keys() else "deficit")
-    calorie_surplus = profile.get("calorie_surplus", 300) if isinstance(profile, dict) else (profile["calorie_surplus"] if "calorie_surplus" in profile.keys() else 300)
+# Profile fields that determine daily goals, with defaults for pre-goal-mode profiles
+GOAL_PROFILE_FIELDS = (
+    "age", "sex", "height_cm", "current_weight_kg", "activity_level",
+    "calorie_deficit", "goal_mode", "calorie_surplus",
+)
+GOAL_DEFAULTS = {"calorie_deficit": 500, "goal_mode": "deficit", "calorie_surplus": 300}
+GOAL_CACHE_SIZE = int(os.environ.get("NUTRITRACK_GOAL_CACHE_SIZE", "1024"))
+
+class ProfileSnapshot(namedtuple("ProfileSnapshot", GOAL_PROFILE_FIELDS)):
+    """Hashable, normalized view of the goal-relevant profile fields."""
+    __slots__ = ()
+
+    @classmethod
+    def from_profile(cls, profile) -> "ProfileSnapshot":
+        """Build from a dict, sqlite3.Row or an existing snapshot."""
+        if isinstance(profile, cls):
+            return profile
+        keys = profile.keys()
+        value = lambda f: profile[f] if f in keys and profile[f] is not None else GOAL_DEFAULTS.get(f)
+        return cls(
+            age=int(value("age")),
+            sex=value("sex"),
+            height_cm=float(value("height_cm")),
+            current_weight_kg=float(value("current_weight_kg")),
+            activity_level=value("activity_level"),
+            calorie_deficit=int(value("calorie_deficit")),
+            goal_mode=value("goal_mode"),
+            calorie_surplus=int(value("calorie_surplus")),
+        )
 
+def _calorie_goal(snapshot: ProfileSnapshot, tdee: float, activity_calories: float) -> float:
     # Add exercise calories to TDEE before applying deficit/surplus
     effective_tdee = tdee + activity_calories
-
-    if goal_mode == "surplus":
-        calorie_goal = effective_tdee + calorie_surplus
-    elif goal_mode == "maintain":
+    if snapshot.goal_mode == "surplus":
+        calorie_goal = effective_tdee + snapshot.calorie_surplus
+    elif snapshot.goal_mode == "maintain":
         calorie_goal = effective_tdee
     else:  # deficit (default, backward compatible)
-        calorie_goal = effective_tdee - calorie_deficit
+        calorie_goal = effective_tdee - snapshot.calorie_deficit
+    return max(calorie_goal, 1200)
 
-    calorie_goal = max(calorie_goal, 1200)
+@lru_cache(maxsize=2)
+def _base_energy(snapshot: ProfileSnapshot) -> tuple:
+    bmr = calculate_bmr(snapshot.current_weight_kg, snapshot.height_cm, snapshot.age, snapshot.sex)
+    return bmr, calculate_tdee(bmr, snapshot.activity_level)
 
-    # Macro split: 30% protein, 40% carbs, 30% fat
-    protein_goal = round((calorie_goal * 0.30) / 4, 1)
-    carbs_goal = round((calorie_goal * 0.40) / 4, 1)
-    fat_goal = round((calorie_goal * 0.30) / 9, 1)
+@lru_cache(maxsize=GOAL_CACHE_SIZE)
+def _cached_goals(snapshot: ProfileSnapshot, activity_calories: float) -> dict:
+    bmr, tdee = _base_energy(snapshot)
+    calorie_goal = _calorie_goal(snapshot, tdee, activity_calories)
 
+    # Macro split: 30% protein, 40% carbs, 30% fat
     return {
         "bmr": bmr,
         "tdee": tdee,
         "activity_calories": activity_calories,
-        "effective_tdee": effective_tdee,
-        "calorie_deficit": calorie_deficit,
-        "calorie_surplus": calorie_surplus,
-        "goal_mode": goal_mode,
+        "effective_tdee": tdee + activity_calories,
+        "calorie_deficit": snapshot.calorie_deficit,
+        "calorie_surplus": snapshot.calorie_surplus,
+        "goal_mode": snapshot.goal_mode,
         "calorie_goal": round(calorie_goal, 1),
-        "protein_goal_g": protein_goal,
-        "carbs_goal_g": carbs_goal,
-        "fat_goal_g": fat_goal,
+        "protein_goal_g": round((calorie_goal * 0.30) / 4, 1),
+        "carbs_goal_g": round((calorie_goal * 0.40) / 4, 1),
+        "fat_goal_g": round((calorie_goal * 0.30) / 9, 1),
     }
 
+def calculate_daily_goals(profile, activity_calories: float = 0) -> dict:
+    """Calculate full daily goals from profile + extra activity.
+
+    Memoized per (profile snapshot, activity calories); returns a fresh dict.
+    """
+    return dict(_cached_goals(ProfileSnapshot.from_profile(profile), activity_calories))
+
+def calculate_daily_goals_range(profile, activity_calories: list) -> dict:
+    """Goals for many days at once: one BMR/TDEE pass, lists aligned with activity_calories."""
+    snapshot = ProfileSnapshot.from_profile(profile)
+    bmr, tdee = _base_energy(snapshot)
+    calorie_goals = [_calorie_goal(snapshot, tdee, a) for a in activity_calories]
+    return {
+        "bmr": bmr,
+        "tdee": tdee,
+        "goal_mode": snapshot.goal_mode,
+        "calorie_goal": [round(c, 1) for c in calorie_goals],
+        "protein_goal_g": [round((c * 0.30) / 4, 1) for c in calorie_goals],
+        "carbs_goal_g": [round((c * 0.40) / 4, 1) for c in calorie_goals],
+        "fat_goal_g": [round((c * 0.30) / 9, 1) for c in calorie_goals],
+    }
+
+def clear_goal_cache():
+    """Drop memoized goals; call after the profile changes."""
+    _cached_goals.cache_clear()
+    _base_energy.cache_clear()
+
 def calculate_gamification(daily_data: dict, goals: dict):
     """
     Calculate points and streak status for a single day.
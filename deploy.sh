@@ -31,7 +31,7 @@ PID_FILE="$SCRIPT_DIR/.nutritrack.pid"
 LOG_FILE="$SCRIPT_DIR/nutritrack.log"
 DATA_DIR="$SCRIPT_DIR/data"
 DB_PATH="$DATA_DIR/nutritrack.db"
-HEALTH_URL="http://127.0.0.1:$PORT/api/profile"
+HEALTH_URL="http://127.0.0.1:$PORT/healthz"
 HEALTH_TIMEOUT=20
 
 # ── Colors ────────────────────────────────────────────────────────────
@@ -0,0 +1,129 @@
+"""
+NutriTrack Agent Digests
+Compact, size-budgeted views of the daily summary and period reports.
+
+A digest keeps the aggregates an agent needs for a check-in (goals, averages,
+adherence, deltas against the previous period, top foods, anomalies) and
+appends raw per-day and per-entry rows only while they fit the token budget.
+Sections are dropped in DROP_ORDER until the estimate fits; the digest lists
+what it left out so the agent knows to ask for format=full (entries=true
+for periods longer than a month) if it needs it.
+"""
+import json
+
+DEFAULT_MAX_TOKENS = 600
+CHARS_PER_TOKEN = 4  # rough estimate for compact JSON
+
+GOAL_KEYS = ("calorie_goal", "protein_goal_g", "carbs_goal_g", "fat_goal_g")
+
+def estimate_tokens(data) -> int:
+    return len(json.dumps(data, separators=(",", ":"), default=str)) // CHARS_PER_TOKEN + 1
+
+def fit_budget(digest: dict, max_tokens: int, drop_order: tuple, omitted: list = None) -> dict:
+    """Drop optional sections in order until the digest fits max_tokens."""
+    omitted = list(omitted or ())
+    for key in drop_order:
+        if estimate_tokens(digest) <= max_tokens:
+            break
+        if key in digest:
+            del digest[key]
+            omitted.append(key)
+    digest["omitted"] = omitted
+    digest["approx_tokens"] = estimate_tokens(digest)
+    return digest
+
+def _compact(values: dict) -> dict:
+    return {k: round(v, 1) if isinstance(v, float) else v for k, v in values.items() if v is not None}
+
+def _delta(current, previous):
+    return round(current - previous, 1) if current is not None and previous is not None else None
+
+# ── Period Digest ────────────────────────────────────────────────────
+PERIOD_DROP_ORDER = ("activities", "days", "weights", "anomalies", "top_foods", "health")
+
+def period_digest(report: dict, previous: dict, max_tokens: int = DEFAULT_MAX_TOKENS) -> dict:
+    """Digest of a period report, compared with the report of the period before it.
+
+    Both may be aggregates only (see reports.get_report); raw weights and
+    activities are listed when the report carries its entries.
+    """
+    nutrition, activity, weight = report["nutrition"], report["activity"], report["weight"]
+    prev_nutrition = previous["nutrition"] if previous and previous["nutrition"]["daily_breakdown"] else None
+
+    digest = {
+        "format": "digest",
+        "period": report["period"],
+        "period_type": report.get("period_type"),
+        "closed": report.get("closed"),
+        "days_logged": len(nutrition["daily_breakdown"]),
+        "goals": {k: report["goals"][k] for k in GOAL_KEYS} if report.get("goals") else None,
+        "avg": {k: nutrition[f"avg_{k}"] for k in ("calories", "protein_g", "carbs_g", "fat_g")},
+        "adherence": {"days_over_goal": nutrition["days_over_goal"], "days_within_goal": nutrition["days_under_goal"]},
+        "weight": _compact({"start": weight["start_weight"], "end": weight["end_weight"], "change_kg": weight["change_kg"]}),
+        "activity": {
+            "sessions": activity["total_sessions"],
+            "minutes": activity["total_duration_min"],
+            "kcal_burned": activity["total_calories_burned"],
+            "types": sorted(activity["types"]),
+        },
+        "vs_previous": _compact({
+            "period": previous["period"] if previous else None,
+            "avg_calories": _delta(nutrition["avg_calories"], prev_nutrition["avg_calories"]) if prev_nutrition else None,
+            "avg_protein_g": _delta(nutrition["avg_protein_g"], prev_nutrition["avg_protein_g"]) if prev_nutrition else None,
+            "days_over_goal": _delta(nutrition["days_over_goal"], prev_nutrition["days_over_goal"]) if prev_nutrition else None,
+            "weight_change_kg": _delta(weight["change_kg"], previous["weight"]["change_kg"]) if previous else None,
+            "sessions": _delta(activity["total_sessions"], previous["activity"]["total_sessions"]) if previous else None,
+        }),
+        "health": _compact({k: v for k, v in report["health"].items() if k != "all_entries"}),
+        "top_foods": [[f["name"], f["times_logged"], f["avg_calories"]] for f in nutrition.get("top_foods", [])[:5]],
+        "anomalies": report["anomalies"],
+        # Raw rows last: the first to go when over budget
+        "days": {day: [round(t[k]) for k in ("calories", "protein_g", "carbs_g", "fat_g")]
+                 for day, t in sorted(nutrition["daily_breakdown"].items())},
+    }
+    if "all_entries" in weight:
+        digest["weights"] = [[w["local_day"], w["weight_kg"]] for w in weight["all_entries"]]
+    if "activities" in activity:
+        digest["activities"] = [[a["local_day"], a["activity_type"], a["duration_minutes"], round(a["calories_burned"])]
+                                for a in activity["activities"]]
+    missing = [key for key in ("activities", "weights") if key not in digest]
+    return fit_budget(digest, max_tokens, PERIOD_DROP_ORDER, missing)
+
+# ── Daily Digest ─────────────────────────────────────────────────────
+DAILY_DROP_ORDER = ("entries", "activities", "meals")
+
+def daily_digest(summary: dict, max_tokens: int = DEFAULT_MAX_TOKENS) -> dict:
+    """Digest of a /api/daily-summary response."""
+    meals = {}
+    for entry in summary["food_entries"]:
+        meal = entry["meal_type"] or "snack"
+        meals[meal] = round(meals.get(meal, 0) + entry["calories"])
+    goals = summary["goals"]
+    flags = []
+    if summary["intake"]["calories"] > goals["calorie_goal"]:
+        flags.append("over_calorie_goal")
+    if summary["food_entries"] and summary["intake"]["protein_g"] < goals["protein_goal_g"] * 0.5:
+        flags.append("low_protein")
+    if not summary["food_entries"]:
+        flags.append("nothing_logged")
+    weight = summary["latest_weight"]
+
+    digest = {
+        "format": "digest",
+        "date": summary["date"],
+        "goals": {k: goals[k] for k in GOAL_KEYS},
+        "intake": summary["intake"],
+        "remaining": summary["remaining"],
+        "flags": flags,
+        "latest_weight": [weight["local_day"], weight["weight_kg"]] if weight else None,
+        "activity": {
+            "sessions": len(summary["activities"]),
+            "kcal_burned": round(sum(a["calories_burned"] for a in summary["activities"]), 1),
+        },
+        "meals": meals,
+        "activities": [[a["activity_type"], a["duration_minutes"], round(a["calories_burned"])]
+                       for a in summary["activities"]],
+        "entries": [[e["name"], e["meal_type"], round(e["calories"]), round(e["protein_g"])]
+                    for e in summary["food_entries"]],
+    }
+    return fit_budget(digest, max_tokens, DAILY_DROP_ORDER)
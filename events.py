@@ -0,0 +1,83 @@
+"""
+NutriTrack Event Hub
+Fan-out of compact change events to Server-Sent Events subscribers.
+
+Write endpoints run in worker threads and call publish(); the hub hands each
+event to the event loop, which copies it into every subscriber's bounded
+queue. A subscriber that falls behind loses its backlog and gets a single
+"resync" event instead of blocking writers or growing without bound. Recent
+events are kept in a short ring buffer so a reconnecting client can resume
+from its Last-Event-ID.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+
+QUEUE_SIZE = int(os.environ.get("NUTRITRACK_EVENT_QUEUE_SIZE", "100"))
+HISTORY_SIZE = 256
+KEEPALIVE_SECONDS = 15
+
+class EventHub:
+    """Broadcast hub for one process; safe to publish from any thread."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, history_size: int = HISTORY_SIZE):
+        self.queue_size = queue_size
+        self._ids = itertools.count(1)
+        self._id_lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._loop = None
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, type: str, **data):
+        """Queue an event for all subscribers (no-op when nobody listens)."""
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        with self._id_lock:
+            event = (next(self._ids), type, json.dumps(data, default=str))
+        try:
+            loop.call_soon_threadsafe(self._dispatch, event)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    def _dispatch(self, event: tuple):
+        self._history.append(event)
+        for queue in self._subscribers:
+            if queue.full():
+                # Too slow: drop its backlog and tell it to reload everything
+                self.dropped += queue.qsize()
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((event[0], "resync", "{}"))
+            else:
+                queue.put_nowait(event)
+
+    def subscribe(self, last_event_id: int = None) -> asyncio.Queue:
+        """Register a subscriber on the running loop, replaying events after last_event_id."""
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id is not None:
+            missed = [e for e in self._history if e[0] > last_event_id]
+            if self._history and self._history[0][0] > last_event_id + 1 or len(missed) > self.queue_size:
+                queue.put_nowait((last_event_id, "resync", "{}"))
+            else:
+                for event in missed:
+                    queue.put_nowait(event)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+def format_sse(event_id: int, type: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {type}\ndata: {data}\n\n"
+
+hub = EventHub()
@@ -0,0 +1,86 @@
+"""
+NutriTrack Food Search
+Ranked autocomplete over distinct foods.
+
+food_catalog holds one row per normalized food name (lower-cased, trimmed)
+with the values of its latest entry, how often it was logged and when;
+triggers keep it in step with food_entries. food_search is an FTS5 index
+over the catalog, so a query touches distinct foods rather than the whole
+history and stays fast as the log grows. Matches are ranked by bm25 and
+boosted for foods logged often and recently.
+"""
+import math
+import re
+import sqlite3
+from datetime import date
+
+from local_time import local_day, local_today
+
+SEARCH_CANDIDATES = 200  # best bm25 matches re-ranked in Python
+FREQUENCY_WEIGHT = 0.25
+RECENCY_WEIGHT = 0.5
+RECENCY_HALF_LIFE_DAYS = 30
+
+RESULT_FIELDS = ("name", "calories", "protein_g", "carbs_g", "fat_g", "meal_type", "quantity",
+                 "times_logged", "last_logged")
+
+def has_fts(conn) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'food_search'"
+    ).fetchone() is not None
+
+def rebuild_food_catalog(conn) -> int:
+    """Recompute food_catalog (and its FTS index) from food_entries. Returns food count."""
+    conn.execute("DELETE FROM food_catalog")
+    # With a single max() aggregate, SQLite takes the bare columns from the latest entry
+    conn.execute("""
+        INSERT INTO food_catalog (key, name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, notes,
+                                  times_logged, last_logged)
+        SELECT lower(trim(name)), trim(name), calories, protein_g, carbs_g, fat_g, meal_type, quantity, notes,
+               COUNT(*), MAX(logged_at)
+        FROM food_entries
+        GROUP BY lower(trim(name))
+    """)
+    if has_fts(conn):
+        conn.execute("INSERT INTO food_search (food_search) VALUES ('rebuild')")
+    return conn.execute("SELECT COUNT(*) FROM food_catalog").fetchone()[0]
+
+def match_expression(q: str) -> str:
+    """FTS5 query where every word of q is a prefix ("chick bre" -> "chick"* "bre"*)."""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", q.lower()))
+
+def _score(row, today: date) -> float:
+    relevance = -row["rank"] if row["rank"] else 1.0  # bm25: lower is better
+    frequency = 1 + FREQUENCY_WEIGHT * math.log1p(row["times_logged"])
+    try:
+        age_days = max((today - date.fromisoformat(local_day(row["last_logged"]))).days, 0)
+    except (TypeError, ValueError):
+        age_days = None
+    recency = 1 + RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS) if age_days is not None else 1
+    return relevance * frequency * recency
+
+def search_foods(conn, q: str, limit: int = 20, today: date = None) -> list:
+    """Distinct foods matching q, best first."""
+    expression = match_expression(q)
+    if not expression:
+        return []
+    try:
+        rows = conn.execute("""
+            SELECT c.*, bm25(food_search, 10.0, 2.0, 1.0) AS rank
+            FROM food_search JOIN food_catalog c ON c.id = food_search.rowid
+            WHERE food_search MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (expression, SEARCH_CANDIDATES)).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        # SQLite without FTS5: substring match over the (small) catalog
+        rows = conn.execute(
+            "SELECT *, 0 AS rank FROM food_catalog WHERE name LIKE ? ORDER BY times_logged DESC LIMIT ?",
+            (f"%{q.strip()}%", SEARCH_CANDIDATES)
+        ).fetchall()
+
+    today = today or local_today()
+    ranked = sorted(rows, key=lambda r: _score(r, today), reverse=True)[:limit]
+    return [{f: r[f] for f in RESULT_FIELDS} for r in ranked]
@@ -0,0 +1,237 @@
+"""
+NutriTrack Gamification State
+Streaks, XP and badges, persisted and advanced incrementally from the daily_totals rollup.
+
+A day extends the streak when food was logged and calories stayed within that
+day's goal; a day without food breaks it. streak_days stores each evaluated
+day's score and running counters, so a late edit to an old day only
+re-evaluates from that day forward. Days are evaluated once they are closed
+(before today); a change to the goal-relevant profile fields re-scores all.
+
+XP is an append-only ledger: each closed day adds its points once, later edits
+to that day append a correction, and badges add a one-off bonus. xp_summary
+keeps the running total so reads never replay the ledger.
+"""
+import json
+from collections import namedtuple
+from datetime import date, timedelta
+
+from database import transaction, ProfileSnapshot, calculate_daily_goals_range, calculate_gamification
+from local_time import local_today
+from writer import writer, in_writer_thread
+
+# ── Badge Rules ──────────────────────────────────────────────────────
+# A badge is earned on the first closed day whose counter reaches the threshold.
+BadgeRule = namedtuple("BadgeRule", ["id", "name", "description", "counter", "threshold", "xp"])
+
+BADGE_RULES = [
+    BadgeRule("streak_3", "On a Roll", "3-day calorie streak", "run", 3, 50),
+    BadgeRule("streak_7", "Week Warrior", "7-day calorie streak", "run", 7, 100),
+    BadgeRule("streak_30", "Monthly Master", "30-day calorie streak", "run", 30, 500),
+    BadgeRule("streak_100", "Centurion", "100-day calorie streak", "run", 100, 2000),
+    BadgeRule("protein_7", "Protein Week", "Protein goal met 7 days in a row", "protein_run", 7, 150),
+    BadgeRule("protein_30", "Protein Month", "Protein goal met 30 days in a row", "protein_run", 30, 600),
+    BadgeRule("elite_week", "Elite Week", "7 elite days in a row", "elite_run", 7, 300),
+    BadgeRule("activities_10", "Getting Moving", "10 activities logged", "activity_total", 10, 50),
+    BadgeRule("activities_50", "Regular", "50 activities logged", "activity_total", 50, 200),
+    BadgeRule("activities_100", "Athlete", "100 activities logged", "activity_total", 100, 500),
+]
+BADGES_BY_ID = {rule.id: rule for rule in BADGE_RULES}
+
+LEVEL_XP_STEP = 100  # level n starts at LEVEL_XP_STEP * (n - 1) ** 2 XP
+
+def level_for_xp(total_xp: int) -> dict:
+    level = 1 + int((max(total_xp, 0) / LEVEL_XP_STEP) ** 0.5)
+    return {"level": level, "next_level_xp": LEVEL_XP_STEP * level ** 2}
+
+# ── Day Scoring ──────────────────────────────────────────────────────
+DayScore = namedtuple("DayScore", [
+    "day", "success", "run", "best", "points", "protein_run", "elite_run", "activity_total",
+])
+EMPTY_SCORE = DayScore(None, 0, 0, 0, 0, 0, 0, 0)
+
+def profile_key(profile) -> str:
+    """Fingerprint of the profile fields that feed calculate_daily_goals."""
+    return json.dumps(list(ProfileSnapshot.from_profile(profile)))
+
+def is_streak_day(totals: dict, goals: dict) -> bool:
+    return totals["food_count"] > 0 and 0 < totals["calories"] <= goals["calorie_goal"]
+
+def score_day(totals: dict, goals: dict, prev: DayScore) -> DayScore:
+    """Score one rollup row, continuing the counters of the previous scored day."""
+    day = totals["day"]
+    consecutive = prev.day is not None and (date.fromisoformat(day) - date.fromisoformat(prev.day)).days == 1
+    result = calculate_gamification(totals, goals)
+    success = is_streak_day(totals, goals)
+    has_food = totals["food_count"] > 0
+
+    def extend(counter, hit):
+        return (counter + 1 if consecutive else 1) if hit else 0
+
+    run = extend(prev.run, success)
+    return DayScore(
+        day=day,
+        success=int(success),
+        run=run,
+        best=max(prev.best, run),
+        points=result["points"] if has_food else 0,
+        protein_run=extend(prev.protein_run, has_food and "protein_met" in result["tags"]),
+        elite_run=extend(prev.elite_run, has_food and result["is_elite"]),
+        activity_total=prev.activity_total + totals["activity_count"],
+    )
+
+# ── State Refresh ────────────────────────────────────────────────────
+def _is_day(value: str) -> bool:
+    try:
+        return date.fromisoformat(value).isoformat() == value
+    except (TypeError, ValueError):
+        return False
+
+def _state(conn) -> dict:
+    return dict(conn.execute("SELECT * FROM streak_state WHERE id = 1").fetchone())
+
+def _is_current(state: dict, key: str, yesterday: str) -> bool:
+    return (state["profile_key"] == key and state["dirty_from"] is None
+            and state["last_evaluated_day"] == yesterday)
+
+def _append_xp(conn, day: str, kind: str, xp: int, ref: str = None):
+    conn.execute("INSERT INTO xp_ledger (day, kind, ref, xp) VALUES (?, ?, ?, ?)", (day, kind, ref, xp))
+    conn.execute("UPDATE xp_summary SET total_xp = total_xp + ? WHERE id = 1", (xp,))
+
+def _reconcile_ledger(conn, scores: list, since: str):
+    """Append day XP or corrections so each day's ledger net matches its score."""
+    booked = dict(conn.execute(
+        "SELECT day, SUM(xp) FROM xp_ledger WHERE day >= ? AND kind != 'badge' GROUP BY day", (since,)
+    ).fetchall())
+    points = {s.day: s.points for s in scores if s.day >= since}
+    for day in sorted(set(booked) | set(points)):
+        delta = points.get(day, 0) - booked.get(day, 0)
+        if delta:
+            _append_xp(conn, day, "day" if day not in booked else "correction", delta)
+
+def _award_badges(conn, scores: list):
+    earned = {r[0] for r in conn.execute("SELECT badge_id FROM badges")}
+    for score in scores:
+        for rule in BADGE_RULES:
+            if rule.id not in earned and getattr(score, rule.counter) >= rule.threshold:
+                earned.add(rule.id)
+                conn.execute("INSERT INTO badges (badge_id, earned_on) VALUES (?, ?)", (rule.id, score.day))
+                conn.execute("UPDATE xp_summary SET badge_count = badge_count + 1 WHERE id = 1")
+                _append_xp(conn, score.day, "badge", rule.xp, rule.id)
+
+def refresh_streaks(conn, profile: dict, today: date = None) -> dict:
+    """Evaluate closed days not yet reflected in streak_state and return the state.
+
+    A no-op (one primary-key read) when nothing changed since the last call.
+    Otherwise the evaluation runs as a writer job (see writer.py), so reads
+    that find the state stale never take the write lock themselves.
+    """
+    today = today or local_today()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    key = profile_key(profile)
+
+    state = _state(conn)
+    if _is_current(state, key, yesterday):
+        return state
+    if in_writer_thread():
+        return _advance_streaks(conn, profile, yesterday, key)
+    return writer.run(lambda write_conn: _advance_streaks(write_conn, profile, yesterday, key))
+
+def _advance_streaks(conn, profile: dict, yesterday: str, key: str) -> dict:
+    with transaction(conn):
+        state = _state(conn)  # re-read under the write lock; another request may have won
+        if _is_current(state, key, yesterday):
+            return state
+
+        last = state["last_evaluated_day"]
+        if last is None or last > yesterday or not _is_day(last):
+            start = ""  # full re-evaluation
+        elif state["dirty_from"] is not None:
+            start = state["dirty_from"]
+        else:
+            start = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+        # XP is only re-booked for days whose data changed or closed, not for
+        # days re-scored because the profile moved on
+        ledger_since = start
+        if state["profile_key"] != key:
+            start = ""
+
+        conn.execute("DELETE FROM streak_days WHERE day >= ?", (start,))
+        prev_row = conn.execute(
+            f"SELECT {', '.join(DayScore._fields)} FROM streak_days WHERE day < ? ORDER BY day DESC LIMIT 1",
+            (start,)
+        ).fetchone()
+        prev = DayScore(*prev_row) if prev_row else EMPTY_SCORE
+
+        scores = []
+        # Rows written around the triggers may carry a day that isn't a date; never score those
+        rows = conn.execute(
+            "SELECT * FROM daily_totals WHERE day >= ? AND day <= ? AND date(day) IS day ORDER BY day",
+            (start, yesterday)
+        ).fetchall()
+        goal_range = calculate_daily_goals_range(profile, [r["calories_burned"] for r in rows])
+        for i, row in enumerate(rows):
+            goals = {k: goal_range[k][i] for k in ("calorie_goal", "protein_goal_g", "carbs_goal_g", "fat_goal_g")}
+            prev = score_day(dict(row), goals, prev)
+            scores.append(prev)
+
+        conn.executemany(
+            f"INSERT INTO streak_days ({', '.join(DayScore._fields)}) VALUES ({', '.join('?' * len(DayScore._fields))})",
+            scores
+        )
+        _reconcile_ledger(conn, scores, ledger_since)
+        _award_badges(conn, scores)
+
+        current_run = prev.run if prev.day == yesterday else 0
+        conn.execute(
+            """UPDATE streak_state SET current_run = ?, best_run = ?, last_evaluated_day = ?,
+               dirty_from = NULL, profile_key = ? WHERE id = 1""",
+            (current_run, prev.best, yesterday, key)
+        )
+        return _state(conn)
+
+def rebuild_gamification(conn, profile: dict, today: date = None) -> dict:
+    """Drop all derived streak, XP and badge state and re-evaluate every closed day.
+
+    Use after changing BADGE_RULES or the scoring rules. Runs on conn itself,
+    in one transaction, rather than as a writer job: it is the command-line
+    rebuild, outside the server's request path.
+    """
+    today = today or local_today()
+    with transaction(conn):
+        reset_gamification(conn)
+        _advance_streaks(conn, profile, (today - timedelta(days=1)).isoformat(), profile_key(profile))
+    return xp_summary(conn)
+
+def reset_gamification(conn):
+    """Forget all streak, XP and badge state; the next read re-evaluates from the first day."""
+    with transaction(conn):
+        conn.execute("DELETE FROM streak_days")
+        conn.execute("DELETE FROM xp_ledger")
+        conn.execute("DELETE FROM badges")
+        conn.execute("UPDATE xp_summary SET total_xp = 0, badge_count = 0 WHERE id = 1")
+        conn.execute("""UPDATE streak_state SET current_run = 0, best_run = 0, last_evaluated_day = NULL,
+                        dirty_from = NULL, profile_key = NULL WHERE id = 1""")
+
+# ── Reads ────────────────────────────────────────────────────────────
+def streak_summary(conn, profile: dict, today_totals: dict, today_goals: dict, today: date = None) -> dict:
+    """Current streak through yesterday and best streak over the whole history.
+
+    Today is still open, so it never extends streak_days, but a run that today
+    continues counts toward best_streak.
+    """
+    state = refresh_streaks(conn, profile, today)
+    best = state["best_run"]
+    if is_streak_day(today_totals, today_goals):
+        best = max(best, state["current_run"] + 1)
+    return {"streak_days": state["current_run"], "best_streak": best}
+
+def xp_summary(conn) -> dict:
+    """Total XP, level and earned badges from the summary rows (call after refresh_streaks)."""
+    summary = conn.execute("SELECT total_xp, badge_count FROM xp_summary WHERE id = 1").fetchone()
+    badges = [
+        {"id": r["badge_id"], "name": rule.name, "description": rule.description, "earned_on": r["earned_on"]}
+        for r in conn.execute("SELECT badge_id, earned_on FROM badges ORDER BY earned_on, badge_id")
+        for rule in [BADGES_BY_ID.get(r["badge_id"])] if rule
+    ]
+    return {"total_xp": summary["total_xp"], **level_for_xp(summary["total_xp"]), "badges": badges}
@@ -0,0 +1,192 @@
+"""
+NutriTrack Bulk Importer
+Loads the CSV/NDJSON files produced by /api/export/csv back into the database.
+
+Rows are parsed as a stream, validated with the API's Pydantic models and
+inserted in batched transactions. Rows already present (same timestamp and
+name/value) are skipped, so re-importing the same file is harmless.
+"""
+import csv
+import io
+import json
+import sqlite3
+import time
+import zipfile
+from collections import namedtuple
+
+from pydantic import ValidationError
+
+from database import get_db, transaction
+from models import FoodEntry, WeightEntry, ActivityEntry, HealthEntry
+
+ImportSpec = namedtuple("ImportSpec", ["table", "model", "ts_field", "key_fields"])
+
+IMPORT_SPECS = {
+    "food": ImportSpec("food_entries", FoodEntry, "logged_at", ("name",)),
+    "weight": ImportSpec("weight_logs", WeightEntry, "measured_at", ("weight_kg",)),
+    "activity": ImportSpec("sport_activities", ActivityEntry, "performed_at", ("activity_type",)),
+    "health": ImportSpec("health_measurements", HealthEntry, "measured_at",
+                         ("systolic_bp", "diastolic_bp", "blood_sugar", "blood_oxygen", "heart_rate")),
+}
+IMPORT_FORMATS = ("csv", "ndjson", "zip")
+IMPORT_BATCH_ROWS = 1000
+MAX_REPORTED_ERRORS = 100
+
+EMPTY_EXPORT_MARKER = "No data found for the specified range."
+
+def _columns(spec: ImportSpec) -> tuple:
+    return tuple(spec.model.model_fields)
+
+def _read_csv(text_stream):
+    """Yield (line_number, dict) rows; empty cells become None."""
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if not header or header == [EMPTY_EXPORT_MARKER]:
+        return
+    for row in reader:
+        if not row:
+            continue
+        yield reader.line_num, {k: (v if v != "" else None) for k, v in zip(header, row)}
+
+def _read_ndjson(text_stream):
+    """Yield (line_number, dict) rows; undecodable lines yield the error instead."""
+    for line_number, line in enumerate(text_stream, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+
+def _parse(text_stream, format: str):
+    return _read_csv(text_stream) if format == "csv" else _read_ndjson(text_stream)
+
+class ImportReport:
+    """Running counters for one imported table."""
+
+    def __init__(self, type: str):
+        self.type = type
+        self.rows_read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "type": self.type,
+            "rows_read": self.rows_read,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows_read / seconds) if seconds > 0 else None,
+        }
+
+def _existing_keys(conn, spec: ImportSpec, timestamps: set) -> set:
+    fields = (spec.ts_field,) + spec.key_fields
+    placeholders = ", ".join("?" * len(timestamps))
+    rows = conn.execute(
+        f"SELECT {', '.join(fields)} FROM {spec.table} WHERE {spec.ts_field} IN ({placeholders})",
+        tuple(timestamps)
+    ).fetchall()
+    return {tuple(r) for r in rows}
+
+def _flush(conn, spec: ImportSpec, batch: list, report: ImportReport):
+    """Insert one validated batch, skipping rows that already exist."""
+    columns = _columns(spec)
+    ts_index = columns.index(spec.ts_field)
+    key_indexes = [columns.index(f) for f in spec.key_fields]
+
+    with transaction(conn):
+        seen = _existing_keys(conn, spec, {values[ts_index] for _, values in batch})
+        fresh = []
+        for line, values in batch:
+            key = (values[ts_index],) + tuple(values[i] for i in key_indexes)
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            fresh.append((line, values))
+
+        sql = f"INSERT INTO {spec.table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        try:
+            with transaction(conn):
+                conn.executemany(sql, [values for _, values in fresh])
+            report.inserted += len(fresh)
+        except sqlite3.IntegrityError:
+            # A CHECK constraint failed somewhere in the batch: find the culprits row by row
+            for line, values in fresh:
+                try:
+                    with transaction(conn):
+                        conn.execute(sql, values)
+                    report.inserted += 1
+                except sqlite3.IntegrityError as e:
+                    report.reject(line, str(e))
+
+def import_rows(conn, type: str, rows, batch_rows: int = IMPORT_BATCH_ROWS) -> dict:
+    """Validate and insert (line_number, dict) rows into the table for `type`."""
+    spec = IMPORT_SPECS[type]
+    columns = _columns(spec)
+    report = ImportReport(type)
+    batch = []
+    for line, raw in rows:
+        report.rows_read += 1
+        if isinstance(raw, Exception):
+            report.reject(line, f"invalid JSON: {raw}")
+            continue
+        try:
+            entry = spec.model.model_validate(raw)
+        except ValidationError as e:
+            report.reject(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        if getattr(entry, spec.ts_field) is None:
+            report.reject(line, f"{spec.ts_field}: required for import")
+            continue
+        batch.append((line, tuple(getattr(entry, c) for c in columns)))
+        if len(batch) >= batch_rows:
+            _flush(conn, spec, batch, report)
+            batch = []
+    if batch:
+        _flush(conn, spec, batch, report)
+    return report.as_dict()
+
+def type_from_filename(filename: str):
+    """Guess the export type from names like nutritrack_food.csv."""
+    stem = filename.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    for type in IMPORT_SPECS:
+        if stem == type or stem.endswith("_" + type):
+            return type
+    return None
+
+def import_file(fileobj, type: str = None, format: str = "csv") -> list:
+    """Import a binary file object in csv, ndjson or zip (export type=all) format.
+
+    Returns one report per imported table.
+    """
+    conn = get_db()
+    try:
+        if format == "zip":
+            reports = []
+            with zipfile.ZipFile(fileobj) as archive:
+                for name in archive.namelist():
+                    member_type = type_from_filename(name)
+                    member_format = name.rsplit(".", 1)[-1]
+                    if member_type is None or member_format not in ("csv", "ndjson"):
+                        continue
+                    with archive.open(name) as member:
+                        text = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                        reports.append(import_rows(conn, member_type, _parse(text, member_format)))
+            return reports
+
+        text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        return [import_rows(conn, type, _parse(text, format))]
+    finally:
+        conn.close()
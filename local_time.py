@@ -0,0 +1,222 @@
+"""
+NutriTrack Local Time
+Canonical instants and local calendar days for logged timestamps.
+
+Timestamps are stored as given (ISO 8601 text, usually local wall-clock time
+without an offset). Triggers add two derived columns to every timestamped
+table: epoch (UTC seconds) and local_day (YYYY-MM-DD in the user's time
+zone), both indexed so range scans and day bucketing never parse text.
+
+The time zone is NUTRITRACK_TZ (an IANA name such as "Europe/Berlin"),
+defaulting to the server's local zone. SQLite has no zone rules, so its UTC
+offsets are materialized into the tz_offsets table, one row per offset
+period; triggers look up the period instead of calling back into Python,
+which keeps writes from any SQLite client correct. When the configured zone
+or the tzdata release changes, sync_timezone() rewrites the table and
+re-derives every row.
+"""
+import json
+import os
+import zoneinfo
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from importlib import metadata
+from zoneinfo import ZoneInfo
+
+TIMEZONE = os.environ.get("NUTRITRACK_TZ", "")
+
+# Timestamped tables: (trigger name prefix, timestamp column)
+TIMESTAMP_COLUMNS = {
+    "food_entries": ("food", "logged_at"),
+    "weight_logs": ("weight", "measured_at"),
+    "sport_activities": ("activity", "performed_at"),
+    "health_measurements": ("health", "measured_at"),
+    "heart_rate_samples": ("heart_rate", "measured_at"),
+}
+
+OFFSETS_FROM_YEAR = 1970
+OFFSETS_TO_YEAR = 2100
+BEGINNING = -(2 ** 62)  # utc_from of the first offset period
+
+# ── Python Side ──────────────────────────────────────────────────────
+def zone():
+    """Configured tzinfo, or None for the server's local zone."""
+    return ZoneInfo(TIMEZONE) if TIMEZONE else None
+
+def local_now() -> datetime:
+    """Current wall-clock time in the user's zone (naive, like stored timestamps)."""
+    tz = zone()
+    return datetime.now(tz).replace(tzinfo=None) if tz else datetime.now()
+
+def local_today():
+    return local_now().date()
+
+def local_day(ts: str) -> str:
+    """Python twin of the local_day column for one timestamp (None if it doesn't parse)."""
+    try:
+        parsed = datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(zone())
+    return parsed.date().isoformat()
+
+def wall_epoch(wall_seconds: int) -> int:
+    """Python twin of the epoch column for a local wall time (naive seconds since 1970-01-01)."""
+    starts, offsets = _wall_periods(TIMEZONE)
+    return wall_seconds - offsets[bisect_right(starts, wall_seconds) - 1]
+
+def _offset_at(utc_seconds: int, tz) -> int:
+    instant = datetime.fromtimestamp(utc_seconds, timezone.utc)
+    return int((instant.astimezone(tz) if tz else instant.astimezone()).utcoffset().total_seconds())
+
+@lru_cache(maxsize=4)
+def _offset_periods(name: str) -> tuple:
+    tz = ZoneInfo(name) if name else None
+    start = int(datetime(OFFSETS_FROM_YEAR, 1, 2, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(OFFSETS_TO_YEAR, 1, 1, tzinfo=timezone.utc).timestamp())
+    step = int(timedelta(days=7).total_seconds())  # zones never change offset twice a week
+
+    periods = [(BEGINNING, _offset_at(start, tz))]
+    t = start
+    while t < end:
+        offset = _offset_at(t + step, tz)
+        if offset != periods[-1][1]:
+            # Bisect to the exact second of the transition
+            lo, hi = t, t + step
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _offset_at(mid, tz) == offset:
+                    hi = mid
+                else:
+                    lo = mid
+            periods.append((hi, offset))
+        t += step
+    return tuple(periods)
+
+@lru_cache(maxsize=4)
+def _wall_periods(name: str) -> tuple:
+    """(local_from, utc_offset) columns of tz_offsets, for bisecting wall times."""
+    periods = _offset_periods(name)
+    return [max(utc_from + offset, BEGINNING) for utc_from, offset in periods], [offset for _, offset in periods]
+
+def offset_periods() -> tuple:
+    """(utc_from, utc_offset) for each offset period of the configured zone."""
+    return _offset_periods(TIMEZONE)
+
+# ── SQL Side ─────────────────────────────────────────────────────────
+def _seconds(ts: str) -> str:
+    return f"CAST(strftime('%s', {ts}) AS INTEGER)"
+
+def _has_offset(ts: str) -> str:
+    return f"({ts} GLOB '*[Zz]' OR {ts} GLOB '*[+-][0-9][0-9]:[0-9][0-9]')"
+
+def epoch_sql(ts: str) -> str:
+    """SQL expression: UTC epoch seconds of a timestamp (local wall time unless it has an offset)."""
+    seconds = _seconds(ts)
+    return f"""(CASE WHEN {_has_offset(ts)} THEN {seconds}
+            ELSE {seconds} - (SELECT utc_offset FROM tz_offsets WHERE local_from <= {seconds}
+                              ORDER BY local_from DESC LIMIT 1) END)"""
+
+def local_day_sql(ts: str) -> str:
+    """SQL expression: the user's calendar day of a timestamp, NULL if it doesn't parse."""
+    seconds = _seconds(ts)
+    return f"""(CASE WHEN {_has_offset(ts)} THEN date({seconds} + (
+                SELECT utc_offset FROM tz_offsets WHERE utc_from <= {seconds}
+                ORDER BY utc_from DESC LIMIT 1), 'unixepoch')
+            ELSE date({ts}) END)"""
+
+def stamp_triggers(table: str, prefix: str, column: str) -> str:
+    """Triggers that fill epoch and local_day on insert and when the timestamp changes.
+
+    A timestamp SQLite can't read is refused, so neither column is ever NULL.
+    """
+    stamp = f"""
+        UPDATE {table} SET epoch = {epoch_sql(f'NEW.{column}')}, local_day = {local_day_sql(f'NEW.{column}')}
+        WHERE id = NEW.id;"""
+    check = f"""
+        SELECT RAISE(ABORT, 'invalid timestamp in {table}.{column}') WHERE {_seconds(f'NEW.{column}')} IS NULL;"""
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_stamp_check_insert BEFORE INSERT ON {table}
+    BEGIN{check}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_stamp_check_update BEFORE UPDATE OF {column} ON {table}
+    BEGIN{check}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_stamp_insert AFTER INSERT ON {table}
+    BEGIN{stamp}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_stamp_update AFTER UPDATE OF {column} ON {table}
+    BEGIN{stamp}
+    END;
+"""
+
+# ── Zone Changes ─────────────────────────────────────────────────────
+def write_offsets(conn):
+    conn.execute("DELETE FROM tz_offsets")
+    conn.executemany(
+        "INSERT INTO tz_offsets (utc_from, local_from, utc_offset) VALUES (?, ?, ?)",
+        [(utc_from, max(utc_from + offset, BEGINNING), offset) for utc_from, offset in offset_periods()]
+    )
+
+def rebuild_local_days(conn):
+    """Re-derive epoch and local_day for every row, then the daily rollup.
+
+    Rebuilding daily_totals flags every evaluated streak day as dirty, so
+    streaks and XP follow on the next read.
+    """
+    from database import rebuild_daily_totals
+    for table, (_, column) in TIMESTAMP_COLUMNS.items():
+        conn.execute(f"UPDATE {table} SET epoch = {epoch_sql(column)}, local_day = {local_day_sql(column)}")
+    rebuild_daily_totals(conn)
+
+def zone_source() -> dict:
+    """Zone name and tzdata version tz_offsets is derived from.
+
+    The version is None when it can't be found (no tzdata.zi next to the
+    system zone files and no tzdata package).
+    """
+    # Unset, the zone is the C library's: TZ, or whatever /etc/localtime points at
+    name = TIMEZONE or "local:" + (os.environ.get("TZ") or os.path.realpath("/etc/localtime"))
+    return {"zone": name, "tzdata": _tzdata_version()}
+
+@lru_cache(maxsize=1)
+def _tzdata_version():
+    # ZoneInfo reads TZPATH first and falls back to the tzdata package
+    for directory in zoneinfo.TZPATH:
+        try:
+            with open(os.path.join(directory, "tzdata.zi")) as f:
+                first = f.readline()
+        except OSError:
+            continue
+        if first.startswith("# version "):
+            return first.split()[2]
+    try:
+        return "tzdata " + metadata.version("tzdata")
+    except metadata.PackageNotFoundError:
+        return None
+
+def sync_timezone(conn) -> bool:
+    """Bring tz_offsets in line with the configured zone. Returns True if days were re-derived.
+
+    The zone and tzdata version are kept in the settings table; while both
+    are unchanged (and the version is known) the offsets are not recomputed.
+    """
+    source = zone_source()
+    key = json.dumps(source, sort_keys=True)
+    stored = conn.execute("SELECT value FROM settings WHERE key = 'timezone'").fetchone()
+    if source["tzdata"] is not None and stored is not None and stored[0] == key:
+        return False
+    rows = conn.execute("SELECT utc_from, utc_offset FROM tz_offsets ORDER BY utc_from").fetchall()
+    changed = [tuple(r) for r in rows] != list(offset_periods())
+    from database import transaction
+    with transaction(conn):
+        if changed:
+            write_offsets(conn)
+            rebuild_local_days(conn)
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('timezone', ?)", (key,))
+    return changed
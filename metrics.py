@@ -0,0 +1,235 @@
+"""
+NutriTrack Request Metrics
+Per-route request counters and histograms in the Prometheus text format,
+and the per-request timings behind the Server-Timing header.
+
+Requests are labelled by route template (/api/food/{entry_id}), never by
+raw path, so the number of series is bounded by the route table. Database
+time is added up by the connection wrappers in database.py through the
+current_timer context variable, which FastAPI carries into the worker
+threads that run sync handlers; JSON rendering time is added by
+TimedJSONResponse. Compute is what remains of the time to first byte.
+
+The same cursors trace each statement with its duration and row count;
+slow ones go to the SQL log (nutritrack.sql) with the route that ran them.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ── Request Timer ────────────────────────────────────────────────────
+class RequestTimer:
+    """Seconds spent in SQLite and in rendering the response, and the statements run, for one request."""
+    __slots__ = ("started", "db", "serialize", "queries", "untraced")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.serialize = 0.0
+        self.queries = []  # [sql, seconds, rows], updated as the cursor is read
+        self.untraced = 0
+
+    def record(self, sql: str, seconds: float, rows: int):
+        """Trace one statement; returns its record, or None past MAX_TRACED_QUERIES."""
+        if len(self.queries) >= MAX_TRACED_QUERIES:
+            self.untraced += 1
+            return None
+        query = [sql, seconds, rows]
+        self.queries.append(query)
+        return query
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        compute = max(total - self.db - self.serialize, 0.0)
+        count = len(self.queries) + self.untraced
+        return (f'db;dur={self.db * 1000:.2f};desc="{count} queries", compute;dur={compute * 1000:.2f}, '
+                f"serialize;dur={self.serialize * 1000:.2f}, total;dur={total * 1000:.2f}")
+
+current_timer = ContextVar("current_timer", default=None)
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that counts its rendering as serialize time."""
+
+    def render(self, content) -> bytes:
+        timer = current_timer.get()
+        if timer is None:
+            return super().render(content)
+        started = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            timer.serialize += time.perf_counter() - started
+
+# ── SQL Log ──────────────────────────────────────────────────────────
+# Statements at or over SLOW_QUERY_MS (0 disables) are logged as warnings
+# with their route; SQL_TRACE logs every statement of every request.
+SLOW_QUERY_MS = float(os.environ.get("NUTRITRACK_SLOW_QUERY_MS", "100"))
+SQL_TRACE = os.environ.get("NUTRITRACK_SQL_TRACE", "false").lower() == "true"
+SQL_LOG_FILE = os.environ.get("NUTRITRACK_SQL_LOG", "")  # default: stderr
+MAX_TRACED_QUERIES = 500  # per request; later statements are only counted
+
+sql_log = logging.getLogger("nutritrack.sql")
+if not sql_log.handlers:
+    _handler = logging.FileHandler(SQL_LOG_FILE) if SQL_LOG_FILE else logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    sql_log.addHandler(_handler)
+    sql_log.setLevel(logging.INFO if SQL_TRACE else logging.WARNING)
+    sql_log.propagate = False
+
+def log_queries(method: str, route: str, timer: RequestTimer) -> int:
+    """Write slow (or, when tracing, all) statements of a request to the SQL log. Returns the slow count."""
+    slow = 0
+    for sql, seconds, rows in timer.queries:
+        ms = seconds * 1000
+        is_slow = SLOW_QUERY_MS > 0 and ms >= SLOW_QUERY_MS
+        slow += is_slow
+        if is_slow or SQL_TRACE:
+            sql_log.log(logging.WARNING if is_slow else logging.INFO, "%s %.1f ms %d rows %s %s: %s",
+                        "slow query" if is_slow else "query", ms, rows, method, route, " ".join(sql.split())[:1000])
+    return slow
+
+# ── Registry ─────────────────────────────────────────────────────────
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list:
+        out, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {cumulative}")
+        return out
+
+HISTOGRAMS = (
+    ("nutritrack_http_request_duration_seconds", "Time from request to the last body byte", LATENCY_BUCKETS),
+    ("nutritrack_http_request_db_seconds", "Time spent in SQLite per request", LATENCY_BUCKETS),
+    ("nutritrack_http_response_size_bytes", "Response body size", SIZE_BUCKETS),
+)
+
+class Metrics:
+    """Thread-safe request counters and histograms keyed by (method, route)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._requests = {}    # (method, route, status) -> count
+        self._histograms = {}  # (method, route) -> (duration, db, size)
+        self._queries = {}     # (method, route) -> (statements, slow statements)
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float, db: float, size: int,
+                 queries: int = 0, slow: int = 0):
+        with self._lock:
+            self.in_flight -= 1
+            key = (method, route, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            counts = self._queries.get((method, route), (0, 0))
+            self._queries[(method, route)] = (counts[0] + queries, counts[1] + slow)
+            histograms = self._histograms.get((method, route))
+            if histograms is None:
+                histograms = self._histograms[(method, route)] = tuple(Histogram(b) for _, _, b in HISTOGRAMS)
+            for histogram, value in zip(histograms, (seconds, db, size)):
+                histogram.observe(value)
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                "# HELP nutritrack_http_requests_in_flight Requests currently being served",
+                "# TYPE nutritrack_http_requests_in_flight gauge",
+                f"nutritrack_http_requests_in_flight {self.in_flight}",
+                "# HELP nutritrack_http_requests_total Requests served, by route and status",
+                "# TYPE nutritrack_http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'nutritrack_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+            for i, (name, help) in enumerate((
+                    ("nutritrack_sql_queries_total", "SQL statements run, by route"),
+                    ("nutritrack_sql_slow_queries_total", f"SQL statements of {SLOW_QUERY_MS:g} ms or more, by route"))):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+                for (method, route), counts in sorted(self._queries.items()):
+                    lines.append(f'{name}{{method="{method}",route="{route}"}} {counts[i]}')
+            for i, (name, help, _) in enumerate(HISTOGRAMS):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+                for (method, route), histograms in sorted(self._histograms.items()):
+                    lines += histograms[i].lines(name, f'method="{method}",route="{route}"')
+        return "\n".join(lines) + "\n"
+
+# ── Middleware ───────────────────────────────────────────────────────
+class MetricsMiddleware:
+    """ASGI middleware: time every HTTP request, add Server-Timing, record metrics.
+
+    Pure ASGI rather than @app.middleware so streamed bodies are measured to
+    their last byte without being buffered.
+    """
+
+    def __init__(self, app, metrics: Metrics, router):
+        self.app = app
+        self.metrics = metrics
+        self.router = router
+        self._match = lru_cache(maxsize=1024)(self._match_route)
+
+    def _match_route(self, method: str, path: str) -> str:
+        # Requests answered before routing (cached responses, 404s) are matched here
+        scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+        for route in self.router.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    def route_label(self, scope) -> str:
+        route = scope.get("route")
+        return route.path if route is not None else self._match(scope["method"], scope["path"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timer = RequestTimer()
+        token = current_timer.set(timer)
+        status, size = 500, 0
+
+        async def send_timed(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timer.server_timing().encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.started()
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            current_timer.reset(token)
+            method, route = scope["method"], self.route_label(scope)
+            slow = log_queries(method, route, timer)
+            self.metrics.finished(method, route, status, time.perf_counter() - timer.started, timer.db, size,
+                                  len(timer.queries) + timer.untraced, slow)
@@ -0,0 +1,726 @@
+"""
+NutriTrack Schema Migrations
+Ordered, idempotent schema steps tracked with PRAGMA user_version.
+
+Each step runs in its own transaction together with the user_version bump,
+so an interrupted upgrade resumes from the last completed step. Steps must
+be safe to re-run against databases created before versioning existed
+(user_version 0 with tables already in place).
+"""
+import sqlite3
+from collections import namedtuple
+
+Migration = namedtuple("Migration", ["version", "name", "apply"])
+
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    """Register a migration step; versions must be added in order."""
+    def register(func):
+        expected = len(MIGRATIONS) + 1
+        if version != expected:
+            raise RuntimeError(f"Migration {name!r} has version {version}, expected {expected}")
+        MIGRATIONS.append(Migration(version, name, func))
+        return func
+    return register
+
+def run_script(conn, script: str):
+    """Execute a multi-statement script without executescript's implicit COMMIT."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        raise ValueError(f"Incomplete SQL statement in migration script: {statement.strip()[:60]}")
+
+def column_names(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+# ── Rollup Triggers ──────────────────────────────────────────────────
+# Keep daily_totals current inside the same transaction as each write.
+DAILY_TOTALS_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS trg_food_totals_insert AFTER INSERT ON food_entries
+    BEGIN
+        INSERT INTO daily_totals (day, calories, protein_g, carbs_g, fat_g, food_count)
+        VALUES (substr(NEW.logged_at, 1, 10), NEW.calories, NEW.protein_g, NEW.carbs_g, NEW.fat_g, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein_g = protein_g + excluded.protein_g,
+            carbs_g = carbs_g + excluded.carbs_g,
+            fat_g = fat_g + excluded.fat_g,
+            food_count = food_count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_food_totals_delete AFTER DELETE ON food_entries
+    BEGIN
+        UPDATE daily_totals SET
+            calories = CASE WHEN food_count > 1 THEN calories - OLD.calories ELSE 0 END,
+            protein_g = CASE WHEN food_count > 1 THEN protein_g - OLD.protein_g ELSE 0 END,
+            carbs_g = CASE WHEN food_count > 1 THEN carbs_g - OLD.carbs_g ELSE 0 END,
+            fat_g = CASE WHEN food_count > 1 THEN fat_g - OLD.fat_g ELSE 0 END,
+            food_count = food_count - 1
+        WHERE day = substr(OLD.logged_at, 1, 10);
+        DELETE FROM daily_totals
+        WHERE day = substr(OLD.logged_at, 1, 10) AND food_count <= 0 AND activity_count <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_food_totals_update
+    AFTER UPDATE OF calories, protein_g, carbs_g, fat_g, logged_at ON food_entries
+    BEGIN
+        UPDATE daily_totals SET
+            calories = CASE WHEN food_count > 1 THEN calories - OLD.calories ELSE 0 END,
+            protein_g = CASE WHEN food_count > 1 THEN protein_g - OLD.protein_g ELSE 0 END,
+            carbs_g = CASE WHEN food_count > 1 THEN carbs_g - OLD.carbs_g ELSE 0 END,
+            fat_g = CASE WHEN food_count > 1 THEN fat_g - OLD.fat_g ELSE 0 END,
+            food_count = food_count - 1
+        WHERE day = substr(OLD.logged_at, 1, 10);
+        INSERT INTO daily_totals (day, calories, protein_g, carbs_g, fat_g, food_count)
+        VALUES (substr(NEW.logged_at, 1, 10), NEW.calories, NEW.protein_g, NEW.carbs_g, NEW.fat_g, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein_g = protein_g + excluded.protein_g,
+            carbs_g = carbs_g + excluded.carbs_g,
+            fat_g = fat_g + excluded.fat_g,
+            food_count = food_count + 1;
+        DELETE FROM daily_totals
+        WHERE day = substr(OLD.logged_at, 1, 10) AND food_count <= 0 AND activity_count <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_activity_totals_insert AFTER INSERT ON sport_activities
+    BEGIN
+        INSERT INTO daily_totals (day, calories_burned, activity_minutes, activity_count)
+        VALUES (substr(NEW.performed_at, 1, 10), NEW.calories_burned, NEW.duration_minutes, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories_burned = calories_burned + excluded.calories_burned,
+            activity_minutes = activity_minutes + excluded.activity_minutes,
+            activity_count = activity_count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_activity_totals_delete AFTER DELETE ON sport_activities
+    BEGIN
+        UPDATE daily_totals SET
+            calories_burned = CASE WHEN activity_count > 1 THEN calories_burned - OLD.calories_burned ELSE 0 END,
+            activity_minutes = CASE WHEN activity_count > 1 THEN activity_minutes - OLD.duration_minutes ELSE 0 END,
+            activity_count = activity_count - 1
+        WHERE day = substr(OLD.performed_at, 1, 10);
+        DELETE FROM daily_totals
+        WHERE day = substr(OLD.performed_at, 1, 10) AND food_count <= 0 AND activity_count <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_activity_totals_update
+    AFTER UPDATE OF calories_burned, duration_minutes, performed_at ON sport_activities
+    BEGIN
+        UPDATE daily_totals SET
+            calories_burned = CASE WHEN activity_count > 1 THEN calories_burned - OLD.calories_burned ELSE 0 END,
+            activity_minutes = CASE WHEN activity_count > 1 THEN activity_minutes - OLD.duration_minutes ELSE 0 END,
+            activity_count = activity_count - 1
+        WHERE day = substr(OLD.performed_at, 1, 10);
+        INSERT INTO daily_totals (day, calories_burned, activity_minutes, activity_count)
+        VALUES (substr(NEW.performed_at, 1, 10), NEW.calories_burned, NEW.duration_minutes, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories_burned = calories_burned + excluded.calories_burned,
+            activity_minutes = activity_minutes + excluded.activity_minutes,
+            activity_count = activity_count + 1;
+        DELETE FROM daily_totals
+        WHERE day = substr(OLD.performed_at, 1, 10) AND food_count <= 0 AND activity_count <= 0;
+    END;
+"""
+
+# Migration 10 re-keys the rollup by the stored local_day column. A new row's
+# day is derived inline because its own stamp trigger may not have run yet.
+def _local_day_totals_triggers() -> str:
+    from local_time import local_day_sql
+    food_day, activity_day = local_day_sql("NEW.logged_at"), local_day_sql("NEW.performed_at")
+    return f"""
+    DROP TRIGGER IF EXISTS trg_food_totals_insert;
+    DROP TRIGGER IF EXISTS trg_food_totals_delete;
+    DROP TRIGGER IF EXISTS trg_food_totals_update;
+    DROP TRIGGER IF EXISTS trg_activity_totals_insert;
+    DROP TRIGGER IF EXISTS trg_activity_totals_delete;
+    DROP TRIGGER IF EXISTS trg_activity_totals_update;
+
+    CREATE TRIGGER trg_food_totals_insert AFTER INSERT ON food_entries
+    BEGIN
+        INSERT INTO daily_totals (day, calories, protein_g, carbs_g, fat_g, food_count)
+        VALUES ({food_day}, NEW.calories, NEW.protein_g, NEW.carbs_g, NEW.fat_g, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein_g = protein_g + excluded.protein_g,
+            carbs_g = carbs_g + excluded.carbs_g,
+            fat_g = fat_g + excluded.fat_g,
+            food_count = food_count + 1;
+    END;
+
+    CREATE TRIGGER trg_food_totals_delete AFTER DELETE ON food_entries
+    BEGIN
+        UPDATE daily_totals SET
+            calories = CASE WHEN food_count > 1 THEN calories - OLD.calories ELSE 0 END,
+            protein_g = CASE WHEN food_count > 1 THEN protein_g - OLD.protein_g ELSE 0 END,
+            carbs_g = CASE WHEN food_count > 1 THEN carbs_g - OLD.carbs_g ELSE 0 END,
+            fat_g = CASE WHEN food_count > 1 THEN fat_g - OLD.fat_g ELSE 0 END,
+            food_count = food_count - 1
+        WHERE day = OLD.local_day;
+        DELETE FROM daily_totals
+        WHERE day = OLD.local_day AND food_count <= 0 AND activity_count <= 0;
+    END;
+
+    CREATE TRIGGER trg_food_totals_update
+    AFTER UPDATE OF calories, protein_g, carbs_g, fat_g, logged_at ON food_entries
+    BEGIN
+        UPDATE daily_totals SET
+            calories = CASE WHEN food_count > 1 THEN calories - OLD.calories ELSE 0 END,
+            protein_g = CASE WHEN food_count > 1 THEN protein_g - OLD.protein_g ELSE 0 END,
+            carbs_g = CASE WHEN food_count > 1 THEN carbs_g - OLD.carbs_g ELSE 0 END,
+            fat_g = CASE WHEN food_count > 1 THEN fat_g - OLD.fat_g ELSE 0 END,
+            food_count = food_count - 1
+        WHERE day = OLD.local_day;
+        INSERT INTO daily_totals (day, calories, protein_g, carbs_g, fat_g, food_count)
+        VALUES ({food_day}, NEW.calories, NEW.protein_g, NEW.carbs_g, NEW.fat_g, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein_g = protein_g + excluded.protein_g,
+            carbs_g = carbs_g + excluded.carbs_g,
+            fat_g = fat_g + excluded.fat_g,
+            food_count = food_count + 1;
+        DELETE FROM daily_totals
+        WHERE day = OLD.local_day AND food_count <= 0 AND activity_count <= 0;
+    END;
+
+    CREATE TRIGGER trg_activity_totals_insert AFTER INSERT ON sport_activities
+    BEGIN
+        INSERT INTO daily_totals (day, calories_burned, activity_minutes, activity_count)
+        VALUES ({activity_day}, NEW.calories_burned, NEW.duration_minutes, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories_burned = calories_burned + excluded.calories_burned,
+            activity_minutes = activity_minutes + excluded.activity_minutes,
+            activity_count = activity_count + 1;
+    END;
+
+    CREATE TRIGGER trg_activity_totals_delete AFTER DELETE ON sport_activities
+    BEGIN
+        UPDATE daily_totals SET
+            calories_burned = CASE WHEN activity_count > 1 THEN calories_burned - OLD.calories_burned ELSE 0 END,
+            activity_minutes = CASE WHEN activity_count > 1 THEN activity_minutes - OLD.duration_minutes ELSE 0 END,
+            activity_count = activity_count - 1
+        WHERE day = OLD.local_day;
+        DELETE FROM daily_totals
+        WHERE day = OLD.local_day AND food_count <= 0 AND activity_count <= 0;
+    END;
+
+    CREATE TRIGGER trg_activity_totals_update
+    AFTER UPDATE OF calories_burned, duration_minutes, performed_at ON sport_activities
+    BEGIN
+        UPDATE daily_totals SET
+            calories_burned = CASE WHEN activity_count > 1 THEN calories_burned - OLD.calories_burned ELSE 0 END,
+            activity_minutes = CASE WHEN activity_count > 1 THEN activity_minutes - OLD.duration_minutes ELSE 0 END,
+            activity_count = activity_count - 1
+        WHERE day = OLD.local_day;
+        INSERT INTO daily_totals (day, calories_burned, activity_minutes, activity_count)
+        VALUES ({activity_day}, NEW.calories_burned, NEW.duration_minutes, 1)
+        ON CONFLICT(day) DO UPDATE SET
+            calories_burned = calories_burned + excluded.calories_burned,
+            activity_minutes = activity_minutes + excluded.activity_minutes,
+            activity_count = activity_count + 1;
+        DELETE FROM daily_totals
+        WHERE day = OLD.local_day AND food_count <= 0 AND activity_count <= 0;
+    END;
+"""
+
+# Flag the streak state for re-evaluation when an already evaluated day changes.
+STREAK_DIRTY_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS trg_streak_dirty_insert AFTER INSERT ON daily_totals
+    BEGIN
+        UPDATE streak_state SET dirty_from = min(coalesce(dirty_from, NEW.day), NEW.day)
+        WHERE id = 1 AND NEW.day <= last_evaluated_day;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_streak_dirty_update AFTER UPDATE ON daily_totals
+    BEGIN
+        UPDATE streak_state SET dirty_from = min(coalesce(dirty_from, NEW.day), NEW.day)
+        WHERE id = 1 AND NEW.day <= last_evaluated_day;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_streak_dirty_delete AFTER DELETE ON daily_totals
+    BEGIN
+        UPDATE streak_state SET dirty_from = min(coalesce(dirty_from, OLD.day), OLD.day)
+        WHERE id = 1 AND OLD.day <= last_evaluated_day;
+    END;
+"""
+
+# Bump a table's write generation so caches and other workers notice changes.
+def generation_triggers(table: str, prefix: str) -> str:
+    return "".join(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_generation_{event.lower()} AFTER {event} ON {table}
+    BEGIN
+        UPDATE write_generations SET generation = generation + 1 WHERE name = '{table}';
+    END;
+""" for event in ("INSERT", "UPDATE", "DELETE"))
+
+PROFILE_GENERATION_TRIGGERS = generation_triggers("user_profile", "profile")
+
+# User-data tables tracked by the HTTP response cache (trigger name prefix)
+GENERATION_TABLES = {
+    "food_entries": "food",
+    "weight_logs": "weight",
+    "sport_activities": "activity",
+    "health_measurements": "health",
+    "often_used_foods": "often_used",
+    "daily_coaching": "daily_coaching",
+    "coaching_reports": "coaching_reports",
+}
+
+# Keep food_catalog (one row per normalized food name, latest values) in step
+# with food_entries. An update is handled as removing OLD and adding NEW.
+CATALOG_COLUMNS = ("calories", "protein_g", "carbs_g", "fat_g", "meal_type", "quantity", "notes")
+
+def _catalog_add(row: str) -> str:
+    newer = "excluded.last_logged >= last_logged"
+    updates = ",\n            ".join(
+        f"{c} = CASE WHEN {newer} THEN excluded.{c} ELSE {c} END" for c in ("name",) + CATALOG_COLUMNS
+    )
+    return f"""
+        INSERT INTO food_catalog (key, name, {', '.join(CATALOG_COLUMNS)}, times_logged, last_logged)
+        VALUES (lower(trim({row}.name)), trim({row}.name), {', '.join(f'{row}.{c}' for c in CATALOG_COLUMNS)},
+                1, {row}.logged_at)
+        ON CONFLICT(key) DO UPDATE SET
+            {updates},
+            times_logged = times_logged + 1,
+            last_logged = max(last_logged, excluded.last_logged);"""
+
+def _catalog_remove(row: str) -> str:
+    columns = ("name",) + CATALOG_COLUMNS + ("last_logged",)
+    return f"""
+        UPDATE food_catalog SET times_logged = times_logged - 1 WHERE key = lower(trim({row}.name));
+        DELETE FROM food_catalog WHERE key = lower(trim({row}.name)) AND times_logged <= 0;
+        UPDATE food_catalog SET ({', '.join(columns)}) = (
+            SELECT trim(name), {', '.join(CATALOG_COLUMNS)}, logged_at FROM food_entries
+            WHERE lower(trim(name)) = food_catalog.key ORDER BY logged_at DESC LIMIT 1
+        )
+        WHERE key = lower(trim({row}.name)) AND last_logged = {row}.logged_at;"""
+
+FOOD_CATALOG_TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS trg_food_catalog_insert AFTER INSERT ON food_entries
+    BEGIN{_catalog_add("NEW")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_food_catalog_delete AFTER DELETE ON food_entries
+    BEGIN{_catalog_remove("OLD")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_food_catalog_update
+    AFTER UPDATE OF name, {', '.join(CATALOG_COLUMNS)}, logged_at ON food_entries
+    BEGIN{_catalog_remove("OLD")}{_catalog_add("NEW")}
+    END;
+"""
+
+# External-content FTS5 index over the catalog
+FOOD_SEARCH_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS trg_food_search_insert AFTER INSERT ON food_catalog
+    BEGIN
+        INSERT INTO food_search (rowid, name, quantity, notes) VALUES (NEW.id, NEW.name, NEW.quantity, NEW.notes);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_food_search_delete AFTER DELETE ON food_catalog
+    BEGIN
+        INSERT INTO food_search (food_search, rowid, name, quantity, notes)
+        VALUES ('delete', OLD.id, OLD.name, OLD.quantity, OLD.notes);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_food_search_update AFTER UPDATE OF name, quantity, notes ON food_catalog
+    WHEN OLD.name IS NOT NEW.name OR OLD.quantity IS NOT NEW.quantity OR OLD.notes IS NOT NEW.notes
+    BEGIN
+        INSERT INTO food_search (food_search, rowid, name, quantity, notes)
+        VALUES ('delete', OLD.id, OLD.name, OLD.quantity, OLD.notes);
+        INSERT INTO food_search (rowid, name, quantity, notes) VALUES (NEW.id, NEW.name, NEW.quantity, NEW.notes);
+    END;
+"""
+
+# Drop stored period reports whose range covers a changed entry. Inserts are
+# caught by the AFTER UPDATE that stamps local_day onto the new row.
+def _drop_snapshots(day: str) -> str:
+    return f"""
+        DELETE FROM report_snapshots WHERE end_day >= {day} AND start_day <= {day};"""
+
+def report_snapshot_triggers(table: str, prefix: str) -> str:
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_report_update AFTER UPDATE ON {table}
+    BEGIN{_drop_snapshots("OLD.local_day")}{_drop_snapshots("NEW.local_day")}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{prefix}_report_delete AFTER DELETE ON {table}
+    BEGIN{_drop_snapshots("OLD.local_day")}
+    END;
+"""
+
+# ── Migration Steps ──────────────────────────────────────────────────
+@migration(1, "base schema")
+def _base_schema(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS user_profile (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        age INTEGER NOT NULL,
+        sex TEXT NOT NULL CHECK(sex IN ('male', 'female')),
+        height_cm REAL NOT NULL,
+        current_weight_kg REAL NOT NULL,
+        activity_level TEXT NOT NULL DEFAULT 'moderate' CHECK(activity_level IN ('sedentary', 'light', 'moderate', 'active', 'very_active')),
+        weight_goal_kg REAL,
+        calorie_deficit INTEGER NOT NULL DEFAULT 500,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS food_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        calories REAL NOT NULL DEFAULT 0,
+        protein_g REAL NOT NULL DEFAULT 0,
+        carbs_g REAL NOT NULL DEFAULT 0,
+        fat_g REAL NOT NULL DEFAULT 0,
+        meal_type TEXT DEFAULT 'snack' CHECK(meal_type IN ('breakfast', 'lunch', 'dinner', 'snack')),
+        quantity TEXT,
+        notes TEXT,
+        logged_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS weight_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        weight_kg REAL NOT NULL,
+        notes TEXT,
+        measured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS sport_activities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        activity_type TEXT NOT NULL,
+        duration_minutes INTEGER NOT NULL DEFAULT 0,
+        calories_burned REAL NOT NULL DEFAULT 0,
+        intensity TEXT DEFAULT 'moderate' CHECK(intensity IN ('low', 'moderate', 'high')),
+        notes TEXT,
+        performed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS health_measurements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        systolic_bp INTEGER,
+        diastolic_bp INTEGER,
+        blood_sugar REAL,
+        blood_oxygen REAL,
+        heart_rate INTEGER,
+        notes TEXT,
+        measured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE TABLE IF NOT EXISTS often_used_foods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        calories REAL NOT NULL DEFAULT 0,
+        protein_g REAL NOT NULL DEFAULT 0,
+        carbs_g REAL NOT NULL DEFAULT 0,
+        fat_g REAL NOT NULL DEFAULT 0,
+        meal_type TEXT DEFAULT 'snack',
+        sort_order INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS daily_coaching (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        coaching_date TEXT NOT NULL UNIQUE,
+        coaching_text TEXT NOT NULL,
+        meal_count INTEGER DEFAULT 0,
+        calories_so_far REAL DEFAULT 0,
+        calories_remaining REAL DEFAULT 0,
+        protein_status TEXT DEFAULT 'unknown',
+        top_priority TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS coaching_reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        week_start TEXT NOT NULL,
+        week_end TEXT NOT NULL,
+        report_text TEXT NOT NULL,
+        summary_json TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_often_used_updated ON often_used_foods(updated_at);
+    CREATE INDEX IF NOT EXISTS idx_food_logged_at ON food_entries(logged_at);
+    CREATE INDEX IF NOT EXISTS idx_weight_measured_at ON weight_logs(measured_at);
+    CREATE INDEX IF NOT EXISTS idx_activity_performed_at ON sport_activities(performed_at);
+    CREATE INDEX IF NOT EXISTS idx_health_measured_at ON health_measurements(measured_at);
+    CREATE INDEX IF NOT EXISTS idx_daily_coaching_date ON daily_coaching(coaching_date);
+    CREATE INDEX IF NOT EXISTS idx_coaching_created ON coaching_reports(created_at);
+    CREATE INDEX IF NOT EXISTS idx_coaching_week ON coaching_reports(week_start, week_end);
+    """)
+
+@migration(2, "profile goal mode and surplus")
+def _profile_goal_mode(conn):
+    columns = column_names(conn, "user_profile")
+    if "goal_mode" not in columns:
+        conn.execute("ALTER TABLE user_profile ADD COLUMN goal_mode TEXT NOT NULL DEFAULT 'deficit' CHECK(goal_mode IN ('deficit', 'maintain', 'surplus'))")
+    if "calorie_surplus" not in columns:
+        conn.execute("ALTER TABLE user_profile ADD COLUMN calorie_surplus INTEGER NOT NULL DEFAULT 300")
+
+@migration(3, "daily totals rollup")
+def _daily_totals(conn):
+    from database import rebuild_daily_totals
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        day TEXT PRIMARY KEY,
+        calories REAL NOT NULL DEFAULT 0,
+        protein_g REAL NOT NULL DEFAULT 0,
+        carbs_g REAL NOT NULL DEFAULT 0,
+        fat_g REAL NOT NULL DEFAULT 0,
+        food_count INTEGER NOT NULL DEFAULT 0,
+        calories_burned REAL NOT NULL DEFAULT 0,
+        activity_minutes INTEGER NOT NULL DEFAULT 0,
+        activity_count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """)
+    run_script(conn, DAILY_TOTALS_TRIGGERS)
+    rebuild_daily_totals(conn, "substr(logged_at, 1, 10)", "substr(performed_at, 1, 10)")
+
+@migration(4, "idempotency keys for batch writes")
+def _idempotency_keys(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        endpoint TEXT NOT NULL,
+        response_json TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys(created_at);
+    """)
+
+@migration(5, "incremental streak state")
+def _streak_state(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS streak_state (
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        current_run INTEGER NOT NULL DEFAULT 0,
+        best_run INTEGER NOT NULL DEFAULT 0,
+        last_evaluated_day TEXT,
+        dirty_from TEXT,
+        profile_key TEXT
+    );
+    INSERT OR IGNORE INTO streak_state (id) VALUES (1);
+
+    CREATE TABLE IF NOT EXISTS streak_days (
+        day TEXT PRIMARY KEY,
+        success INTEGER NOT NULL,
+        run INTEGER NOT NULL,
+        best INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """)
+    run_script(conn, STREAK_DIRTY_TRIGGERS)
+
+@migration(6, "xp ledger and badges")
+def _xp_ledger(conn):
+    existing = column_names(conn, "streak_days")
+    for column in ("points", "protein_run", "elite_run", "activity_total"):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE streak_days ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS xp_ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        day TEXT NOT NULL,
+        kind TEXT NOT NULL CHECK(kind IN ('day', 'correction', 'badge')),
+        ref TEXT,
+        xp INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_xp_ledger_day ON xp_ledger(day);
+
+    CREATE TABLE IF NOT EXISTS badges (
+        badge_id TEXT PRIMARY KEY,
+        earned_on TEXT NOT NULL,
+        earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS xp_summary (
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        total_xp INTEGER NOT NULL DEFAULT 0,
+        badge_count INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO xp_summary (id) VALUES (1);
+
+    -- Per-day scores written before this version lack the new columns
+    UPDATE streak_state SET last_evaluated_day = NULL, dirty_from = NULL WHERE id = 1;
+    """)
+
+@migration(7, "write generation counters")
+def _write_generations(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS write_generations (
+        name TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO write_generations (name) VALUES ('user_profile');
+    """)
+    run_script(conn, PROFILE_GENERATION_TRIGGERS)
+
+@migration(8, "write generations for all user data")
+def _data_generations(conn):
+    for table, prefix in GENERATION_TABLES.items():
+        conn.execute("INSERT OR IGNORE INTO write_generations (name) VALUES (?)", (table,))
+        run_script(conn, generation_triggers(table, prefix))
+
+@migration(9, "food catalog and full-text search")
+def _food_search(conn):
+    from food_search import rebuild_food_catalog
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS food_catalog (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        calories REAL NOT NULL DEFAULT 0,
+        protein_g REAL NOT NULL DEFAULT 0,
+        carbs_g REAL NOT NULL DEFAULT 0,
+        fat_g REAL NOT NULL DEFAULT 0,
+        meal_type TEXT,
+        quantity TEXT,
+        notes TEXT,
+        times_logged INTEGER NOT NULL DEFAULT 0,
+        last_logged TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_food_name_key ON food_entries(lower(trim(name)), logged_at);
+    """)
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS food_search USING fts5(
+                name, quantity, notes,
+                content='food_catalog', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        run_script(conn, FOOD_SEARCH_TRIGGERS)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        # SQLite built without FTS5: search falls back to LIKE over the catalog
+    run_script(conn, FOOD_CATALOG_TRIGGERS)
+    rebuild_food_catalog(conn)
+
+# Tables of entries logged by hand (and read by period reports)
+LOGGED_TABLES = ("food_entries", "weight_logs", "sport_activities", "health_measurements")
+
+@migration(10, "epoch and local day columns")
+def _local_days(conn):
+    import local_time
+    # Absorbs the old fix_timestamps.py: "YYYY-MM-DD HH:MM:SS" becomes ISO 8601
+    for table in LOGGED_TABLES:
+        column = local_time.TIMESTAMP_COLUMNS[table][1]
+        conn.execute(
+            f"UPDATE {table} SET {column} = replace({column}, ' ', 'T') WHERE {column} GLOB '????-??-?? *'"
+        )
+        # The stamp triggers refuse unreadable timestamps from now on; one already
+        # stored becomes the time the row was written, the original kept in notes
+        written = "created_at" if "created_at" in column_names(conn, table) else "NULL"
+        conn.execute(f"""
+            UPDATE {table} SET
+                notes = trim(coalesce(notes, '') || ' [timestamp was ' || quote({column}) || ']'),
+                {column} = coalesce(strftime('%Y-%m-%dT%H:%M:%SZ', {written}), strftime('%Y-%m-%dT%H:%M:%SZ', 'now'))
+            WHERE strftime('%s', {column}) IS NULL
+        """)
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS tz_offsets (
+        utc_from INTEGER PRIMARY KEY,
+        local_from INTEGER NOT NULL,
+        utc_offset INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_tz_offsets_local ON tz_offsets(local_from, utc_offset);
+
+    -- Small named values the app keeps for itself: the zone tz_offsets was built for
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID;
+
+    -- Wearable samples (one a minute or so) would swamp health_measurements;
+    -- kept apart, health lists, reports and the dashboard never read them
+    CREATE TABLE IF NOT EXISTS heart_rate_samples (
+        id INTEGER PRIMARY KEY,
+        heart_rate INTEGER NOT NULL,
+        measured_at TIMESTAMP NOT NULL,
+        epoch INTEGER,
+        local_day TEXT
+    );
+    """)
+    local_time.write_offsets(conn)
+    for table, (prefix, column) in local_time.TIMESTAMP_COLUMNS.items():
+        existing = column_names(conn, table)
+        if "epoch" not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN epoch INTEGER")
+        if "local_day" not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN local_day TEXT")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{prefix}_local_day ON {table}(local_day, epoch)")
+        run_script(conn, local_time.stamp_triggers(table, prefix, column))
+    run_script(conn, _local_day_totals_triggers())
+    local_time.rebuild_local_days(conn)
+
+@migration(11, "period report snapshots")
+def _report_snapshots(conn):
+    import local_time
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS report_snapshots (
+        start_day TEXT NOT NULL,
+        end_day TEXT NOT NULL,
+        report_json TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (start_day, end_day)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_report_snapshots_end ON report_snapshots(end_day, start_day);
+    """)
+    # Snapshots are derived and their shape follows reports.py; whatever an
+    # earlier build left behind is rebuilt on the next read
+    conn.execute("DELETE FROM report_snapshots")
+    for table in LOGGED_TABLES:
+        run_script(conn, report_snapshot_triggers(table, local_time.TIMESTAMP_COLUMNS[table][0]))
+
+LATEST_VERSION = len(MIGRATIONS)
+
+# ── Runner ───────────────────────────────────────────────────────────
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending(conn) -> list:
+    """Migrations not yet applied to this database."""
+    version = current_version(conn)
+    if version > LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this NutriTrack "
+            f"build (latest {LATEST_VERSION}). Upgrade the application."
+        )
+    return MIGRATIONS[version:]
+
+def migrate(conn, target: int = None) -> list:
+    """Apply pending migrations up to target (default: latest). Returns applied steps."""
+    target = LATEST_VERSION if target is None else target
+    if current_version(conn) >= target:
+        return []  # fast path: schema already current
+
+    applied = []
+    for step in pending(conn):
+        if step.version > target:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied this step while we waited for the lock
+            if current_version(conn) >= step.version:
+                conn.rollback()
+                continue
+            step.apply(conn)
+            conn.execute(f"PRAGMA user_version = {step.version:d}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(step)
+    return applied
+
+def status(conn) -> list:
+    """(version, name, applied) for every known migration."""
+    version = current_version(conn)
+    return [(m.version, m.name, m.version <= version) for m in MIGRATIONS]
@@ -0,0 +1,121 @@
+"""
+NutriTrack Request Models
+Pydantic models shared by the API server and the bulk importer.
+"""
+from datetime import datetime
+from pydantic import AfterValidator, BaseModel, Field
+from typing import Annotated, Optional
+
+def canonical_timestamp(value: Optional[str]) -> Optional[str]:
+    """ISO 8601 timestamp in the form it is stored; naive means the user's wall-clock time."""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"not an ISO 8601 date or timestamp: {value!r}")
+
+Timestamp = Annotated[Optional[str], AfterValidator(canonical_timestamp)]
+
+# ── Pydantic Models ─────────────────────────────────────────────────
+class ProfileCreate(BaseModel):
+    age: int = Field(..., ge=10, le=120)
+    sex: str = Field(..., pattern="^(male|female)$")
+    height_cm: float = Field(..., ge=50, le=300)
+    current_weight_kg: float = Field(..., ge=20, le=500)
+    activity_level: str = Field(default="moderate")
+    weight_goal_kg: Optional[float] = None
+    calorie_deficit: int = Field(default=500, ge=0, le=2000)
+    calorie_surplus: int = Field(default=300, ge=0, le=1000)
+    goal_mode: str = Field(default="deficit")
+
+class GoalModeUpdate(BaseModel):
+    goal_mode: str = Field(..., pattern="^(deficit|maintain|surplus)$")
+    calorie_adjustment: Optional[int] = None
+
+class FoodEntry(BaseModel):
+    name: str
+    calories: float = 0
+    protein_g: float = 0
+    carbs_g: float = 0
+    fat_g: float = 0
+    meal_type: str = "snack"
+    quantity: Optional[str] = None
+    notes: Optional[str] = None
+    logged_at: Timestamp = None # ISO format, defaults to now
+
+class WeightEntry(BaseModel):
+    weight_kg: float = Field(..., ge=20, le=500)
+    notes: Optional[str] = None
+    measured_at: Timestamp = None
+
+class ActivityEntry(BaseModel):
+    activity_type: str
+    duration_minutes: int = 0
+    calories_burned: float = 0
+    intensity: str = "moderate"
+    notes: Optional[str] = None
+    performed_at: Timestamp = None
+
+class HealthEntry(BaseModel):
+    systolic_bp: Optional[int] = None
+    diastolic_bp: Optional[int] = None
+    blood_sugar: Optional[float] = None
+    blood_oxygen: Optional[float] = None
+    heart_rate: Optional[int] = None
+    notes: Optional[str] = None
+    measured_at: Timestamp = None
+
+class OftenUsedItem(BaseModel):
+    name: str
+    calories: float = 0
+    protein_g: float = 0
+    carbs_g: float = 0
+    fat_g: float = 0
+    meal_type: str = "snack"
+
+class OftenUsedUpdate(BaseModel):
+    items: list[OftenUsedItem]
+
+class AddFromEntry(BaseModel):
+    food_entry_id: int
+
+class DailyCoaching(BaseModel):
+    coaching_date: str  # YYYY-MM-DD
+    coaching_text: str  # Full coaching tip (can be multi-line)
+    meal_count: Optional[int] = 0
+    calories_so_far: Optional[float] = 0
+    calories_remaining: Optional[float] = 0
+    protein_status: Optional[str] = "unknown"  # on_track, low, critical, exceeded
+    top_priority: Optional[str] = None  # One-line priority
+
+class CoachingReport(BaseModel):
+    week_start: str
+    week_end: str
+    report_text: str
+    summary_json: Optional[str] = None
+
+BATCH_MAX_ITEMS = 1000
+
+class FoodBatch(BaseModel):
+    entries: list[FoodEntry] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class WeightBatch(BaseModel):
+    entries: list[WeightEntry] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class ActivityBatch(BaseModel):
+    entries: list[ActivityEntry] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class HealthBatch(BaseModel):
+    entries: list[HealthEntry] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+BATCH_MAX_OPERATIONS = 100
+
+class BatchOperation(BaseModel):
+    op: str  # handler name, e.g. "log_food" or "get_daily_summary"
+    params: dict = Field(default_factory=dict)  # query/path parameters of that endpoint
+    body: Optional[dict] = None  # JSON body of that endpoint, if it takes one
+
+class OperationBatch(BaseModel):
+    operations: list[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    atomic: bool = True  # False: a failed operation is rolled back alone and the rest still commit
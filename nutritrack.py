@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+NutriTrack Management CLI
+Maintenance commands that operate directly on the SQLite database.
+Usage: python3 nutritrack.py <command> [options]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Ensure we can import database module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import database
+import migrations
+
+
+def cmd_migrate(args):
+    """Show or apply pending schema migrations."""
+    conn = database.get_db()
+    try:
+        if args.action == "status":
+            version = migrations.current_version(conn)
+            print(f"Database: {database.DB_PATH}")
+            print(f"Schema version: {version} (latest {migrations.LATEST_VERSION})")
+            for number, name, applied in migrations.status(conn):
+                print(f"  [{'x' if applied else ' '}] {number:3d}  {name}")
+            return
+        pending = migrations.pending(conn)
+        if not pending:
+            print("Schema is up to date.")
+            return
+        for step in pending:
+            started = time.perf_counter()
+            migrations.migrate(conn, target=step.version)
+            print(f"  Applied {step.version:3d}  {step.name} ({time.perf_counter() - started:.2f}s)")
+    finally:
+        conn.close()
+
+
+def cmd_rebuild_totals(args):
+    """Recompute the daily_totals rollup from food and activity entries."""
+    database.init_db()
+    conn = database.get_db()
+    started = time.perf_counter()
+    try:
+        days = database.rebuild_daily_totals(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Rebuilt daily totals for {days} days in {time.perf_counter() - started:.2f}s")
+
+
+def cmd_rebuild_gamification(args):
+    """Recompute streaks, the XP ledger and badges from the daily totals."""
+    import gamification
+
+    database.init_db()
+    conn = database.get_db()
+    started = time.perf_counter()
+    try:
+        profile = conn.execute("SELECT * FROM user_profile ORDER BY id DESC LIMIT 1").fetchone()
+        if profile is None:
+            sys.exit("No profile set; nothing to rebuild.")
+        summary = gamification.rebuild_gamification(conn, dict(profile))
+    finally:
+        conn.close()
+    print(f"Rebuilt gamification in {time.perf_counter() - started:.2f}s: "
+          f"{summary['total_xp']} XP, level {summary['level']}, {len(summary['badges'])} badges")
+
+
+def cmd_import(args):
+    """Import CSV/NDJSON/zip files produced by /api/export/csv."""
+    import importer
+
+    database.init_db()
+    for path in args.files:
+        format = args.format or path.rsplit(".", 1)[-1].lower()
+        type = args.type or importer.type_from_filename(path)
+        if format not in importer.IMPORT_FORMATS:
+            sys.exit(f"{path}: unknown format {format!r} (use --format csv|ndjson|zip)")
+        if format != "zip" and type is None:
+            sys.exit(f"{path}: cannot tell the data type from the file name (use --type)")
+        with open(path, "rb") as f:
+            reports = importer.import_file(f, type, format)
+        for r in reports:
+            print(f"{path} [{r['type']}]: {r['inserted']} inserted, {r['duplicates']} duplicates, "
+                  f"{r['rejected']} rejected of {r['rows_read']} rows "
+                  f"in {r['seconds']:.2f}s ({r['rows_per_second'] or 0} rows/s)")
+            for err in r["errors"][:args.show_errors]:
+                print(f"    line {err['line']}: {err['error']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="nutritrack", description="NutriTrack maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="Show or apply schema migrations")
+    p.add_argument("action", nargs="?", choices=["status", "apply"], default="apply")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("import", help="Import files produced by /api/export/csv")
+    p.add_argument("files", nargs="+", help="nutritrack_<type>.csv / .ndjson, or an export zip")
+    p.add_argument("--type", choices=["food", "weight", "activity", "health"], help="Data type (default: from file name)")
+    p.add_argument("--format", choices=["csv", "ndjson", "zip"], help="File format (default: from extension)")
+    p.add_argument("--show-errors", type=int, default=10, metavar="N", help="Rejected rows to print per file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("rebuild-totals", help="Recompute the per-day nutrition/activity rollup")
+    p.set_defaults(func=cmd_rebuild_totals)
+
+    p = sub.add_parser("rebuild-gamification", help="Recompute streaks, XP ledger and badges (after rule changes)")
+    p.set_defaults(func=cmd_rebuild_gamification)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
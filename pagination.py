@@ -0,0 +1,80 @@
+"""
+NutriTrack Keyset Pagination
+Bounded pages over the timestamped tables with opaque continuation cursors.
+
+Rows are ordered by (local_day, epoch, id), which the (local_day, epoch)
+index already provides since SQLite appends the rowid to every index entry.
+The stamp triggers guarantee local_day and epoch are never NULL, so every
+row has a key the row-value comparison can order and a cursor can carry.
+A cursor encodes the key of the last row on a page, so the next page is an
+index seek rather than an OFFSET scan, and pages stay stable while new rows
+are logged elsewhere in the history.
+"""
+import base64
+import json
+import os
+
+from migrations import column_names
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = int(os.environ.get("NUTRITRACK_MAX_PAGE_SIZE", "2000"))
+
+KEY_COLUMNS = ("local_day", "epoch", "id")
+
+class CursorError(ValueError):
+    """Malformed cursor or field list (reported to clients as 400)."""
+
+def encode_cursor(row) -> str:
+    key = json.dumps([row[c] for c in KEY_COLUMNS], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        raise CursorError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != len(KEY_COLUMNS):
+        raise CursorError("Invalid cursor")
+    day, epoch, row_id = key
+    # type(), not isinstance(): a JSON true must not pass for the integer 1
+    if not isinstance(day, str) or not all(type(v) is int for v in (epoch, row_id)):
+        raise CursorError("Invalid cursor")
+    return key
+
+def parse_fields(conn, table: str, fields: str = None) -> list:
+    """Requested columns (id always included), or None for all of them."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - column_names(conn, table))
+    if unknown:
+        raise CursorError(f"Unknown fields for {table}: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+def fetch_page(conn, table: str, start_day: str = None, end_day: str = None, cursor: str = None,
+               limit: int = DEFAULT_PAGE_SIZE, fields: str = None, newest_first: bool = False) -> dict:
+    """One page of rows plus the cursor for the next (None on the last page)."""
+    projection = parse_fields(conn, table, fields)
+    select = ", ".join(dict.fromkeys(projection + list(KEY_COLUMNS))) if projection else "*"
+    # A cursor replaces the bound it moves away from, so SQLite seeks straight to it
+    where, params = [], []
+    if cursor:
+        where.append(f"(local_day, epoch, id) {'<' if newest_first else '>'} (?, ?, ?)")
+        params.extend(decode_cursor(cursor))
+    if start_day and not (cursor and not newest_first):
+        where.append("local_day >= ?")
+        params.append(start_day)
+    if end_day and not (cursor and newest_first):
+        where.append("local_day <= ?")
+        params.append(end_day)
+    order = " DESC" if newest_first else ""
+    rows = conn.execute(
+        f"SELECT {select} FROM {table}{' WHERE ' + ' AND '.join(where) if where else ''}"
+        f" ORDER BY local_day{order}, epoch{order}, id{order} LIMIT ?",
+        params + [min(limit, MAX_PAGE_SIZE) + 1]
+    ).fetchall()
+
+    page = rows[:min(limit, MAX_PAGE_SIZE)]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > len(page) else None
+    entries = [{f: r[f] for f in projection} for r in page] if projection else [dict(r) for r in page]
+    return {"entries": entries, "count": len(entries), "next_cursor": next_cursor}
@@ -0,0 +1,164 @@
+"""
+NutriTrack On-Demand Profiling
+Sampling CPU profiler and tracemalloc snapshots for a running worker.
+
+Both are off unless NUTRITRACK_DEBUG_TOKEN is set, and then only answer
+requests carrying it. The profiler is a plain thread that reads every other
+thread's stack with sys._current_frames() at a fixed interval, so nothing is
+hooked into the interpreter and handlers run at full speed between samples.
+Stacks are returned collapsed (one "frame;frame;frame count" line per stack,
+the input of flamegraph.pl and speedscope) or as a pstats file built from
+the same samples.
+"""
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from functools import lru_cache
+
+DEBUG_TOKEN = os.environ.get("NUTRITRACK_DEBUG_TOKEN", "")
+MAX_PROFILE_SECONDS = 60
+DEFAULT_INTERVAL = 0.005
+
+# Leaf frames of threads that are waiting rather than working (idle pool
+# workers, the event loop in select); left out unless idle=True
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("selectors.py", "select"), ("thread.py", "_worker"),
+}
+
+class ProfilerStateError(RuntimeError):
+    """A profile is already running, or tracemalloc is not (reported as 409)."""
+
+# ── Sampling Profiler ────────────────────────────────────────────────
+_profile_lock = threading.Lock()
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    # Strip the longest sys.path entry so frames read app.py:205, fastapi/routing.py:301
+    prefixes = [p for p in sys.path if p and filename.startswith(p.rstrip(os.sep) + os.sep)]
+    return filename[len(max(prefixes, key=len)) + 1:] if prefixes else filename
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_INTERVAL, idle: bool = False):
+    """Sample all other threads for seconds. Returns (Counter of stacks, sample rounds, elapsed).
+
+    A stack is a tuple of (file, first line, function, line) frames, outermost first.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerStateError("A profile is already running")
+    try:
+        me = threading.get_ident()
+        names = {}
+        stacks = Counter()
+        rounds = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me or not idle and (
+                        os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_qualname,
+                                  frame.f_lineno or code.co_firstlineno))
+                    frame = frame.f_back
+                if ident not in names:
+                    names.update((t.ident, t.name) for t in threading.enumerate())
+                stack.append(("<thread>", 0, names.get(ident, f"thread-{ident}"), 0))
+                stacks[tuple(reversed(stack))] += 1
+            rounds += 1
+            time.sleep(interval)
+        return stacks, rounds, time.perf_counter() - started
+    finally:
+        _profile_lock.release()
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed stack format, heaviest stacks first."""
+    lines = []
+    for stack, count in stacks.most_common():
+        frames = [name if filename == "<thread>" else f"{name} ({_short_path(filename)}:{line})"
+                  for filename, _, name, line in stack]
+        lines.append(f"{';'.join(frames)} {count}")
+    return "\n".join(lines) + "\n"
+
+def pstats_dump(stacks: Counter, seconds_per_sample: float) -> bytes:
+    """The samples as a marshalled pstats table (pstats.Stats(path), snakeviz).
+
+    Call counts are sample counts; tottime is time as the leaf frame and
+    cumtime time anywhere on the stack, both estimated from the sample rate.
+    """
+    stats = {}  # (file, line, name) -> [samples, leaf samples, stack samples, {caller: samples}]
+    for stack, count in stacks.items():
+        functions = [(f, first, name) for f, first, name, _ in stack if f != "<thread>"]
+        for i, func in enumerate(functions):
+            entry = stats.setdefault(func, [0, 0, 0, Counter()])
+            entry[0] += count
+            if i == len(functions) - 1:
+                entry[1] += count
+            if i > 0:
+                entry[3][functions[i - 1]] += count
+        for func in set(functions):  # recursion counts once towards cumtime
+            stats[func][2] += count
+    return marshal.dumps({
+        func: (n, n, leaf * seconds_per_sample, total * seconds_per_sample,
+               {caller: (c, c, 0.0, c * seconds_per_sample) for caller, c in callers.items()})
+        for func, (n, leaf, total, callers) in stats.items()
+    })
+
+# ── Allocation Snapshots ─────────────────────────────────────────────
+# Filtered out of every snapshot: tracemalloc's own bookkeeping and imports
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_baseline = None
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+def start_tracing(frames: int = 10) -> dict:
+    """Start tracemalloc (if needed) and take the baseline later snapshots are diffed against."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    tracemalloc.reset_peak()
+    _baseline = _snapshot()
+    return tracing_status()
+
+def stop_tracing() -> dict:
+    global _baseline
+    _baseline = None
+    tracemalloc.stop()
+    return tracing_status()
+
+def tracing_status() -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    return {"tracing": tracemalloc.is_tracing(), "frames": tracemalloc.get_traceback_limit(),
+            "traced_kib": round(current / 1024, 1), "peak_kib": round(peak / 1024, 1)}
+
+def snapshot_diff(key_type: str = "lineno", limit: int = 25, rebase: bool = False) -> dict:
+    """Top allocation sites by growth since the baseline; rebase makes this snapshot the new baseline."""
+    global _baseline
+    if _baseline is None:
+        raise ProfilerStateError("tracemalloc is not running; start it first")
+    snapshot = _snapshot()
+    diff = snapshot.compare_to(_baseline, key_type)
+    if rebase:
+        _baseline = snapshot
+    top = []
+    for stat in diff[:limit]:
+        frames = [f"{_short_path(f.filename)}:{f.lineno}" for f in stat.traceback]  # oldest first
+        top.append({
+            "location": frames[-1], "traceback": frames if key_type == "traceback" else None,
+            "size_kib": round(stat.size / 1024, 1), "size_diff_kib": round(stat.size_diff / 1024, 1),
+            "count": stat.count, "count_diff": stat.count_diff,
+        })
+    return {**tracing_status(), "key_type": key_type, "top": top}
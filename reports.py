@@ -0,0 +1,260 @@
+"""
+NutriTrack Period Reports
+Nutrition, weight, activity and health summaries for any range of days.
+
+Aggregates are computed in SQL: nutrition from the daily_totals rollup (one
+row per day), weight, activity and health with aggregate queries over
+indexed local_day ranges, so only summary values reach Python whatever the
+period length. The raw weight, activity and health rows are attached only
+for periods of up to ENTRY_DAYS days, or when asked for. Anomalies are
+found with filtered range queries capped at MAX_ANOMALIES.
+
+A report for a period that ended before today is stored in report_snapshots
+(aggregates and anomalies, no raw rows) the first time it is built and
+served from there afterwards, which also makes digests of closed periods
+two snapshot reads. Goals and profile are frozen at that point; triggers
+drop a snapshot only if an entry inside its range changes later.
+"""
+import json
+from datetime import date, timedelta
+
+from database import transaction, calculate_daily_goals, get_totals_range
+from writer import writer, in_writer_thread
+
+PERIODS = ("week", "month", "quarter", "year", "custom")
+TOP_FOODS = 10
+ENTRY_DAYS = 31  # periods up to a month carry their raw rows by default
+MAX_ANOMALIES = 20
+
+# Anomaly thresholds
+CALORIE_HIGH_RATIO = 1.3
+CALORIE_LOW_RATIO = 0.5
+SYSTOLIC_HIGH = 140
+DIASTOLIC_HIGH = 90
+BLOOD_SUGAR_HIGH = 180
+BLOOD_SUGAR_LOW = 70
+BLOOD_OXYGEN_LOW = 94
+WEIGHT_JUMP_KG = 1.5
+
+# ── Period Ranges ────────────────────────────────────────────────────
+def period_range(period: str, anchor: date, start: str = None, end: str = None) -> tuple:
+    """(start_day, end_day) as dates for a period containing anchor.
+
+    week is the 7 days ending on anchor; month, quarter and year are the
+    calendar periods around it; custom takes start and end.
+    """
+    if period == "week":
+        return anchor - timedelta(days=6), anchor
+    if period == "month":
+        first = anchor.replace(day=1)
+    elif period == "quarter":
+        first = anchor.replace(month=(anchor.month - 1) // 3 * 3 + 1, day=1)
+    elif period == "year":
+        first = anchor.replace(month=1, day=1)
+    elif period == "custom":
+        if not start or not end:
+            raise ValueError("custom reports need start and end")
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        if last < first:
+            raise ValueError("end must not be before start")
+        return first, last
+    else:
+        raise ValueError(f"Unknown period {period!r}; expected one of {', '.join(PERIODS)}")
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    following = date(first.year + (first.month - 1 + months) // 12, (first.month - 1 + months) % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+def previous_range(period: str, start: date, end: date) -> tuple:
+    """The period before [start, end]: the previous calendar period, or the same number of days."""
+    if period in ("month", "quarter", "year"):
+        return period_range(period, start - timedelta(days=1))
+    length = end - start + timedelta(days=1)
+    return start - length, start - timedelta(days=1)
+
+# ── Aggregation ──────────────────────────────────────────────────────
+def _range_rows(conn, table: str, start_day: str, end_day: str) -> list:
+    return [dict(r) for r in conn.execute(
+        f"SELECT * FROM {table} WHERE local_day BETWEEN ? AND ? ORDER BY local_day, epoch", (start_day, end_day)
+    )]
+
+def build_report(conn, profile, start: date, end: date) -> dict:
+    """Aggregate one period (inclusive) from the rollup and indexed range scans."""
+    start_day, end_day = start.isoformat(), end.isoformat()
+    period_days = (end - start).days + 1
+
+    totals = get_totals_range(conn, start_day, end_day)
+    nutrition_days = {
+        day: {k: t[k] for k in ("calories", "protein_g", "carbs_g", "fat_g")}
+        for day, t in totals.items() if t["food_count"] > 0
+    }
+    days_logged = len(nutrition_days) or 1
+    average = lambda k: round(sum(d[k] for d in nutrition_days.values()) / days_logged, 1)
+
+    goals = None
+    if profile:
+        burned = sum(t["calories_burned"] for t in totals.values())
+        goals = calculate_daily_goals(profile, burned / period_days)
+    days_over = sum(1 for d in nutrition_days.values() if d["calories"] > goals["calorie_goal"]) if goals else 0
+    days_under = len(nutrition_days) - days_over if goals else 0
+
+    # First and last by the index order; the subqueries each read one entry
+    weight = conn.execute("""
+        SELECT (SELECT weight_kg FROM weight_logs WHERE local_day BETWEEN ?1 AND ?2
+                ORDER BY local_day, epoch LIMIT 1) AS first,
+               (SELECT weight_kg FROM weight_logs WHERE local_day BETWEEN ?1 AND ?2
+                ORDER BY local_day DESC, epoch DESC LIMIT 1) AS last,
+               COUNT(*) AS entries, MIN(weight_kg) AS lowest, MAX(weight_kg) AS highest
+        FROM weight_logs WHERE local_day BETWEEN ?1 AND ?2
+    """, (start_day, end_day)).fetchone()
+
+    by_type = {r["activity_type"]: {"sessions": r["sessions"], "minutes": r["minutes"], "calories_burned": r["burned"]}
+               for r in conn.execute("""
+        SELECT activity_type, COUNT(*) AS sessions, COALESCE(SUM(duration_minutes), 0) AS minutes,
+               ROUND(COALESCE(SUM(calories_burned), 0), 1) AS burned
+        FROM sport_activities WHERE local_day BETWEEN ? AND ?
+        GROUP BY activity_type ORDER BY sessions DESC, activity_type
+    """, (start_day, end_day))}
+
+    top_foods = [dict(r) for r in conn.execute("""
+        SELECT trim(name) AS name, COUNT(*) AS times_logged, ROUND(AVG(calories), 1) AS avg_calories,
+               ROUND(SUM(calories), 1) AS total_calories
+        FROM food_entries WHERE local_day BETWEEN ? AND ?
+        GROUP BY lower(trim(name))
+        ORDER BY times_logged DESC, total_calories DESC
+        LIMIT ?
+    """, (start_day, end_day, TOP_FOODS))]
+
+    health = conn.execute("""
+        SELECT COUNT(*), ROUND(AVG(NULLIF(systolic_bp, 0)), 1), ROUND(AVG(NULLIF(diastolic_bp, 0)), 1),
+               ROUND(AVG(NULLIF(blood_sugar, 0)), 1), ROUND(AVG(NULLIF(blood_oxygen, 0)), 1),
+               ROUND(AVG(NULLIF(heart_rate, 0)), 1)
+        FROM health_measurements WHERE local_day BETWEEN ? AND ?
+    """, (start_day, end_day)).fetchone()
+
+    return {
+        "period": f"{start_day} to {end_day}",
+        "start_date": start_day,
+        "end_date": end_day,
+        "days_with_data": days_logged,
+        "nutrition": {
+            "avg_calories": average("calories"),
+            "avg_protein_g": average("protein_g"),
+            "avg_carbs_g": average("carbs_g"),
+            "avg_fat_g": average("fat_g"),
+            "days_over_goal": days_over,
+            "days_under_goal": days_under,
+            "daily_breakdown": nutrition_days,
+            "top_foods": top_foods,
+        },
+        "weight": {
+            "start_weight": weight["first"],
+            "end_weight": weight["last"],
+            "change_kg": round(weight["last"] - weight["first"], 2) if weight["first"] and weight["last"] else None,
+            "entries": weight["entries"],
+            "min_weight": weight["lowest"],
+            "max_weight": weight["highest"],
+        },
+        "activity": {
+            "total_sessions": sum(t["sessions"] for t in by_type.values()),
+            "total_duration_min": sum(t["minutes"] for t in by_type.values()),
+            "total_calories_burned": round(sum(t["calories_burned"] for t in by_type.values()), 1),
+            "types": list(by_type),
+            "by_type": by_type,
+        },
+        "health": {
+            "measurements": health[0],
+            "avg_systolic": health[1],
+            "avg_diastolic": health[2],
+            "avg_blood_sugar": health[3],
+            "avg_blood_oxygen": health[4],
+            "avg_heart_rate": health[5],
+        },
+        "anomalies": period_anomalies(conn, start_day, end_day, goals),
+        "goals": goals,
+        "profile": profile,
+    }
+
+def period_anomalies(conn, start_day: str, end_day: str, goals: dict = None) -> list:
+    """Days and entries outside the thresholds, first MAX_ANOMALIES; each kind is one filtered range query."""
+    anomalies = []
+    if goals:
+        goal = goals["calorie_goal"]
+        for day, calories in conn.execute("""
+            SELECT day, calories FROM daily_totals
+            WHERE day BETWEEN ? AND ? AND food_count > 0 AND (calories > ? OR calories < ?)
+            ORDER BY day LIMIT ?
+        """, (start_day, end_day, goal * CALORIE_HIGH_RATIO, goal * CALORIE_LOW_RATIO, MAX_ANOMALIES)):
+            anomalies.append(f"{day}: {round(calories)} kcal ({round((calories / goal - 1) * 100):+d}% vs goal)")
+    for h in conn.execute("""
+        SELECT local_day, systolic_bp, diastolic_bp, blood_sugar, blood_oxygen FROM health_measurements
+        WHERE local_day BETWEEN ? AND ?
+          AND (systolic_bp >= ? OR diastolic_bp >= ?
+               OR (blood_sugar != 0 AND blood_sugar NOT BETWEEN ? AND ?)
+               OR (blood_oxygen != 0 AND blood_oxygen < ?))
+        ORDER BY local_day, epoch LIMIT ?
+    """, (start_day, end_day, SYSTOLIC_HIGH, DIASTOLIC_HIGH, BLOOD_SUGAR_LOW, BLOOD_SUGAR_HIGH,
+          BLOOD_OXYGEN_LOW, MAX_ANOMALIES)):
+        day = h["local_day"]
+        if (h["systolic_bp"] or 0) >= SYSTOLIC_HIGH or (h["diastolic_bp"] or 0) >= DIASTOLIC_HIGH:
+            anomalies.append(f"{day}: blood pressure {h['systolic_bp']}/{h['diastolic_bp']}")
+        if h["blood_sugar"] and not BLOOD_SUGAR_LOW <= h["blood_sugar"] <= BLOOD_SUGAR_HIGH:
+            anomalies.append(f"{day}: blood sugar {h['blood_sugar']}")
+        if h["blood_oxygen"] and h["blood_oxygen"] < BLOOD_OXYGEN_LOW:
+            anomalies.append(f"{day}: blood oxygen {h['blood_oxygen']}%")
+    for day, before, after in conn.execute("""
+        SELECT local_day, before, weight_kg FROM (
+            SELECT local_day, weight_kg, LAG(weight_kg) OVER (ORDER BY local_day, epoch) AS before
+            FROM weight_logs WHERE local_day BETWEEN ? AND ?
+        ) WHERE abs(weight_kg - before) >= ? LIMIT ?
+    """, (start_day, end_day, WEIGHT_JUMP_KG, MAX_ANOMALIES)):
+        anomalies.append(f"{day}: weight {before} -> {after} kg")
+    return anomalies[:MAX_ANOMALIES]
+
+def attach_entries(conn, report: dict) -> dict:
+    """The report with its raw weight, activity and health rows (never stored in snapshots)."""
+    start_day, end_day = report["start_date"], report["end_date"]
+    return dict(
+        report,
+        weight=dict(report["weight"], all_entries=_range_rows(conn, "weight_logs", start_day, end_day)),
+        activity=dict(report["activity"], activities=_range_rows(conn, "sport_activities", start_day, end_day)),
+        health=dict(report["health"], all_entries=_range_rows(conn, "health_measurements", start_day, end_day)),
+    )
+
+# ── Snapshots ────────────────────────────────────────────────────────
+def save_snapshot(conn, start: date, end: date, report: dict):
+    """Store a closed period's report; from a read request this is a writer job (see writer.py)."""
+    row = (start.isoformat(), end.isoformat(), json.dumps(report))
+
+    def save(write_conn):
+        with transaction(write_conn):
+            write_conn.execute(
+                "INSERT OR REPLACE INTO report_snapshots (start_day, end_day, report_json) VALUES (?, ?, ?)", row
+            )
+
+    if in_writer_thread():
+        save(conn)
+    else:
+        writer.run(save)
+
+def get_report(conn, profile, period: str, start: date, end: date, today: date, entries: bool = None) -> dict:
+    """Report for [start, end]: from its snapshot when the period is closed, else live.
+
+    entries adds the raw rows; by default only periods of up to ENTRY_DAYS days get them.
+    """
+    if entries is None:
+        entries = (end - start).days + 1 <= ENTRY_DAYS
+    closed = end < today
+    report = None
+    if closed:
+        row = conn.execute(
+            "SELECT report_json FROM report_snapshots WHERE start_day = ? AND end_day = ?",
+            (start.isoformat(), end.isoformat())
+        ).fetchone()
+        if row:
+            report = dict(json.loads(row["report_json"]), period_type=period, closed=True, snapshot=True)
+    if report is None:
+        built = build_report(conn, profile, start, end)
+        if closed:
+            save_snapshot(conn, start, end, built)
+        report = dict(built, period_type=period, closed=closed, snapshot=False)
+    return attach_entries(conn, report) if entries else report
@@ -0,0 +1,125 @@
+"""
+NutriTrack Response Cache
+In-memory cache of GET responses keyed by path, query, today's date and the
+write generations of the tables each route reads.
+
+Triggers bump write_generations on every insert, update and delete, so a
+cached response is valid exactly as long as the generations it was built
+from. Generations are held in memory and re-read from SQLite only after a
+write request in this process or every NUTRITRACK_CACHE_SYNC_INTERVAL
+seconds (to see other workers), so a conditional GET that matches the
+cached ETag is answered with 304 without touching the database.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import database
+from local_time import local_today
+
+CACHE_SIZE = int(os.environ.get("NUTRITRACK_RESPONSE_CACHE_SIZE", "256"))
+SYNC_INTERVAL = float(os.environ.get("NUTRITRACK_CACHE_SYNC_INTERVAL", "1.0"))
+MAX_BODY_BYTES = 1024 * 1024  # larger responses are not worth holding in memory
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header value matches etag (strong comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+class ResponseCache:
+    """LRU of rendered GET responses plus the write generations they depend on."""
+
+    def __init__(self, max_entries: int = CACHE_SIZE, sync_interval: float = SYNC_INTERVAL):
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._synced_path = None
+        self._synced_at = 0.0
+        self._stale = True
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "evictions": 0, "syncs": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def mark_stale(self):
+        """Force a generation re-read before the next lookup (after a write request)."""
+        self._stale = True
+
+    def needs_sync(self) -> bool:
+        return (self._stale or self._synced_path != database.DB_PATH
+                or time.monotonic() - self._synced_at >= self.sync_interval)
+
+    def sync(self):
+        """Re-read write_generations (blocking; run in a worker thread)."""
+        path = database.DB_PATH
+        self._stale = False
+        conn = database.get_db()
+        try:
+            generations = dict(conn.execute("SELECT name, generation FROM write_generations").fetchall())
+        finally:
+            conn.close()
+        with self._lock:
+            self._generations = generations
+            self._synced_path = path
+            self._synced_at = time.monotonic()
+            self.stats["syncs"] += 1
+
+    def key(self, path: str, query: str, tables: tuple) -> tuple:
+        generations = self._generations
+        return (
+            self._synced_path, path, query, local_today().isoformat(),
+            tuple(generations.get(t, 0) for t in tables),
+        )
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: tuple, body: bytes, headers: dict) -> str:
+        etag = make_etag(body)
+        if len(body) <= MAX_BODY_BYTES:
+            with self._lock:
+                self._entries[key] = (etag, body, headers)
+                self._entries.move_to_end(key)
+                self.stats["stores"] += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+        return etag
+
+    def count_not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._stale = True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(len(body) for _, body, _ in self._entries.values()),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+                "sync_interval_s": self.sync_interval,
+                "generations": dict(self._generations),
+            }
@@ -1,17 +1,36 @@
 #!/usr/bin/env python3
 """
 NutriTrack Demo Data Seeder
-Populates the database with 30 days of realistic sample data.
-Usage: python3 seed.py [--force]
+Populates the database with realistic sample data, deterministically.
+
+Usage: python3 seed.py [--force] [--days 30 | --years N] [--users N] [--seed 42]
+                       [--heart-rate-interval SECONDS] [--db PATH]
+
+The same seed and end date always produce the same rows, so the generator
+doubles as a fixture for tests and benchmarks (generate()). Rows are written
+with executemany inside one bulk_load() transaction, which suspends the
+per-row triggers of the entry tables and re-derives their state once at the
+end; years of history, including wearable-rate heart-rate samples, load at
+well over a hundred thousand rows per second.
+
+NutriTrack keeps one user per database, so --users N writes N database files.
 """
+import argparse
 import sys
 import os
 import random
-from datetime import datetime, timedelta
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
 
 # Ensure we can import database module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from database import get_db, init_db
+import database
+import local_time
+from database import get_db, init_db, transaction, invalidate_profile, rebuild_daily_totals
+from food_search import rebuild_food_catalog
+from gamification import reset_gamification
+from local_time import local_today
 
 MEAL_FOODS = {
     "breakfast": [
@@ -64,122 +83,226 @@ ACTIVITY_TYPES = [
     ("Weight training", 40, 250, "moderate"),
 ]
 
+DEFAULT_SEED = 42
+DEMO_DAYS = 30
+CHUNK_DAYS = 90  # days generated per executemany round
 
-def seed(force=False):
-    """Seed the database with demo data. Returns summary dict."""
-    init_db()
-    conn = get_db()
+# Everything a user logs or the coaching features derive from it
+USER_TABLES = ("food_entries", "weight_logs", "sport_activities", "health_measurements",
+               "heart_rate_samples", "often_used_foods", "daily_coaching", "coaching_reports", "user_profile")
+ENTRY_TABLES = tuple(local_time.TIMESTAMP_COLUMNS)
 
-    # Check if data already exists
-    existing = conn.execute("SELECT COUNT(*) FROM food_entries").fetchone()[0]
-    if existing > 0 and not force:
-        conn.close()
-        return None  # Signal that data already exists
-
-    # Clear existing data if force
-    if force:
-        for table in ["food_entries", "weight_logs", "sport_activities", "health_measurements", "user_profile"]:
-            conn.execute(f"DELETE FROM {table}")
-        conn.commit()
-
-    # Profile
-    conn.execute("""
-        INSERT INTO user_profile (age, sex, height_cm, current_weight_kg, activity_level, weight_goal_kg, calorie_deficit)
-        VALUES (32, 'male', 178, 85.0, 'moderate', 78.0, 500)
-    """)
-
-    today = datetime.now().date()
-    random.seed(42)
-
-    counts = {"food": 0, "weight": 0, "activity": 0, "health": 0}
-    start_weight = 85.0
-    weight = start_weight
-
-    for day_offset in range(30):
-        d = today - timedelta(days=29 - day_offset)
-        ds = d.isoformat()
-
-        # Weight (gradual decline + noise)
-        weight = start_weight - (day_offset * 0.055) + random.uniform(-0.3, 0.3)
-        weight = round(weight, 1)
-        conn.execute(
-            "INSERT INTO weight_logs (weight_kg, notes, measured_at) VALUES (?, ?, ?)",
-            (weight, "Morning weigh-in", f"{ds}T07:{random.randint(0, 30):02d}:00")
-        )
-        counts["weight"] += 1
-
-        # Food: breakfast + lunch + dinner
-        for meal in ["breakfast", "lunch", "dinner"]:
-            food = random.choice(MEAL_FOODS[meal])
-            name, cal, prot, carb, fat, qty = food
-            hour = {"breakfast": 8, "lunch": 12, "dinner": 19}[meal]
-            conn.execute(
-                "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, logged_at) VALUES (?,?,?,?,?,?,?,?)",
-                (name, cal + random.randint(-30, 30), prot, carb, fat, meal, qty,
-                 f"{ds}T{hour:02d}:{random.randint(0, 45):02d}:00")
-            )
-            counts["food"] += 1
+# Heart-rate boost during a session, by intensity
+HEART_RATE_EFFORT = {"low": 25, "moderate": 45, "high": 65}
 
-        # Snack on ~70% of days
-        if random.random() < 0.7:
-            food = random.choice(MEAL_FOODS["snack"])
-            name, cal, prot, carb, fat, qty = food
-            conn.execute(
-                "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, logged_at) VALUES (?,?,?,?,?,?,?,?)",
-                (name, cal + random.randint(-10, 10), prot, carb, fat, "snack", qty,
-                 f"{ds}T{random.randint(15, 17):02d}:{random.randint(0, 59):02d}:00")
-            )
-            counts["food"] += 1
+# ── Bulk Loading ─────────────────────────────────────────────────────
+@contextmanager
+def bulk_load(conn):
+    """Transaction for large writes to the entry tables, with their row triggers suspended.
 
-        # Activity on ~60% of days
-        if random.random() < 0.6:
-            act = random.choice(ACTIVITY_TYPES)
-            act_type, duration, burned, intensity = act
+    Rows inserted without epoch and local_day get them at the end, then the daily
+    rollup and food catalog are rebuilt, report snapshots dropped and write
+    generations bumped. The triggers are dropped and recreated inside the
+    same transaction, so other connections never see them missing.
+    """
+    with transaction(conn):
+        marks = ",".join("?" * len(ENTRY_TABLES))
+        triggers = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({marks})", ENTRY_TABLES
+        ).fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        yield conn
+        for table, (_, column) in local_time.TIMESTAMP_COLUMNS.items():
             conn.execute(
-                "INSERT INTO sport_activities (activity_type, duration_minutes, calories_burned, intensity, performed_at) VALUES (?,?,?,?,?)",
-                (act_type, duration, burned + random.randint(-20, 20), intensity,
-                 f"{ds}T{random.randint(6, 18):02d}:{random.randint(0, 59):02d}:00")
+                f"UPDATE {table} SET epoch = {local_time.epoch_sql(column)}, "
+                f"local_day = {local_time.local_day_sql(column)} WHERE local_day IS NULL"
             )
-            counts["activity"] += 1
+        for _, sql in triggers:
+            conn.execute(sql)
+        rebuild_daily_totals(conn)
+        rebuild_food_catalog(conn)
+        conn.execute("DELETE FROM report_snapshots")
+        conn.execute(f"UPDATE write_generations SET generation = generation + 1 WHERE name IN ({marks})", ENTRY_TABLES)
 
-        # Health every ~3 days
-        if day_offset % 3 == 0:
-            conn.execute(
-                "INSERT INTO health_measurements (systolic_bp, diastolic_bp, blood_sugar, blood_oxygen, heart_rate, measured_at) VALUES (?,?,?,?,?,?)",
-                (random.randint(110, 130), random.randint(70, 85),
-                 round(random.uniform(85, 105), 1), round(random.uniform(96, 99), 1),
-                 random.randint(62, 82),
-                 f"{ds}T{random.randint(7, 20):02d}:{random.randint(0, 59):02d}:00")
-            )
-            counts["health"] += 1
+# ── Generator ────────────────────────────────────────────────────────
+EPOCH_DAY = date(1970, 1, 1)
+
+def _resting_curve(interval: int, resting: int) -> list:
+    """Baseline heart rate per sample slot: lowest at night, higher while awake."""
+    return [resting + (14 if 7 * 3600 <= s < 23 * 3600 else 0) for s in range(0, 86400, interval)]
+
+def generate(conn, days: int, seed: int = DEFAULT_SEED, end=None, heart_rate_interval: int = 0,
+             user: int = 0, replace: bool = True) -> dict:
+    """Write `days` of history ending on `end` (default today) for one synthetic user.
+
+    heart_rate_interval > 0 adds a heart-rate sample every that many
+    seconds to heart_rate_samples, as a wearable would. With replace,
+    existing user data and the streaks, XP and badges derived from it are
+    cleared first. Returns row counts per kind.
+    """
+    rng = random.Random(seed * 1000 + user)
+    end = end or local_today()
+    first = end - timedelta(days=days - 1)
+    rand, randint, choice, wall_epoch = rng.random, rng.randint, rng.choice, local_time.wall_epoch
+
+    # A profile per user, losing weight towards a goal and then holding it
+    sex = choice(("male", "female"))
+    height = randint(165, 190) if sex == "male" else randint(155, 178)
+    weight = trend = round(height - 100 + rng.uniform(-5, 15), 1)
+    goal = round(weight - rng.uniform(3, 12), 1)
+    resting = randint(54, 68)
+    slots = range(0, 86400, heart_rate_interval) if heart_rate_interval > 0 else range(0)
+    clock = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in slots]
+    curve = _resting_curve(heart_rate_interval, resting) if slots else []
+    counts = {"food": 0, "weight": 0, "activity": 0, "health": 0, "heart_rate": 0}
 
-    # Update profile with latest weight
-    conn.execute("UPDATE user_profile SET current_weight_kg=?", (weight,))
-    conn.commit()
-    conn.close()
+    with bulk_load(conn):
+        if replace:
+            for table in USER_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            reset_gamification(conn)  # streaks and XP of the old history would outlive it
+        for chunk_start in range(0, days, CHUNK_DAYS):
+            food, weights, activities, health, heart = [], [], [], [], []
+            for offset in range(chunk_start, min(chunk_start + CHUNK_DAYS, days)):
+                day = first + timedelta(days=offset)
+                ds, wall = day.isoformat(), (day - EPOCH_DAY).days * 86400
 
+                # Timestamp columns ready stamped: (logged_at, epoch, local_day)
+                def at(hour, minute):
+                    return f"{ds}T{hour:02d}:{minute:02d}:00", wall_epoch(wall + hour * 3600 + minute * 60), ds
+
+                trend += -0.06 if trend > goal + 0.5 else 0.03 if trend < goal - 0.5 else 0.0
+                weight = round(trend + rng.uniform(-0.3, 0.3), 1)
+                if rand() < 0.85:
+                    weights.append((weight, "Morning weigh-in", *at(7, randint(0, 30))))
+
+                if rand() < 0.97:  # a few days go unlogged
+                    for meal, hour in (("breakfast", 8), ("lunch", 12), ("dinner", 19)):
+                        name, cal, prot, carb, fat, qty = choice(MEAL_FOODS[meal])
+                        food.append((name, cal + randint(-30, 30), prot, carb, fat, meal, qty, *at(hour, randint(0, 45))))
+                    if rand() < 0.7:
+                        name, cal, prot, carb, fat, qty = choice(MEAL_FOODS["snack"])
+                        food.append((name, cal + randint(-10, 10), prot, carb, fat, "snack", qty,
+                                     *at(randint(15, 17), randint(0, 59))))
+
+                session = None
+                if rand() < 0.6:
+                    act_type, duration, burned, intensity = choice(ACTIVITY_TYPES)
+                    hour, minute = randint(6, 18), randint(0, 59)
+                    activities.append((act_type, duration, burned + randint(-20, 20), intensity, *at(hour, minute)))
+                    session = ((hour * 60 + minute) * 60, (hour * 60 + minute + duration) * 60, HEART_RATE_EFFORT[intensity])
+
+                if rand() < 0.33:
+                    health.append((randint(110, 130), randint(70, 85), round(rng.uniform(85, 105), 1),
+                                   round(rng.uniform(96, 99), 1), randint(resting, resting + 20),
+                                   *at(randint(7, 20), randint(0, 59))))
+
+                if slots:
+                    prefix = f"{ds}T"
+                    utc = wall_epoch(wall)
+                    if wall_epoch(wall + 86399) - utc == 86399:  # no offset change today
+                        samples = [(base + int(rand() * 8), prefix + hms, utc + s, ds)
+                                   for base, hms, s in zip(curve, clock, slots)]
+                    else:
+                        samples = [(base + int(rand() * 8), prefix + hms, wall_epoch(wall + s), ds)
+                                   for base, hms, s in zip(curve, clock, slots)]
+                    if session:
+                        start, stop, effort = session
+                        for i in range(start // heart_rate_interval, min(stop // heart_rate_interval, len(samples))):
+                            samples[i] = (samples[i][0] + effort,) + samples[i][1:]
+                    heart.extend(samples)
+
+            conn.executemany(
+                "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, meal_type, quantity, "
+                "logged_at, epoch, local_day) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", food)
+            conn.executemany(
+                "INSERT INTO weight_logs (weight_kg, notes, measured_at, epoch, local_day) VALUES (?, ?, ?, ?, ?)", weights)
+            conn.executemany(
+                "INSERT INTO sport_activities (activity_type, duration_minutes, calories_burned, intensity, "
+                "performed_at, epoch, local_day) VALUES (?, ?, ?, ?, ?, ?, ?)", activities)
+            conn.executemany(
+                "INSERT INTO health_measurements (systolic_bp, diastolic_bp, blood_sugar, blood_oxygen, heart_rate, "
+                "measured_at, epoch, local_day) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", health)
+            conn.executemany(
+                "INSERT INTO heart_rate_samples (heart_rate, measured_at, epoch, local_day) VALUES (?, ?, ?, ?)", heart)
+            for kind, rows in (("food", food), ("weight", weights), ("activity", activities),
+                               ("health", health), ("heart_rate", heart)):
+                counts[kind] += len(rows)
+
+        conn.execute("""
+            INSERT INTO user_profile (age, sex, height_cm, current_weight_kg, activity_level, weight_goal_kg, calorie_deficit)
+            VALUES (?, ?, ?, ?, 'moderate', ?, 500)
+        """, (randint(22, 60), sex, height, weight, goal))
+    invalidate_profile(conn)
     return counts
 
 
+def seed(force=False):
+    """Seed the database with demo data. Returns summary dict."""
+    init_db()
+    conn = get_db()
+    try:
+        # Check if data already exists
+        existing = conn.execute("SELECT COUNT(*) FROM food_entries").fetchone()[0]
+        if existing > 0 and not force:
+            return None  # Signal that data already exists
+        return generate(conn, DEMO_DAYS)
+    finally:
+        conn.close()
+
+
+def user_db_path(path: str, user: int, users: int) -> str:
+    """Database file of one user: the given path, numbered when there are several."""
+    if users == 1:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}-user{user + 1}{ext or '.db'}"
+
+
 def main():
-    force = "--force" in sys.argv
+    parser = argparse.ArgumentParser(description="Populate NutriTrack with deterministic sample data")
+    parser.add_argument("--force", action="store_true", help="replace existing data")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--days", type=int, default=DEMO_DAYS, help=f"days of history (default {DEMO_DAYS})")
+    size.add_argument("--years", type=float, help="years of history (overrides --days)")
+    parser.add_argument("--users", type=int, default=1, help="number of users, one database file each")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"random seed (default {DEFAULT_SEED})")
+    parser.add_argument("--heart-rate-interval", type=int, default=0, metavar="SECONDS",
+                        help="add wearable heart-rate samples this often (e.g. 60)")
+    parser.add_argument("--db", default=database.DB_PATH, help="database file (default: NUTRITRACK_DB)")
+    args = parser.parse_args()
+    days = round(args.years * 365) if args.years else args.days
 
     print("NutriTrack Demo Data Seeder")
     print("=" * 40)
 
-    result = seed(force=force)
+    for user in range(args.users):
+        database.DB_PATH = user_db_path(args.db, user, args.users)
+        init_db()
+        conn = get_db()
+        try:
+            if conn.execute("SELECT COUNT(*) FROM food_entries").fetchone()[0] and not args.force:
+                print("Database already has data.")
+                print("Use --force to clear and re-seed.")
+                print("  python3 seed.py --force")
+                sys.exit(0)
+            started = time.perf_counter()
+            result = generate(conn, days, args.seed, heart_rate_interval=args.heart_rate_interval, user=user)
+            seconds = time.perf_counter() - started
+        finally:
+            conn.close()
+        database.close_pool()
 
-    if result is None:
-        print("Database already has data.")
-        print("Use --force to clear and re-seed.")
-        print("  python3 seed.py --force")
-        sys.exit(0)
-
-    print(f"  Food entries:         {result['food']}")
-    print(f"  Weight logs:          {result['weight']}")
-    print(f"  Activity sessions:    {result['activity']}")
-    print(f"  Health measurements:  {result['health']}")
-    print("=" * 40)
+        print(f"  Food entries:         {result['food']}")
+        print(f"  Weight logs:          {result['weight']}")
+        print(f"  Activity sessions:    {result['activity']}")
+        print(f"  Health measurements:  {result['health']}")
+        if result["heart_rate"]:
+            print(f"  Heart-rate samples:   {result['heart_rate']}")
+        total = sum(result.values())
+        print(f"  {total} rows in {seconds:.1f}s ({total / seconds:,.0f} rows/s)")
+        print("=" * 40)
     print("Demo data seeded successfully!")
 
 
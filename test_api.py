@@ -0,0 +1,360 @@
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as nutritrack
+import database
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    with TestClient(nutritrack.app) as c:
+        c.put("/api/profile", json={
+            "age": 30, "sex": "male", "height_cm": 180, "current_weight_kg": 80,
+        })
+        yield c
+    database.close_pool()
+
+
+def test_food_batch_inserts_once_and_replays_by_idempotency_key(client):
+    body = {"entries": [
+        {"name": "Oats", "calories": 350, "logged_at": "2026-01-01T08:00:00"},
+        {"name": "Salad", "calories": 450, "logged_at": "2026-01-01T12:00:00"},
+        {"name": "Soup", "calories": 300, "logged_at": "2026-01-02T19:00:00"},
+    ]}
+    first = client.post("/api/food/batch", json=body, headers={"Idempotency-Key": "backfill-1"}).json()
+    assert first["count"] == 3
+    assert [e["name"] for e in first["entries"]] == ["Oats", "Salad", "Soup"]
+    assert sorted(first["coaching_tips"]) == ["2026-01-01", "2026-01-02"]
+
+    retry = client.post("/api/food/batch", json=body, headers={"Idempotency-Key": "backfill-1"}).json()
+    assert retry["replayed"] is True
+    assert retry["entries"] == first["entries"]
+
+    rows = client.get("/api/food/range", params={"start": "2026-01-01", "end": "2026-01-02"}).json()
+    assert rows["count"] == 3
+
+
+def test_batch_rejects_invalid_entries_without_partial_writes(client):
+    body = {"entries": [{"weight_kg": 80}, {"weight_kg": 5}]}
+    assert client.post("/api/weight/batch", json=body).status_code == 422
+    assert client.get("/api/weight").json()["count"] == 1  # only the profile's initial weight
+
+
+def test_timestamps_are_validated_and_stored_canonically(client):
+    for bad in ("2025-13-01T08:00:00", "yesterday", "2025-02-30"):
+        assert client.post("/api/food", json={"name": "Oats", "calories": 300, "logged_at": bad}).status_code == 422
+        assert client.post("/api/health", json={"heart_rate": 60, "measured_at": bad}).status_code == 422
+    body = {"entries": [{"activity_type": "Run", "performed_at": "2025-03-01T07:00:00"},
+                        {"activity_type": "Run", "performed_at": "March 2nd"}]}
+    assert client.post("/api/activity/batch", json=body).status_code == 422
+
+    entry = client.post("/api/food", json={"name": "Oats", "calories": 300, "logged_at": "2025-03-01 08:00"}).json()
+    assert entry["entry"]["logged_at"] == "2025-03-01T08:00:00" and entry["entry"]["local_day"] == "2025-03-01"
+    assert client.get("/api/gamification").status_code == 200
+
+
+def test_export_streams_csv_ndjson_and_zip(client, monkeypatch):
+    import io
+    import json
+    import zipfile
+
+    monkeypatch.setattr(nutritrack, "EXPORT_CHUNK_ROWS", 2)
+    client.post("/api/food/batch", json={"entries": [
+        {"name": f"Meal {i}", "calories": 100 + i, "logged_at": f"2026-01-0{i + 1}T12:00:00"} for i in range(5)
+    ]})
+
+    csv_lines = client.get("/api/export/csv", params={"type": "food"}).text.splitlines()
+    assert csv_lines[0].startswith("id,name,calories") and len(csv_lines) == 6
+
+    ndjson = client.get("/api/export/csv", params={"type": "food", "format": "ndjson", "gzip": True})
+    assert ndjson.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["name"] for line in ndjson.text.splitlines()] == [f"Meal {i}" for i in range(5)]
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get("/api/export/csv", params={"type": "all"}).content))
+    assert sorted(archive.namelist()) == [
+        "nutritrack_activity.csv", "nutritrack_food.csv", "nutritrack_health.csv", "nutritrack_weight.csv",
+    ]
+    assert archive.read("nutritrack_food.csv").decode().splitlines() == csv_lines
+
+
+def test_import_round_trips_export_and_skips_duplicates(client):
+    import gzip
+
+    client.post("/api/food/batch", json={"entries": [
+        {"name": f"Meal {i}", "calories": 100 + i, "protein_g": 10, "logged_at": f"2026-01-0{i + 1}T12:00:00"}
+        for i in range(4)
+    ]})
+    exported = client.get("/api/export/csv", params={"type": "food", "format": "ndjson"}).content
+    for entry in client.get("/api/food/range", params={"start": "2026-01-01", "end": "2026-01-04"}).json()["entries"]:
+        client.delete(f"/api/food/{entry['id']}")
+
+    report = client.post("/api/import", params={"type": "food", "format": "ndjson"},
+                         content=gzip.compress(exported), headers={"Content-Encoding": "gzip"}).json()["reports"][0]
+    assert (report["inserted"], report["duplicates"], report["rejected"]) == (4, 0, 0)
+    assert client.get("/api/daily-summary", params={"date": "2026-01-02"}).json()["intake"]["calories"] == 101
+
+    bad_row = b'{"name": "Bad", "meal_type": "brunch", "logged_at": "2026-01-05T12:00:00"}\n'
+    report = client.post("/api/import", params={"type": "food", "format": "ndjson"},
+                         content=exported + bad_row).json()["reports"][0]
+    assert (report["inserted"], report["duplicates"], report["rejected"]) == (0, 4, 1)
+    assert report["errors"][0]["line"] == 5
+
+
+def test_get_responses_are_cached_by_write_generation(client, monkeypatch):
+    import sqlite3
+
+    cache = nutritrack.response_cache
+    cache.clear()
+    first = client.get("/api/daily-summary")
+    etag = first.headers["etag"]
+    hits = cache.stats["hits"]
+
+    assert client.get("/api/daily-summary").headers["etag"] == etag
+    assert cache.stats["hits"] == hits + 1
+    not_modified = client.get("/api/daily-summary", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    # A write through the API invalidates immediately
+    client.post("/api/food", json={"name": "Apple", "calories": 95})
+    changed = client.get("/api/daily-summary", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["intake"]["calories"] == 95
+
+    # Writes from another process are seen once the generations are re-synced
+    monkeypatch.setattr(cache, "sync_interval", 0)
+    other = sqlite3.connect(database.DB_PATH)
+    other.execute("DELETE FROM food_entries")
+    other.commit()
+    other.close()
+    assert client.get("/api/daily-summary").json()["intake"]["calories"] == 0
+    assert client.get("/api/cache/stats").json()["not_modified"] >= 1
+
+
+def test_period_reports_aggregate_and_snapshot_closed_periods(client):
+    import json
+
+    client.post("/api/food/batch", json={"entries": [
+        {"name": "Oats", "calories": 400, "protein_g": 12, "logged_at": "2025-02-03T08:00:00"},
+        {"name": "Pasta", "calories": 800, "protein_g": 30, "logged_at": "2025-02-03T19:00:00"},
+        {"name": "Salad", "calories": 600, "protein_g": 20, "logged_at": "2025-03-10T12:00:00"},
+    ]})
+    client.post("/api/weight/batch", json={"entries": [
+        {"weight_kg": 81, "measured_at": "2025-01-05T07:00:00"},
+        {"weight_kg": 79.5, "measured_at": "2025-03-20T07:00:00"},
+    ]})
+
+    quarter = client.get("/api/reports/quarter", params={"date": "2025-02-14"}).json()
+    assert (quarter["start_date"], quarter["end_date"]) == ("2025-01-01", "2025-03-31")
+    assert quarter["days_with_data"] == 2 and quarter["nutrition"]["avg_calories"] == 900
+    assert quarter["weight"]["change_kg"] == -1.5
+    assert quarter["closed"] is True and quarter["snapshot"] is False
+    assert quarter["weight"]["entries"] == 2 and "all_entries" not in quarter["weight"]  # long: aggregates only
+    detailed = client.get("/api/reports/quarter", params={"date": "2025-03-01", "entries": "true"}).json()
+    assert detailed["snapshot"] is True and len(detailed["weight"]["all_entries"]) == 2
+    conn = database.get_db()
+    stored = json.loads(conn.execute("SELECT report_json FROM report_snapshots").fetchone()[0])
+    conn.close()
+    assert "all_entries" not in stored["weight"] and "activities" not in stored["activity"]
+
+    # A late edit inside the period drops its snapshot; other periods keep theirs
+    client.get("/api/reports/month", params={"date": "2025-03-01"})
+    client.post("/api/food", json={"name": "Cake", "calories": 300, "logged_at": "2025-02-03T15:00:00"})
+    month = client.get("/api/reports/month", params={"date": "2025-03-01"}).json()
+    assert month["snapshot"] is True and month["nutrition"]["avg_calories"] == 600
+    quarter = client.get("/api/reports/quarter", params={"date": "2025-02-14"}).json()
+    assert quarter["snapshot"] is False and quarter["nutrition"]["avg_calories"] == 1050
+
+    assert len(month["weight"]["all_entries"]) == 1 and month["activity"]["activities"] == []  # short: rows too
+    week = client.get("/api/weekly-report", params={"date": "2025-02-05"}).json()
+    assert week["period"] == "2025-01-30 to 2025-02-05" and week["period_type"] == "week"
+    assert client.get("/api/reports/custom", params={"start": "2025-02-05", "end": "2025-02-01"}).status_code == 400
+    assert client.get("/api/reports/fortnight").status_code == 400
+
+
+def test_digest_mode_keeps_aggregates_and_drops_raw_rows_to_fit_budget(client):
+    entries = [{"name": f"Meal {i % 4}", "calories": 500 + 40 * i, "protein_g": 30,
+                "logged_at": f"2025-03-{1 + i // 3:02d}T{8 + i % 3 * 5:02d}:00:00"} for i in range(60)]
+    client.post("/api/food/batch", json={"entries": entries})
+    client.post("/api/food", json={"name": "Feast", "calories": 4000, "logged_at": "2025-03-05T20:00:00"})
+    client.post("/api/health", json={"systolic_bp": 150, "diastolic_bp": 95, "measured_at": "2025-03-06T08:00:00"})
+
+    roomy = client.get("/api/reports/month", params={"date": "2025-03-10", "format": "digest",
+                                                     "max_tokens": 5000}).json()
+    assert roomy["omitted"] == [] and len(roomy["days"]) == 20
+    assert roomy["top_foods"][0][1] == 15
+    assert "2025-03-05: 7060 kcal" in roomy["anomalies"][0]
+    assert any("blood pressure 150/95" in a for a in roomy["anomalies"])
+
+    tight = client.get("/api/reports/month", params={"date": "2025-03-10", "format": "digest",
+                                                     "max_tokens": 250}).json()
+    assert tight["omitted"][:2] == ["activities", "days"]
+    assert tight["approx_tokens"] <= 250 and tight["avg"] == roomy["avg"]
+    assert "vs_previous" in tight
+
+    # Longer periods: anomalies from filtered queries, no raw rows to drop
+    quarter = client.get("/api/reports/quarter", params={"date": "2025-03-10", "format": "digest",
+                                                         "max_tokens": 5000}).json()
+    assert quarter["omitted"] == ["activities", "weights"] and quarter["anomalies"] == roomy["anomalies"]
+
+    daily = client.get("/api/daily-summary", params={"date": "2025-03-05", "format": "digest"}).json()
+    assert daily["intake"]["calories"] == 4000 + sum(e["calories"] for e in entries[12:15])
+    assert "over_calorie_goal" in daily["flags"] and len(daily["entries"]) == 4
+
+
+def test_range_endpoints_page_with_cursors_and_project_fields(client):
+    client.post("/api/food/batch", json={"entries": [
+        {"name": f"Snack {i}", "calories": 100 + i, "logged_at": f"2025-04-{1 + i // 4:02d}T{8 + i % 4:02d}:00:00"}
+        for i in range(10)
+    ]})
+    params = {"start": "2025-04-01", "end": "2025-04-03", "limit": 4, "fields": "name,calories"}
+    names, cursor = [], None
+    while True:
+        page = client.get("/api/food/range", params=dict(params, cursor=cursor) if cursor else params).json()
+        assert set(page["entries"][0]) == {"id", "name", "calories"}
+        names += [e["name"] for e in page["entries"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert names == [f"Snack {i}" for i in range(10)]
+
+    weights = client.get("/api/weight", params={"limit": 1}).json()
+    assert weights["count"] == 1 and weights["next_cursor"] is None
+
+    assert client.get("/api/food/range", params=dict(params, cursor="bogus")).status_code == 400
+    for key in ('["2026-01-01","x",1]', '[1,2,3]', '["2026-01-01",1.5,1]', '["2026-01-01",1,null]'):
+        forged = base64.urlsafe_b64encode(key.encode()).decode()
+        assert client.get("/api/food/range", params=dict(params, cursor=forged)).status_code == 400, key
+    assert client.get("/api/food/range", params=dict(params, fields="name,secret")).status_code == 400
+    assert client.get("/api/food/range", params=dict(params, start="April")).status_code == 400
+
+
+def test_dashboard_tabs_bundle_sections_from_one_snapshot(client):
+    client.post("/api/food", json={"name": "Oats", "calories": 350, "logged_at": "2025-05-02T08:00:00"})
+    client.put("/api/coaching/daily", json={"coaching_date": "2025-05-02", "coaching_text": "More protein"})
+
+    overview = client.get("/api/dashboard/overview", params={"date": "2025-05-02"}).json()
+    assert set(overview) == {"tab", "date", "summary", "gamification", "coaching", "often_used"}
+    assert overview["summary"] == client.get("/api/daily-summary", params={"date": "2025-05-02"}).json()
+    assert overview["gamification"] == client.get("/api/gamification").json()
+    assert overview["coaching"]["coaching"]["coaching_text"] == "More protein"
+    assert overview["often_used"]["count"] == 0
+
+    picked = client.get("/api/dashboard/overview", params={"fields": "gamification,profile"}).json()
+    assert set(picked) == {"tab", "date", "gamification", "profile"}
+    assert picked["profile"]["profile"]["age"] == 30
+
+    charts = client.get("/api/dashboard/charts", params={"days": 14}).json()
+    assert len(charts["daily_totals"]["daily_totals"]) == 14 and charts["weight"]["count"] == 1
+
+    assert client.get("/api/dashboard/overview", params={"fields": "summary,secrets"}).status_code == 400
+    assert client.get("/api/dashboard/settings").status_code == 404
+
+
+def test_operation_batch_runs_handlers_in_one_transaction(client):
+    ops = [
+        {"op": "log_food", "body": {"name": "Eggs", "calories": 300, "protein_g": 20, "logged_at": "2025-06-01T08:00:00"}},
+        {"op": "log_activity", "body": {"activity_type": "Run", "calories_burned": 250, "performed_at": "2025-06-01T09:00:00"}},
+        {"op": "get_daily_summary", "params": {"date": "2025-06-01", "format": "digest"}},
+        {"op": "update_daily_coaching", "body": {"coaching_date": "2025-06-01", "coaching_text": "Good start"}},
+    ]
+    batch = client.post("/api/batch", json={"operations": ops}).json()
+    assert [r["status"] for r in batch["results"]] == [200] * 4 and batch["failed"] == 0
+    summary = batch["results"][2]["result"]
+    assert summary["intake"]["calories"] == 300 and summary["activity"]["kcal_burned"] == 250
+
+    # Atomic by default: a failing operation undoes the ones before it
+    failing = [ops[0], {"op": "delete_food", "params": {"entry_id": "not-a-number"}}]
+    response = client.post("/api/batch", json={"operations": failing})
+    assert response.status_code == 422 and response.json()["detail"]["failed_index"] == 1
+    assert client.get("/api/food", params={"date": "2025-06-01"}).json()["count"] == 1
+
+    # Non-atomic: only the failed operation is rolled back
+    partial = client.post("/api/batch", json={"operations": [
+        ops[0], {"op": "update_food", "params": {"entry_id": 9999}, "body": {"name": "Ghost"}},
+    ], "atomic": False}).json()
+    assert [r["status"] for r in partial["results"]] == [200, 404] and partial["failed"] == 1
+    assert client.get("/api/food", params={"date": "2025-06-01"}).json()["count"] == 2
+
+    assert client.post("/api/batch", json={"operations": [{"op": "drop_tables"}]}).status_code == 400
+
+
+def test_metrics_and_server_timing_label_requests_by_route(client):
+    def sample(series):
+        lines = [l for l in client.get("/metrics").text.splitlines() if l.startswith(series + " ")]
+        return float(lines[0].split()[-1]) if lines else 0.0
+
+    range_series = 'nutritrack_http_requests_total{method="GET",route="/api/food/range",status="200"}'
+    delete_series = 'nutritrack_http_request_db_seconds_count{method="DELETE",route="/api/food/{entry_id}"}'
+    before = sample(range_series), sample(delete_series)
+    writes_before = sample("nutritrack_write_jobs_total"), sample("nutritrack_write_failed_total")
+
+    client.post("/api/food", json={"name": "Oats", "calories": 350, "logged_at": "2026-01-01T08:00:00"})
+    response = client.get("/api/food/range", params={"start": "2026-01-01", "end": "2026-01-01"})
+    timing = {m.split(";")[0].strip(): m.split(";")[1:] for m in response.headers["server-timing"].split(",")}
+    assert set(timing) == {"db", "compute", "serialize", "total"}
+    assert float(timing["db"][0].removeprefix("dur=")) > 0
+    assert timing["db"][1].endswith(' queries"')
+    client.delete("/api/food/999999")
+    client.delete("/api/food/999998")
+
+    assert (sample(range_series), sample(delete_series)) == (before[0] + 1, before[1] + 2)
+    # Writes go through the writer thread; a 404 update is rolled back and counted as failed
+    assert client.put("/api/food/999999", json={"name": "Oats", "calories": 1}).status_code == 404
+    assert sample("nutritrack_write_jobs_total") == writes_before[0] + 4
+    assert sample("nutritrack_write_failed_total") == writes_before[1] + 1
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "nutritrack_http_requests_in_flight 1" in metrics.text  # the /metrics request itself
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+
+def test_debug_endpoints_need_token_and_profile_workers(client, monkeypatch, tmp_path):
+    import pstats
+    assert client.get("/debug/profile", params={"seconds": 0.1}).status_code == 404
+    monkeypatch.setattr(nutritrack.profiling, "DEBUG_TOKEN", "s3cret")
+    assert client.get("/debug/profile", params={"seconds": 0.1}).status_code == 403
+    auth = {"Authorization": "Bearer s3cret"}
+
+    collapsed = client.get("/debug/profile", params={"seconds": 0.2, "idle": True}, headers=auth)
+    assert collapsed.status_code == 200 and int(collapsed.headers["x-profile-samples"]) > 0
+    stack, count = collapsed.text.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+    dump = client.get("/debug/profile", params={"seconds": 0.2, "idle": True, "format": "pstats"}, headers=auth)
+    (tmp_path / "out.pstats").write_bytes(dump.content)
+    assert pstats.Stats(str(tmp_path / "out.pstats")).total_calls > 0
+
+    assert client.get("/debug/tracemalloc", headers=auth).status_code == 409
+    assert client.post("/debug/tracemalloc/start", headers=auth).json()["tracing"] is True
+    try:
+        kept = [bytearray(1024) for _ in range(2000)]
+        top = client.get("/debug/tracemalloc", params={"limit": 5}, headers=auth).json()["top"]
+        assert top[0]["location"].startswith("test_api.py:") and top[0]["size_diff_kib"] >= 2000
+    finally:
+        assert client.post("/debug/tracemalloc/stop", headers=auth).json()["tracing"] is False
+    del kept
+
+
+def test_startup_seeds_demo_data_when_configured(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    monkeypatch.setenv("SEED_DEMO_DATA", "true")
+    with TestClient(nutritrack.app) as c:
+        assert c.get("/healthz").json() == {"status": "ok"}
+        assert c.get("/api/profile").json()["profile"] is not None
+        assert c.get("/api/history/daily-totals", params={"days": 7}).status_code == 200
+    database.close_pool()
+
+
+def test_reads_hand_derived_state_writes_to_the_writer(client, monkeypatch):
+    monkeypatch.setattr(nutritrack.response_cache, "max_entries", 0)
+    yesterday = (nutritrack.local_today() - nutritrack.timedelta(days=1)).isoformat()
+    client.post("/api/food", json={"name": "Oats", "calories": 350, "logged_at": f"{yesterday}T08:00:00"})
+    jobs = nutritrack.writer.stats["jobs"]
+    assert client.get("/api/gamification").json()["streak_days"] == 1
+    assert nutritrack.writer.stats["jobs"] == jobs + 1  # streak evaluation ran as a writer job
+    client.get("/api/gamification")
+    client.get("/api/reports/month", params={"date": "2020-01-15"})  # closed: snapshot stored by the writer
+    assert nutritrack.writer.stats["jobs"] == jobs + 2
+    assert client.get("/api/reports/month", params={"date": "2020-01-15"}).json()["snapshot"] is True
@@ -0,0 +1,39 @@
+import app as nutritrack
+import benchmark
+import database
+
+
+def test_benchmark_run_reports_every_endpoint_and_flags_regressions(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", database.DB_PATH)
+    monkeypatch.setattr(nutritrack.response_cache, "max_entries", nutritrack.response_cache.max_entries)
+    try:
+        results = benchmark.run_benchmark(days=21, iterations=3, clients=2, duration=0.3,
+                                          db_path=str(tmp_path / "bench.db"))
+    finally:
+        database.close_pool()
+
+    assert results["dataset"]["rows"]["food"] > 21 * 3 * 0.8
+    assert set(results["latency"]) == set(benchmark.ENDPOINTS)
+    assert all(s["requests"] == 3 and s["errors"] == 0 for s in results["latency"].values())
+    assert results["load"]["requests"] > 0 and results["load"]["errors"] == 0
+
+    assert benchmark.compare(results, results) == []
+
+
+def test_compare_flags_slower_p95_lower_throughput_and_new_errors():
+    base = {"requests": 100, "errors": 0, "p95_ms": 10.0, "rps": 200.0}
+    baseline = {"latency": {"search": base, "export": base}, "load": dict(base, endpoints={"search": base})}
+    results = {
+        "latency": {"search": dict(base, p95_ms=12.0, rps=170.0), "export": dict(base, p95_ms=14.0)},
+        "load": dict(base, rps=100.0, endpoints={"search": dict(base, errors=2)}),
+    }
+    assert [line.split(":")[0] for line in benchmark.compare(results, baseline)] == [
+        "latency/export", "load/all", "load/search"]
+    assert len(benchmark.compare(results, baseline, tolerance=0.1)) == 5
+
+
+def test_percentile_interpolates_between_ranks():
+    assert benchmark.percentile([], 95) == 0.0
+    assert benchmark.percentile([10.0], 99) == 10.0
+    assert benchmark.percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50) == 3.0
+    assert benchmark.percentile([0.0, 10.0], 95) == 9.5
@@ -0,0 +1,250 @@
+import sqlite3
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "nutritrack.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    yield path
+    database.close_pool()
+
+
+def test_pool_reuses_configured_connections(db_path):
+    conn = database.get_db()
+    first_id = id(conn)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    conn.close()
+    conn.close()  # double close is a no-op
+
+    conn = database.get_db()
+    assert id(conn) == first_id
+    conn.close()
+
+
+def test_pool_rolls_back_uncommitted_work_on_release(db_path):
+    conn = database.get_db()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+
+    conn = database.get_db()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn.close()
+
+
+def test_pool_is_bounded(db_path):
+    pool = database.ConnectionPool(db_path, size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+    conn.close()
+    pool.acquire().close()
+    pool.close()
+
+
+def test_invalid_pragma_profile_is_rejected():
+    with pytest.raises(ValueError):
+        database._pragma_statements({"synchronous": "SOMETIMES"})
+
+
+def _rollup(conn):
+    rows = conn.execute("SELECT * FROM daily_totals ORDER BY day").fetchall()
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in r) for r in rows]
+
+
+def test_daily_totals_follow_writes_and_match_rebuild(db_path):
+    database.init_db()
+    conn = database.get_db()
+    conn.executemany(
+        "INSERT INTO food_entries (name, calories, protein_g, carbs_g, fat_g, logged_at) VALUES (?,?,?,?,?,?)",
+        [("Oats", 350.5, 12, 58, 8, "2026-01-01T08:00:00"),
+         ("Salad", 450.1, 40, 15, 25, "2026-01-01T12:00:00"),
+         ("Soup", 300, 10, 30, 9, "2026-01-02 19:00:00")],
+    )
+    conn.execute(
+        "INSERT INTO sport_activities (activity_type, duration_minutes, calories_burned, performed_at) "
+        "VALUES ('Running', 30, 350, '2026-01-02T07:00:00')"
+    )
+    conn.execute("UPDATE food_entries SET calories = 500, logged_at = '2026-01-03T08:00:00' WHERE name = 'Oats'")
+    conn.execute("DELETE FROM food_entries WHERE name = 'Soup'")
+    conn.commit()
+
+    day = database.get_day_totals(conn, "2026-01-01")
+    assert day["food_count"] == 1 and round(day["calories"], 1) == 450.1
+    day = database.get_day_totals(conn, "2026-01-02")
+    assert day["food_count"] == 0 and day["calories"] == 0 and day["calories_burned"] == 350
+    assert database.get_day_totals(conn, "2026-01-05")["food_count"] == 0
+
+    maintained = _rollup(conn)
+    database.rebuild_daily_totals(conn)
+    assert _rollup(conn) == maintained
+    conn.close()
+
+
+def test_migrations_are_versioned_and_preserve_data(db_path):
+    import migrations
+
+    database.init_db()
+    conn = database.get_db()
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert migrations.pending(conn) == []
+    conn.execute("INSERT INTO often_used_foods (name, calories) VALUES ('Banana', 105)")
+    conn.commit()
+    conn.close()
+
+    database.init_db()  # restart: no-op, curated list survives
+    conn = database.get_db()
+    assert conn.execute("SELECT COUNT(*) FROM often_used_foods").fetchone()[0] == 1
+    conn.close()
+
+
+def test_migrations_upgrade_unversioned_database(db_path):
+    import migrations
+
+    legacy = sqlite3.connect(db_path)
+    legacy.executescript("""
+        CREATE TABLE user_profile (id INTEGER PRIMARY KEY AUTOINCREMENT, age INTEGER NOT NULL,
+            sex TEXT NOT NULL, height_cm REAL NOT NULL, current_weight_kg REAL NOT NULL,
+            activity_level TEXT NOT NULL DEFAULT 'moderate', weight_goal_kg REAL,
+            calorie_deficit INTEGER NOT NULL DEFAULT 500, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE food_entries (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+            calories REAL NOT NULL DEFAULT 0, protein_g REAL NOT NULL DEFAULT 0,
+            carbs_g REAL NOT NULL DEFAULT 0, fat_g REAL NOT NULL DEFAULT 0,
+            meal_type TEXT DEFAULT 'snack', quantity TEXT, notes TEXT,
+            logged_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO user_profile (age, sex, height_cm, current_weight_kg) VALUES (30, 'male', 180, 80);
+        INSERT INTO food_entries (name, calories, logged_at) VALUES ('Oats', 350, '2026-01-01T08:00:00');
+        INSERT INTO food_entries (name, calories, logged_at, created_at) VALUES ('Tea', 5, 'yesterday', '2026-01-03 10:00:00');
+    """)
+    legacy.close()
+
+    database.init_db()
+    conn = database.get_db()
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert {"goal_mode", "calorie_surplus"} <= migrations.column_names(conn, "user_profile")
+    assert database.get_day_totals(conn, "2026-01-01")["calories"] == 350
+
+    # An unreadable timestamp became the row's write time; none can be stored any more
+    tea = conn.execute("SELECT logged_at, notes, epoch FROM food_entries WHERE name = 'Tea'").fetchone()
+    assert tuple(tea) == ("2026-01-03T10:00:00Z", "[timestamp was 'yesterday']", 1767434400)
+    with pytest.raises(sqlite3.IntegrityError, match="invalid timestamp"):
+        conn.execute("INSERT INTO weight_logs (weight_kg, measured_at) VALUES (80, '2025-13-01T07:00:00')")
+    with pytest.raises(sqlite3.IntegrityError, match="invalid timestamp"):
+        conn.execute("UPDATE food_entries SET logged_at = 'tomorrow' WHERE name = 'Oats'")
+
+    # So every row has a key, and paging one row at a time reaches them all
+    from pagination import fetch_page
+    seen, cursor = [], None
+    while True:
+        page = fetch_page(conn, "food_entries", cursor=cursor, limit=1)
+        seen += [e["name"] for e in page["entries"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["Oats", "Tea"]
+    conn.close()
+
+
+def test_daily_goals_are_memoized_and_range_matches_single_day():
+    profile = {"age": 30, "sex": "female", "height_cm": 165, "current_weight_kg": 62,
+               "activity_level": "light", "goal_mode": "surplus", "calorie_surplus": 250}
+    database.clear_goal_cache()
+    goals = database.calculate_daily_goals(profile, 300)
+    goals["calorie_goal"] = 0  # callers get their own copy
+    again = database.calculate_daily_goals(database.ProfileSnapshot.from_profile(profile), 300)
+    assert again["calorie_goal"] == round(database.calculate_tdee(
+        database.calculate_bmr(62, 165, 30, "female"), "light") + 300 + 250, 1)
+    assert database._cached_goals.cache_info().hits == 1
+
+    burned = [0, 150.5, 600]
+    goal_range = database.calculate_daily_goals_range(profile, burned)
+    for i, activity in enumerate(burned):
+        single = database.calculate_daily_goals(profile, activity)
+        assert [goal_range[k][i] for k in ("calorie_goal", "protein_goal_g", "carbs_goal_g", "fat_goal_g")] == \
+            [single[k] for k in ("calorie_goal", "protein_goal_g", "carbs_goal_g", "fat_goal_g")]
+
+
+def test_profile_cache_follows_writes_from_any_connection(db_path):
+    database.init_db()
+    reader, writer = database.get_db(), database.get_db()
+    assert database.get_active_profile(reader) is None
+    writer.execute("INSERT INTO user_profile (age, sex, height_cm, current_weight_kg) VALUES (30, 'male', 180, 80)")
+    writer.commit()
+    assert database.get_active_profile(reader)["current_weight_kg"] == 80
+
+    # Unchanged database: served without reading user_profile again
+    cache = reader._pool.profile_cache
+    cached = cache._profile
+    assert database.get_active_profile(reader) == cached and cache._profile is cached
+
+    # Own writes, other connections' writes and other processes all bump the generation row
+    reader.execute("UPDATE user_profile SET current_weight_kg = 79")
+    reader.commit()
+    assert database.get_active_profile(reader)["current_weight_kg"] == 79
+    other_process = sqlite3.connect(db_path)
+    other_process.execute("UPDATE user_profile SET current_weight_kg = 78")
+    other_process.commit()
+    other_process.close()
+    assert database.get_active_profile(writer)["current_weight_kg"] == 78
+    assert database.get_active_profile(reader)["current_weight_kg"] == 78
+    reader.close()
+    writer.close()
+
+
+def test_local_day_and_epoch_follow_the_configured_time_zone(db_path, monkeypatch):
+    import local_time
+
+    monkeypatch.setattr(local_time, "TIMEZONE", "Europe/Berlin")
+    database.init_db()
+    conn = database.get_db()
+    conn.executemany("INSERT INTO food_entries (name, calories, logged_at) VALUES (?, ?, ?)", [
+        ("Summer lunch", 600, "2026-07-01 12:00:00"),           # naive = Berlin wall time (CEST)
+        ("Late snack", 200, "2026-01-01T23:30:00Z"),            # UTC, already Jan 2 in Berlin
+        ("Breakfast", 400, "2026-01-02T08:00:00.123456"),
+    ])
+    conn.commit()
+    rows = {r["name"]: r for r in conn.execute("SELECT name, epoch, local_day FROM food_entries")}
+    assert rows["Summer lunch"]["epoch"] == 1782900000  # 10:00 UTC
+    assert rows["Late snack"]["local_day"] == "2026-01-02"
+    assert database.get_day_totals(conn, "2026-01-02")["calories"] == 600
+    assert local_time.local_day("2026-01-01T23:30:00Z") == "2026-01-02"
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM food_entries WHERE local_day BETWEEN ? AND ? ORDER BY local_day, epoch",
+        ("2026-01-01", "2026-01-07")))
+    assert "idx_food_local_day" in plan and "TEMP B-TREE" not in plan
+    conn.close()
+
+    # Switching zones re-derives every day and the rollup on the next start
+    monkeypatch.setattr(local_time, "TIMEZONE", "America/New_York")
+    database.init_db()
+    conn = database.get_db()
+    assert conn.execute("SELECT local_day FROM food_entries WHERE name = 'Late snack'").fetchone()[0] == "2026-01-01"
+    assert database.get_day_totals(conn, "2026-01-02")["calories"] == 400
+    conn.close()
+
+
+def test_offsets_are_recomputed_only_when_zone_or_tzdata_changes(db_path, monkeypatch):
+    import local_time
+
+    monkeypatch.setattr(local_time, "TIMEZONE", "Europe/Berlin")
+    database.init_db()
+    conn = database.get_db()
+    computed = []
+    periods = local_time.offset_periods
+    monkeypatch.setattr(local_time, "offset_periods", lambda: computed.append(1) or periods())
+    assert local_time.sync_timezone(conn) is False and computed == []  # a plain restart
+
+    monkeypatch.setattr(local_time, "_tzdata_version", lambda: "2099a")
+    assert local_time.sync_timezone(conn) is False and computed == [1]  # same offsets, new release noted
+    assert "2099a" in conn.execute("SELECT value FROM settings WHERE key = 'timezone'").fetchone()[0]
+    assert local_time.sync_timezone(conn) is False and computed == [1]
+
+    monkeypatch.setattr(local_time, "TIMEZONE", "Asia/Tokyo")
+    assert local_time.sync_timezone(conn) is True
+    conn.close()
@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+from events import EventHub, format_sse
+
+
+def test_hub_fans_out_thread_publishes_and_resyncs_slow_subscribers():
+    async def scenario():
+        hub = EventHub(queue_size=2)
+        fast, slow = hub.subscribe(), hub.subscribe()
+
+        await asyncio.to_thread(hub.publish, "entry", kind="food", action="created", ids=[1])
+        await asyncio.sleep(0)
+        event_id, type, data = await fast.get()
+        assert (type, json.loads(data)["ids"]) == ("entry", [1])
+        assert format_sse(event_id, type, data).startswith(f"id: {event_id}\nevent: entry\n")
+
+        for i in range(3):  # overflows the slow subscriber's queue
+            hub.publish("day_totals", day=f"2026-01-0{i + 1}")
+        await asyncio.sleep(0)
+        assert [slow.get_nowait()[1] for _ in range(slow.qsize())] == ["resync", "day_totals"]
+
+        # Reconnecting clients replay what they missed, or resync if that is too much
+        def drain(queue):
+            return [queue.get_nowait()[1:] for _ in range(queue.qsize())]
+
+        assert drain(hub.subscribe(last_event_id=event_id + 2)) == [("day_totals", '{"day": "2026-01-03"}')]
+        assert [type for type, _ in drain(hub.subscribe(last_event_id=event_id))] == ["resync"]
+
+    asyncio.run(scenario())
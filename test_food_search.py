@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+import database
+import food_search
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    database.init_db()
+    conn = database.get_db()
+    yield conn
+    conn.close()
+    database.close_pool()
+
+
+def _log(conn, name, day, calories=100, quantity=None, notes=None):
+    conn.execute("INSERT INTO food_entries (name, calories, quantity, notes, logged_at) VALUES (?, ?, ?, ?, ?)",
+                 (name, calories, quantity, notes, f"{day}T12:00:00"))
+
+
+def _catalog(conn):
+    return [tuple(r) for r in conn.execute(
+        "SELECT key, name, calories, quantity, notes, times_logged, last_logged FROM food_catalog ORDER BY key")]
+
+
+def test_catalog_follows_writes_and_matches_rebuild(conn):
+    _log(conn, "Chicken breast", "2026-01-01", 165)
+    _log(conn, "chicken breast ", "2026-01-03", 170, "150g")
+    _log(conn, "Greek yogurt", "2026-01-02", 100, notes="with honey")
+    conn.execute("UPDATE food_entries SET name = 'Greek yoghurt' WHERE name = 'Greek yogurt'")
+    conn.execute("DELETE FROM food_entries WHERE calories = 170")
+    conn.commit()
+
+    incremental = _catalog(conn)
+    assert incremental == [
+        ("chicken breast", "Chicken breast", 165, None, None, 1, "2026-01-01T12:00:00"),
+        ("greek yoghurt", "Greek yoghurt", 100, None, "with honey", 1, "2026-01-02T12:00:00"),
+    ]
+    food_search.rebuild_food_catalog(conn)
+    assert _catalog(conn) == incremental
+
+
+def test_search_matches_prefixes_collapses_duplicates_and_ranks_by_use(conn):
+    for day in range(1, 8):
+        _log(conn, "Chicken breast", f"2026-01-0{day}", 165)
+    _log(conn, "chicken thigh", "2026-01-01", 210)
+    _log(conn, "Chickpea salad", "2025-06-01", 320)
+    _log(conn, "Oats", "2026-01-05", 150, notes="with chicory coffee")
+    conn.commit()
+
+    results = food_search.search_foods(conn, "chic", today=date(2026, 1, 8))
+    assert [r["name"] for r in results][:3] == ["Chicken breast", "chicken thigh", "Chickpea salad"]
+    assert results[0]["times_logged"] == 7
+    assert {r["name"] for r in results} == {"Chicken breast", "chicken thigh", "Chickpea salad", "Oats"}
+    assert [r["name"] for r in food_search.search_foods(conn, "chick th")] == ["chicken thigh"]
+    assert food_search.search_foods(conn, "  %  ") == []
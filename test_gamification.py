@@ -0,0 +1,103 @@
+from datetime import date
+
+import pytest
+
+import database
+import gamification
+
+PROFILE = {
+    "age": 30, "sex": "male", "height_cm": 180, "current_weight_kg": 80,
+    "activity_level": "moderate", "calorie_deficit": 500, "goal_mode": "deficit", "calorie_surplus": 300,
+}
+TODAY = date(2026, 1, 10)
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    database.init_db()
+    conn = database.get_db()
+    yield conn
+    conn.close()
+    database.close_pool()
+
+
+def _log(conn, day, calories):
+    conn.execute("INSERT INTO food_entries (name, calories, logged_at) VALUES ('Meal', ?, ?)",
+                 (calories, f"{day}T12:00:00"))
+    conn.commit()
+
+
+def test_streaks_advance_incrementally_and_follow_late_edits(conn):
+    for day in range(1, 10):
+        _log(conn, f"2026-01-0{day}", 4000 if day == 4 else 1500)
+    assert gamification.refresh_streaks(conn, PROFILE, TODAY)["current_run"] == 5  # Jan 5-9
+
+    state = gamification.refresh_streaks(conn, PROFILE, TODAY)
+    assert (state["current_run"], state["best_run"], state["dirty_from"]) == (5, 5, None)
+
+    # Editing a closed day flags it and re-evaluates only from there
+    conn.execute("DELETE FROM food_entries WHERE logged_at LIKE '2026-01-04%'")
+    conn.commit()
+    assert conn.execute("SELECT dirty_from FROM streak_state").fetchone()[0] == "2026-01-04"
+    state = gamification.refresh_streaks(conn, PROFILE, TODAY)
+    assert (state["current_run"], state["best_run"]) == (5, 5)  # a day without food breaks the run
+
+    _log(conn, "2026-01-04", 1500)
+    state = gamification.refresh_streaks(conn, PROFILE, TODAY)
+    assert (state["current_run"], state["best_run"]) == (9, 9)
+
+    # A day closing extends the stored run; a profile change re-evaluates everything
+    _log(conn, "2026-01-10", 1500)
+    state = gamification.refresh_streaks(conn, PROFILE, date(2026, 1, 11))
+    assert (state["current_run"], state["last_evaluated_day"]) == (10, "2026-01-10")
+    strict = dict(PROFILE, calorie_deficit=1000, current_weight_kg=50)
+    state = gamification.refresh_streaks(conn, strict, date(2026, 1, 11))
+    assert (state["current_run"], state["best_run"]) == (0, 0)
+
+
+def test_xp_ledger_books_days_once_corrects_edits_and_awards_badges(conn, monkeypatch):
+    for day in range(1, 10):
+        _log(conn, f"2026-01-0{day}", 1500)
+    gamification.refresh_streaks(conn, PROFILE, TODAY)
+    summary = gamification.xp_summary(conn)
+    assert [b["id"] for b in summary["badges"]] == ["streak_3", "streak_7"]
+    assert summary["badges"][1]["earned_on"] == "2026-01-07"
+    day_xp = conn.execute("SELECT SUM(xp) FROM xp_ledger WHERE kind = 'day'").fetchone()[0]
+    assert summary["total_xp"] == day_xp + 150
+
+    # Re-reading books nothing; an edit to a closed day appends a correction
+    gamification.refresh_streaks(conn, PROFILE, TODAY)
+    assert gamification.xp_summary(conn)["total_xp"] == summary["total_xp"]
+    conn.execute("DELETE FROM food_entries WHERE logged_at LIKE '2026-01-02%'")
+    conn.commit()
+    gamification.refresh_streaks(conn, PROFILE, TODAY)
+    correction = conn.execute("SELECT day, kind, xp FROM xp_ledger ORDER BY id DESC LIMIT 1").fetchone()
+    assert tuple(correction) == ("2026-01-02", "correction", -conn.execute(
+        "SELECT xp FROM xp_ledger WHERE day = '2026-01-02' AND kind = 'day'").fetchone()[0])
+    total = gamification.xp_summary(conn)["total_xp"]
+    assert total == conn.execute("SELECT SUM(xp) FROM xp_ledger").fetchone()[0]
+
+    # Earned badges are kept incrementally; a rebuild replays the current rules
+    assert len(gamification.xp_summary(conn)["badges"]) == 2
+    monkeypatch.setattr(gamification.writer, "run", None)  # the CLI rebuild never queues writer jobs
+    rebuilt = gamification.rebuild_gamification(conn, PROFILE, TODAY)
+    assert [b["id"] for b in rebuilt["badges"]] == ["streak_3", "streak_7"]
+    assert rebuilt["total_xp"] == total
+    assert conn.execute("SELECT COUNT(*) FROM xp_ledger WHERE kind = 'correction'").fetchone()[0] == 0
+
+
+def test_malformed_days_are_never_scored(conn):
+    for day in range(1, 10):
+        _log(conn, f"2026-01-0{day}", 1500)
+    # Rows written around the triggers (another SQLite client, an old build)
+    conn.execute("INSERT INTO daily_totals (day, calories, food_count) VALUES ('2025-13-01', 900, 1)")
+    conn.execute("INSERT INTO daily_totals (day, calories, food_count) VALUES ('2026-01-0x', 900, 1)")
+    conn.commit()
+    state = gamification.refresh_streaks(conn, PROFILE, TODAY)
+    assert (state["current_run"], state["best_run"]) == (9, 9)
+    assert conn.execute("SELECT COUNT(*) FROM streak_days WHERE date(day) IS NOT day").fetchone()[0] == 0
+
+    conn.execute("UPDATE streak_state SET last_evaluated_day = '2026-00-15'")
+    conn.commit()
+    assert gamification.refresh_streaks(conn, PROFILE, TODAY)["current_run"] == 9
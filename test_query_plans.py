@@ -0,0 +1,119 @@
+import re
+from datetime import date
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+import app as nutritrack
+import database
+import seed
+
+# Tables that grow with every day of use; a statement may only walk all of
+# them when it is bounded (an index-ordered read with LIMIT and no sort).
+LARGE_TABLES = ("food_entries", "weight_logs", "sport_activities", "health_measurements", "heart_rate_samples")
+
+# Whole-table reads by design: the unbounded export stream and its emptiness probe
+FULL_SCAN_ALLOWED = (
+    re.compile(r"^SELECT EXISTS \(SELECT \* FROM \w+ ORDER BY local_day, epoch\)$"),
+    re.compile(r"^SELECT \* FROM \w+ ORDER BY local_day, epoch$"),
+)
+
+# Every GET route must be listed here (or in UNAUDITED), so new endpoints get audited too
+GET_REQUESTS = {
+    "/": [],
+    "/api/profile": ["/api/profile"],
+    "/api/food": ["/api/food", "/api/food?date=2026-03-01"],
+    "/api/food/search": ["/api/food/search?q=chick", "/api/food/search?q=grilled%20chicken"],
+    "/api/food/history/frequent": ["/api/food/history/frequent"],
+    "/api/food/often-used": ["/api/food/often-used"],
+    "/api/food/range": ["/api/food/range?start=2026-02-01&end=2026-02-28&limit=20",
+                        "/api/food/range?start=2026-02-01&end=2026-02-28&fields=name,calories"],
+    "/api/weight": ["/api/weight", "/api/weight?start=2026-02-01&end=2026-02-28"],
+    "/api/activity": ["/api/activity", "/api/activity?date=2026-03-01"],
+    "/api/activity/range": ["/api/activity/range?start=2026-02-01&end=2026-02-28"],
+    "/api/health": ["/api/health", "/api/health?start=2026-02-01&end=2026-02-28"],
+    "/api/daily-summary": ["/api/daily-summary", "/api/daily-summary?date=2026-03-01&format=digest"],
+    "/api/coaching": ["/api/coaching"],
+    "/api/coaching/daily": ["/api/coaching/daily"],
+    "/api/coaching/reports": ["/api/coaching/reports"],
+    "/api/coaching/reports/latest": ["/api/coaching/reports/latest"],
+    "/api/weekly-report": ["/api/weekly-report"],
+    "/api/reports/{period}": ["/api/reports/month?date=2026-02-15", "/api/reports/year?format=digest",
+                              "/api/reports/custom?start=2026-01-01&end=2026-02-15"],
+    "/api/history/daily-totals": ["/api/history/daily-totals?days=60"],
+    "/api/gamification": ["/api/gamification"],
+    "/api/dashboard/{tab}": [f"/api/dashboard/{tab}" for tab in nutritrack.DASHBOARD_TABS],
+    "/api/export/csv": ["/api/export/csv?type=food", "/api/export/csv?type=health&start=2026-02-01&end=2026-02-28",
+                        "/api/export/csv?type=weight&format=ndjson"],
+}
+UNAUDITED = {"/api/events", "/metrics", "/healthz", "/api/cache/stats", "/debug/profile", "/debug/tracemalloc"}  # no user-data queries
+
+
+@pytest.fixture
+def traced(tmp_path, monkeypatch):
+    """Client over a seeded database, plus every statement run (with parameters bound)."""
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    monkeypatch.setattr(nutritrack.response_cache, "max_entries", 0)
+    statements = []
+    connect = database.ConnectionPool._connect
+
+    def traced_connect(self):
+        conn = connect(self)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(database.ConnectionPool, "_connect", traced_connect)
+    with TestClient(nutritrack.app) as client:
+        conn = database.get_db()
+        seed.generate(conn, 90, end=date(2026, 3, 31), heart_rate_interval=3600)
+        conn.close()
+        statements.clear()
+        yield client, statements
+    database.close_pool()
+
+
+def full_scans(conn, sql: str) -> list:
+    """Plan steps of sql that read a whole large table without a bound."""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    bounded = re.search(r"\bLIMIT\b", sql, re.I) and not any("TEMP B-TREE FOR ORDER BY" in p for p in plan)
+    return [step for step in plan
+            if (m := re.match(r"SCAN (\w+)", step)) and m.group(1) in LARGE_TABLES
+            and not (bounded and "INDEX" in step)]
+
+
+def test_every_route_query_uses_an_index_on_large_tables(traced):
+    client, statements = traced
+    routes = {r.path for r in nutritrack.app.routes if isinstance(r, APIRoute) and "GET" in r.methods}
+    assert routes - UNAUDITED == set(GET_REQUESTS), "add new GET routes to GET_REQUESTS"
+
+    for url in [u for urls in GET_REQUESTS.values() for u in urls]:
+        assert client.get(url).status_code == 200, url
+    def write(method, url, **kwargs):
+        response = client.request(method, url, **kwargs)
+        assert response.status_code == 200, f"{method} {url}: {response.text}"
+        return response.json()
+
+    food = write("POST", "/api/food", json={"name": "Pear", "calories": 60})["entry"]["id"]
+    write("PUT", f"/api/food/{food}", json={"name": "Pear", "calories": 70})
+    write("POST", "/api/food/often-used/add-from-entry", json={"food_entry_id": food})
+    write("DELETE", f"/api/food/{food}")
+    for kind, body in (("weight", {"weight_kg": 80}),
+                       ("activity", {"activity_type": "Run", "duration_minutes": 30, "calories_burned": 300}),
+                       ("health", {"heart_rate": 70})):
+        entry = write("POST", f"/api/{kind}", json=body)["entry"]["id"]
+        if kind != "weight":
+            write("PUT", f"/api/{kind}/{entry}", json=body)
+            write("DELETE", f"/api/{kind}/{entry}")
+    write("PUT", "/api/coaching/daily", json={"coaching_date": "2026-03-31", "coaching_text": "Eat more protein."})
+
+    conn = database.get_db()
+    offenders = {}
+    for flat, sql in {" ".join(s.split()): s for s in statements}.items():
+        if not re.match(r"(SELECT|WITH|UPDATE|DELETE|INSERT)\b", flat, re.I) or any(p.match(flat) for p in FULL_SCAN_ALLOWED):
+            continue
+        scans = full_scans(conn, sql)
+        if scans:
+            offenders[flat] = scans
+    conn.close()
+    assert not offenders, "\n".join(f"{scans}: {sql}" for sql, scans in offenders.items())
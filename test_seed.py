@@ -0,0 +1,70 @@
+from datetime import date
+
+import pytest
+
+import database
+import gamification
+import local_time
+import seed
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    database.init_db()
+    c = database.get_db()
+    yield c
+    c.close()
+    database.close_pool()
+
+
+def dump(conn):
+    """Every generated row, without ids and write times."""
+    return [tuple(v for k, v in zip(r.keys(), r) if k not in ("id", "created_at"))
+            for table in local_time.TIMESTAMP_COLUMNS
+            for r in conn.execute(f"SELECT * FROM {table} ORDER BY id")] + [
+        tuple(conn.execute("SELECT age, sex, height_cm, current_weight_kg, weight_goal_kg FROM user_profile").fetchone())]
+
+
+def test_generate_is_deterministic_and_matches_what_triggers_derive(conn):
+    end = date(2026, 3, 31)  # spans the DST change in zones that have one
+    counts = seed.generate(conn, 60, end=end, heart_rate_interval=300)
+    assert counts["heart_rate"] == 60 * 288
+    assert conn.execute("SELECT COUNT(*) FROM heart_rate_samples").fetchone()[0] == 60 * 288
+    assert conn.execute("SELECT COUNT(*) FROM health_measurements").fetchone()[0] == counts["health"]
+    first = dump(conn)
+    assert seed.generate(conn, 60, end=end, heart_rate_interval=300) == counts
+    assert dump(conn) == first
+    seed.generate(conn, 60, end=end, user=1)
+    assert dump(conn)[-1] != first[-1]
+
+    # Stamps, rollup and catalog equal what the (restored) triggers would produce
+    for table, (_, column) in local_time.TIMESTAMP_COLUMNS.items():
+        assert conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE epoch != {local_time.epoch_sql(column)} "
+            f"OR local_day != {local_time.local_day_sql(column)}"
+        ).fetchone()[0] == 0
+    totals = [tuple(r) for r in conn.execute("SELECT * FROM daily_totals ORDER BY day")]
+    database.rebuild_daily_totals(conn)
+    assert [tuple(r) for r in conn.execute("SELECT * FROM daily_totals ORDER BY day")] == totals
+    assert conn.execute("SELECT COUNT(*) FROM food_catalog").fetchone()[0] > 0
+
+    triggers = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'food_entries'")
+    assert triggers.fetchone()[0] > 0
+    conn.execute("INSERT INTO food_entries (name, calories, logged_at) VALUES ('Pear', 60, '2026-03-31T10:00:00')")
+    assert conn.execute("SELECT local_day FROM food_entries WHERE name = 'Pear'").fetchone()[0] == "2026-03-31"
+    conn.rollback()
+
+
+def test_replacing_data_resets_streaks_and_xp(conn):
+    end = date(2026, 3, 31)
+    seed.generate(conn, 30, end=end)
+    profile = dict(conn.execute("SELECT * FROM user_profile").fetchone())
+    gamification.refresh_streaks(conn, profile, end)
+    assert conn.execute("SELECT COUNT(*) FROM streak_days").fetchone()[0] > 0
+
+    seed.generate(conn, 30, end=end, user=1)
+    for table in ("streak_days", "xp_ledger", "badges"):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+    assert tuple(conn.execute("SELECT total_xp, badge_count FROM xp_summary").fetchone()) == (0, 0)
+    assert conn.execute("SELECT last_evaluated_day FROM streak_state").fetchone()[0] is None
@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from writer import Writer, WriteQueueFull
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "nutritrack.db"))
+    conn = database.get_db()
+    conn.execute("CREATE TABLE t (x INTEGER CHECK (x >= 0))")
+    conn.commit()
+    conn.close()
+    w = Writer(batch_size=8, window_ms=200)
+    yield w
+    w.stop()
+    database.close_pool()
+
+
+def insert(x):
+    def job(conn):
+        conn.execute("INSERT INTO t VALUES (?)", (x,))
+        return x
+    return job
+
+
+def test_concurrent_writes_share_one_commit_and_fail_alone(writer):
+    results = {}
+
+    def submit(x):
+        try:
+            results[x] = writer.run(insert(x))
+        except sqlite3.IntegrityError as e:
+            results[x] = e
+
+    threads = [threading.Thread(target=submit, args=(x,)) for x in (1, 2, -1, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {x: r for x, r in results.items() if x >= 0} == {1: 1, 2: 2, 3: 3}
+    assert isinstance(results[-1], sqlite3.IntegrityError)
+    assert writer.stats["groups"] == 1 and writer.stats["largest_group"] == 4 and writer.stats["failed"] == 1
+    conn = database.get_db()
+    assert sorted(x for x, in conn.execute("SELECT x FROM t")) == [1, 2, 3]
+    conn.close()
+
+    # Exclusive jobs run between groups and bring their own connection and transactions
+    def bulk():
+        conn = database.get_db()
+        try:
+            with database.transaction(conn):
+                conn.executemany("INSERT INTO t VALUES (?)", [(4,), (5,)])
+        finally:
+            conn.close()
+
+    writer.run(bulk, exclusive=True)
+    assert writer.run(lambda conn: conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]) == 5
+
+
+def test_full_queue_is_refused_instead_of_growing(writer):
+    writer._queue.maxsize, writer.queue_timeout = 1, 0.05
+    started, release = threading.Event(), threading.Event()
+    blocker = threading.Thread(target=writer.run, args=(lambda conn: started.set() or release.wait(),))
+    blocker.start()
+    started.wait()
+    filler = threading.Thread(target=writer.run, args=(insert(7),))
+    filler.start()
+    while not writer.depth:
+        pass
+    with pytest.raises(WriteQueueFull):
+        writer.run(insert(8))
+    release.set()
+    blocker.join()
+    filler.join()
+    assert writer.stats["rejected"] == 1
@@ -0,0 +1,201 @@
+"""
+NutriTrack Write Queue
+One writer thread per process runs every mutation, with group commit.
+
+Write endpoints hand their work to the writer through a bounded queue
+instead of committing on their own connection. The writer takes the first
+queued job, waits up to NUTRITRACK_WRITE_WINDOW_MS for more (at most
+NUTRITRACK_WRITE_BATCH_SIZE), and runs them in order in one BEGIN IMMEDIATE
+transaction, each in its own savepoint: a failing job is rolled back alone
+and gets its exception, the others are committed together with one COMMIT.
+Writers in this process never compete for the SQLite write lock, and a burst
+of writes costs one commit instead of one per request.
+
+Exclusive jobs (bulk imports with their own batched transactions) run alone
+between groups. Reads that find derived state stale (streak evaluation,
+closed-period report snapshots) submit that write as a job too. Only startup
+migrations and the command-line tools, which run outside the server's
+request path, write on their own connection.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextvars import copy_context
+
+import database
+from metrics import current_timer
+
+QUEUE_SIZE = int(os.environ.get("NUTRITRACK_WRITE_QUEUE_SIZE", "256"))
+BATCH_SIZE = int(os.environ.get("NUTRITRACK_WRITE_BATCH_SIZE", "64"))
+WINDOW_MS = float(os.environ.get("NUTRITRACK_WRITE_WINDOW_MS", "1"))
+QUEUE_TIMEOUT = float(os.environ.get("NUTRITRACK_WRITE_QUEUE_TIMEOUT", "10"))
+
+class WriteQueueFull(RuntimeError):
+    """The write queue stayed full for QUEUE_TIMEOUT seconds (reported to clients as 503)."""
+
+class _Job:
+    __slots__ = ("fn", "exclusive", "context", "future")
+
+    def __init__(self, fn, exclusive: bool):
+        self.fn = fn
+        self.exclusive = exclusive
+        self.context = copy_context()  # request metrics and tracing follow the job
+        self.future = Future()
+
+_STOP = object()
+_local = threading.local()
+
+def in_writer_thread() -> bool:
+    """True inside a writer job, where writes go straight to the group's connection."""
+    return getattr(_local, "writing", False)
+
+class Writer:
+    """Single writer thread with a bounded queue; started on first use."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 window_ms: float = WINDOW_MS, queue_timeout: float = QUEUE_TIMEOUT):
+        self.batch_size = max(batch_size, 1)
+        self.window = window_ms / 1000
+        self.queue_timeout = queue_timeout
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"groups": 0, "jobs": 0, "failed": 0, "rejected": 0, "largest_group": 0, "commit_seconds": 0.0}
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="nutritrack-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Finish queued jobs, then stop the thread and close its connection."""
+        with self._lock:  # held until the thread is gone, so writes never see two writers
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    def run(self, fn, exclusive: bool = False):
+        """Run fn(conn) in the next group commit and return its result (or raise its error).
+
+        Exclusive jobs are called as fn() on their own and manage their transactions.
+        """
+        if in_writer_thread():
+            raise RuntimeError("Writer jobs cannot queue more writes")
+        self.start()
+        job = _Job(fn, exclusive)
+        try:
+            self._queue.put(job, timeout=self.queue_timeout)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise WriteQueueFull(f"Write queue full for {self.queue_timeout}s")
+        self.start()  # again: a stop() racing the put may have ended the thread before it saw the job
+        return job.future.result()
+
+    # ── Writer Thread ────────────────────────────────────────────────
+    def _connection(self):
+        # Outside the pool's slots, so readers can never starve the writer;
+        # replaced when the pool is (DB_PATH changed)
+        pool = database.get_pool()
+        if self._conn is None or self._conn._pool is not pool:
+            if self._conn is not None:
+                self._conn.dispose()
+            self._conn = pool.dedicated()
+        return self._conn
+
+    def _loop(self):
+        _local.writing = True
+        self._conn = None  # only ever touched by this thread
+        pending = None
+        try:
+            while True:
+                job, pending = pending or self._queue.get(), None
+                if job is _STOP:
+                    return
+                if job.exclusive:
+                    self._run_exclusive(job)
+                    continue
+                group = [job]
+                deadline = time.perf_counter() + self.window
+                while len(group) < self.batch_size:
+                    try:
+                        job = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                    except queue.Empty:
+                        break
+                    if job is _STOP or job.exclusive:
+                        pending = job
+                        break
+                    group.append(job)
+                self._commit_group(group)
+        finally:
+            if self._conn is not None:
+                self._conn.dispose()
+                self._conn = None
+
+    def _run_exclusive(self, job: _Job):
+        try:
+            job.future.set_result(job.context.run(job.fn))
+        except BaseException as e:
+            self.stats["failed"] += 1
+            job.future.set_exception(e)
+        self.stats["jobs"] += 1
+
+    def _commit_group(self, group: list):
+        outcomes = []
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            for job in group:
+                try:
+                    with database.transaction(conn):  # a savepoint: failures roll back only this job
+                        outcomes.append((job, job.context.run(job.fn, conn), None))
+                except Exception as e:
+                    outcomes.append((job, None, e))
+            started = time.perf_counter()
+            conn.commit()
+            elapsed = time.perf_counter() - started
+        except Exception as e:  # BEGIN or COMMIT failed: nothing of the group was written
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.rollback()
+            self.stats["failed"] += len(group)
+            for job in group:
+                job.future.set_exception(e)
+            return
+
+        self.stats["groups"] += 1
+        self.stats["jobs"] += len(group)
+        self.stats["largest_group"] = max(self.stats["largest_group"], len(group))
+        self.stats["commit_seconds"] += elapsed
+        for job, result, error in outcomes:
+            timer = job.context.get(current_timer)
+            if timer is not None:
+                timer.db += elapsed  # every job waited for the shared commit
+            if error is None:
+                job.future.set_result(result)
+            else:
+                self.stats["failed"] += 1
+                job.future.set_exception(error)
+
+    def render(self) -> str:
+        """Writer counters in the Prometheus text format."""
+        lines = []
+        for name, kind, help, value in (
+                ("nutritrack_write_queue_depth", "gauge", "Writes waiting for the writer thread", self.depth),
+                ("nutritrack_write_groups_total", "counter", "Group commits", self.stats["groups"]),
+                ("nutritrack_write_jobs_total", "counter", "Writes run by the writer thread", self.stats["jobs"]),
+                ("nutritrack_write_largest_group", "gauge", "Most writes committed together", self.stats["largest_group"]),
+                ("nutritrack_write_failed_total", "counter", "Writes that raised (rolled back)", self.stats["failed"]),
+                ("nutritrack_write_rejected_total", "counter", "Writes refused with a full queue", self.stats["rejected"]),
+                ("nutritrack_write_commit_seconds_total", "counter", "Time spent in COMMIT",
+                 round(self.stats["commit_seconds"], 6))):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+writer = Writer()